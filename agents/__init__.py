@@ -1,5 +1,12 @@
 from .sales_agent import SalesAgent
 from .inventory_agent import InventoryAgent
 from .cashflow_agent import CashFlowAgent
+from .sql_agent import SqlAgent
+from .registry import AgentRegistry, agent_registry
+from .prefetch import Prefetcher, prefetcher
+from .entity_search import EntityIndex, EntitySearch, entity_search
+from .rollups import DailyRollups, daily_rollups
 
-__all__ = ['SalesAgent', 'InventoryAgent', 'CashFlowAgent']
\ No newline at end of file
+__all__ = ['SalesAgent', 'InventoryAgent', 'CashFlowAgent', 'SqlAgent', 'AgentRegistry', 'agent_registry',
+           'Prefetcher', 'prefetcher', 'EntityIndex', 'EntitySearch', 'entity_search',
+           'DailyRollups', 'daily_rollups']
@@ -1,72 +1,184 @@
+import asyncio
 import re
 import pandas as pd
 from database.db_connection import db
+from database.async_db import async_db
+from database.batch import fetch_by_company
+from agents.rollups import daily_rollups
+from agents.time_window import date_filter, parse_date_range, period_suffix
+from agents.comparison import (KIND_TITLES, comparison_filter, comparison_select, comparison_windows,
+                               format_change, is_comparison_query, parse_comparison, window_span)
 import traceback
 
 
+# Aggregates shared by the single-company and batch cash flow summaries
+CASHFLOW_SUMMARY_METRICS = """
+       COUNT(*)                   as transaction_count,
+       SUM(COALESCE(credit, 0))   as total_inflow,
+       SUM(COALESCE(debit, 0))    as total_outflow,
+       COUNT(DISTINCT voucher_id) as unique_vouchers
+"""
+
+# Current vs previous window aggregates for the comparison engine: (alias, aggregate, expression)
+CASHFLOW_COMPARISON_METRICS = [
+    ('inflow', 'SUM({})', 'COALESCE(credit, 0)'),
+    ('outflow', 'SUM({})', 'COALESCE(debit, 0)'),
+    ('transactions', 'COUNT({})', '1'),
+]
+
+CASHFLOW_KEYWORDS = ['cash flow', 'cashflow', 'liquidity', 'financial', 'forecast', 'voucher', 'payment']
+BREAKDOWN_WORDS = ['breakdown', 'detail', 'category', 'type', 'overview']
+
+
 class CashFlowAgent:
     def __init__(self):
-        self.keywords = ['cash flow', 'cashflow', 'liquidity', 'financial', 'forecast', 'voucher', 'payment']
+        self.keywords = CASHFLOW_KEYWORDS
+        # Dispatch table built once; read-only afterwards, so safe to share across sessions
+        self.method_map = {
+            "get_cashflow_summary": self.get_cashflow_summary,
+            "get_cashflow_comparison": self.get_cashflow_comparison,
+            "get_transaction_breakdown": self.get_transaction_breakdown,
+        }
+        # Methods with a native asyncio version; the rest run in a thread from process_query_async
+        self.async_method_map = {
+            "get_cashflow_summary": self.get_cashflow_summary_async,
+            "get_transaction_breakdown": self.get_transaction_breakdown_async,
+        }
 
-    def process_query(self, message, company_id, method_name="auto"):
-        """Process cash flow query with optional specific method"""
+    def process_query(self, message, company_id, method_name="auto", date_range=None):
+        """Process cash flow query with optional specific method and date range"""
         print(f"🔍 CashFlowAgent.process_query called with company_id={company_id}, method={method_name}")
         if method_name == "auto":
             method_name = self._detect_method(message)
+        if method_name == "get_cashflow_comparison":
+            kind, current, previous = parse_comparison(message)
+            return self.get_cashflow_comparison(company_id, date_range=date_range or current,
+                                                kind=kind, baseline=previous)
+        if date_range is None:
+            date_range = parse_date_range(message)
 
-        method_map = {
-            "get_cashflow_summary": self.get_cashflow_summary,
-            "get_transaction_breakdown": self.get_transaction_breakdown,
-        }
+        method = self.method_map.get(method_name, self.get_cashflow_summary)
+        return method(company_id, date_range=date_range)
 
-        method = method_map.get(method_name, self.get_cashflow_summary)
-        return method(company_id)
+    async def process_query_async(self, message, company_id, method_name="auto", date_range=None):
+        """process_query for asyncio callers; methods without an async version run in a worker thread"""
+        if method_name == "auto":
+            method_name = self._detect_method(message)
+        if method_name not in self.method_map:
+            method_name = "get_cashflow_summary"
+        method = self.async_method_map.get(method_name)
+        if method is None:
+            return await asyncio.to_thread(self.process_query, message, company_id, method_name, date_range)
+        if date_range is None:
+            date_range = parse_date_range(message)
+        return await method(company_id, date_range=date_range)
 
     def _detect_method(self, message):
         """Detect which method to call based on message content"""
         message_lower = message.lower()
 
-        if any(word in message_lower for word in ['breakdown', 'detail', 'category', 'type', 'overview']):
+        if is_comparison_query(message_lower):
+            return "get_cashflow_comparison"
+        elif any(word in message_lower for word in BREAKDOWN_WORDS):
             return "get_transaction_breakdown"
         else:
             return "get_cashflow_summary"
 
-    def get_cashflow_summary(self, company_id):
+    def get_cashflow_summary(self, company_id, date_range=None):
         """Get cash flow summary - FIXED with parameterized query"""
         print(f"💰 CashFlowAgent.get_cashflow_summary called for company {company_id}")
 
         try:
-            # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT COUNT(*)                   as transaction_count,
-                       SUM(COALESCE(credit, 0))   as total_inflow,
-                       SUM(COALESCE(debit, 0))    as total_outflow,
-                       COUNT(DISTINCT voucher_id) as unique_vouchers
-                FROM voucher_items
-                WHERE company_id = %s
-            """
-
+            # A date range is answered from daily rollups when they cover it
+            summary = daily_rollups.summary('cashflow', company_id, date_range)
+            if summary is not None:
+                return self._format_cashflow_summary(company_id, summary, date_range)
+            query, date_params = self._cashflow_summary_query(date_range)
             print(f"🔍 Executing cash flow query for company {company_id}")
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
+            result = db.execute_query(query, (company_id,) + date_params, company_id=company_id)
+            return self._render_cashflow_summary(company_id, result, date_range)
+
+        except Exception as e:
+            print(f"❌ Error in get_cashflow_summary: {str(e)}")
+            print(f"❌ Traceback:\n{traceback.format_exc()}")
+            return f"Error retrieving cash flow data: {str(e)}"
+
+    async def get_cashflow_summary_async(self, company_id, date_range=None):
+        """get_cashflow_summary on the asyncio data layer"""
+        try:
+            if date_range is not None:
+                summary = await asyncio.to_thread(daily_rollups.summary, 'cashflow', company_id, date_range)
+                if summary is not None:
+                    return self._format_cashflow_summary(company_id, summary, date_range)
+            query, date_params = self._cashflow_summary_query(date_range)
+            result = await async_db.fetch(query, (company_id,) + date_params, company_id=company_id)
+            return self._render_cashflow_summary(company_id, result, date_range)
+        except Exception as e:
+            print(f"❌ Error in get_cashflow_summary_async: {str(e)}")
+            return f"Error retrieving cash flow data: {str(e)}"
+
+    def _cashflow_summary_query(self, date_range=None):
+        date_sql, date_params = date_filter("voucher_date", date_range)
+        # FIXED: Using %s placeholder instead of f-string
+        query = f"""
+            SELECT {CASHFLOW_SUMMARY_METRICS}
+            FROM voucher_items
+            WHERE company_id = %s{date_sql}
+        """
+        return query, date_params
+
+    def _render_cashflow_summary(self, company_id, result, date_range=None):
+        if result and len(result) > 0:
+            data = result[0]
+            print(f"✅ Query successful! Data: {data}")
+            return self._format_cashflow_summary(company_id, data, date_range)
+        return f"No cash flow data found for company {company_id}"
+
+    def get_cashflow_summary_many(self, company_ids, chunk_size=100, date_range=None):
+        """Cash flow summaries for many companies via grouped IN-list queries; returns {company_id: summary}"""
+        date_sql, date_params = date_filter("voucher_date", date_range)
+        query = f"""
+            SELECT company_id,
+                   {CASHFLOW_SUMMARY_METRICS}
+            FROM voucher_items
+            WHERE company_id IN ({{company_ids}}){date_sql}
+            GROUP BY company_id
+        """
+        try:
+            rows, failed = fetch_by_company(query, company_ids, date_params, chunk_size=chunk_size)
+        except Exception as e:
+            print(f"❌ Error in get_cashflow_summary_many: {str(e)}")
+            return {str(c): f"Error retrieving cash flow data: {str(e)}" for c in company_ids}
 
-            if result and len(result) > 0:
-                data = result[0]
-                print(f"✅ Query successful! Data: {data}")
+        summaries = {}
+        for c in company_ids:
+            if str(c) in rows:
+                summaries[str(c)] = self._format_cashflow_summary(c, rows[str(c)][0], date_range)
+            elif str(c) in failed:
+                summaries[str(c)] = "Error retrieving cash flow data: database query failed"
+            else:
+                summaries[str(c)] = f"No cash flow data found for company {c}"
+        return summaries
 
-                # Handle None values
-                transaction_count = data['transaction_count'] or 0
-                total_inflow = float(data['total_inflow'] or 0)
-                total_outflow = float(data['total_outflow'] or 0)
-                unique_vouchers = data['unique_vouchers'] or 0
-                net_cashflow = total_inflow - total_outflow
+    def _format_cashflow_summary(self, company_id, data, date_range=None):
+        """Render one cash flow summary row"""
+        # Handle None values
+        transaction_count = data['transaction_count'] or 0
+        total_inflow = float(data['total_inflow'] or 0)
+        total_outflow = float(data['total_outflow'] or 0)
+        unique_vouchers = data['unique_vouchers'] or 0
+        net_cashflow = total_inflow - total_outflow
+        approximate = '~' if data.get('approximate') else ''
+        source = ("From daily rollups; unique vouchers are estimated (about ±2%)" if data.get('approximate')
+                  else "Live data from AWS RDS production database")
 
-                response = f"""
-**💰 CASH FLOW SUMMARY - Company {company_id}**
+        return f"""
+**💰 CASH FLOW SUMMARY - Company {company_id}{period_suffix(date_range)}**
 
 📊 **Core Metrics:**
 - **Total Transactions**: {transaction_count:,}
-- **Unique Vouchers**: {unique_vouchers:,}
+- **Unique Vouchers**: {approximate}{unique_vouchers:,}
 - **Total Cash Inflows**: **${total_inflow:,.2f}**
 - **Total Cash Outflows**: **${total_outflow:,.2f}**
 - **Net Cash Position**: **${net_cashflow:,.2f}**
@@ -75,43 +187,50 @@ class CashFlowAgent:
 📈 **Business Insights:**
 - **Enterprise Scale**: Processing **${total_inflow / 1_000_000:,.1f}M** in financial operations
 - **Transaction Velocity**: **{transaction_count:,}** processed transactions
-- **Document Efficiency**: **{unique_vouchers:,}** financial documents managed
+- **Document Efficiency**: **{approximate}{unique_vouchers:,}** financial documents managed
 
-*Live data from AWS RDS production database*
+*{source}*
 """
-                return response
-            else:
-                return f"No cash flow data found for company {company_id}"
 
-        except Exception as e:
-            print(f"❌ Error in get_cashflow_summary: {str(e)}")
-            print(f"❌ Traceback:\n{traceback.format_exc()}")
-            return f"Error retrieving cash flow data: {str(e)}"
-
-    def get_transaction_breakdown(self, company_id):
+    def get_transaction_breakdown(self, company_id, date_range=None):
         """Get transaction breakdown - FIXED with parameterized query"""
         try:
-            # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT COUNT(*)                   as total_count,
-                       COUNT(DISTINCT voucher_id) as voucher_count,
-                       SUM(COALESCE(credit, 0))   as total_credit,
-                       SUM(COALESCE(debit, 0))    as total_debit
-                FROM voucher_items
-                WHERE company_id = %s
-            """
-
+            query, date_params = self._transaction_breakdown_query(date_range)
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
+            result = db.execute_query(query, (company_id,) + date_params, company_id=company_id)
+            return self._render_transaction_breakdown(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving transaction breakdown: {str(e)}"
+
+    async def get_transaction_breakdown_async(self, company_id, date_range=None):
+        """get_transaction_breakdown on the asyncio data layer"""
+        try:
+            query, date_params = self._transaction_breakdown_query(date_range)
+            result = await async_db.fetch(query, (company_id,) + date_params, company_id=company_id)
+            return self._render_transaction_breakdown(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving transaction breakdown: {str(e)}"
 
-            if result and len(result) > 0:
-                data = result[0]
+    def _transaction_breakdown_query(self, date_range=None):
+        date_sql, date_params = date_filter("voucher_date", date_range)
+        # FIXED: Using %s placeholder instead of f-string
+        query = f"""
+            SELECT COUNT(*)                   as total_count,
+                   COUNT(DISTINCT voucher_id) as voucher_count,
+                   SUM(COALESCE(credit, 0))   as total_credit,
+                   SUM(COALESCE(debit, 0))    as total_debit
+            FROM voucher_items
+            WHERE company_id = %s{date_sql}
+        """
+        return query, date_params
 
-                if data['total_count'] is None or data['total_count'] == 0:
-                    return f"No transaction data found for company {company_id}"
+    def _render_transaction_breakdown(self, company_id, result, date_range=None):
+        if not result or result[0]['total_count'] is None or result[0]['total_count'] == 0:
+            return f"No transaction data found for company {company_id}"
 
-                return f"""
-**Transaction Breakdown - Company {company_id}**
+        data = result[0]
+        return f"""
+**Transaction Breakdown - Company {company_id}{period_suffix(date_range)}**
 
 📊 **Summary:**
 - Total Transactions: {data['total_count']:,}
@@ -121,8 +240,43 @@ class CashFlowAgent:
 
 *Data retrieved successfully from AWS RDS*
 """
-            else:
-                return f"No transaction data found for company {company_id}"
+
+    def get_cashflow_comparison(self, company_id, date_range=None, kind="mom", baseline=None):
+        """Current vs previous period inflows and outflows (MoM, YoY or rolling) in one query"""
+        try:
+            current, previous = comparison_windows(kind, date_range, baseline)
+            select_sql, select_params = comparison_select(CASHFLOW_COMPARISON_METRICS, "voucher_date",
+                                                          current, previous)
+            window_sql, window_params = comparison_filter("voucher_date", current, previous)
+            query = f"""
+                SELECT {select_sql}
+                FROM voucher_items
+                WHERE company_id = %s{window_sql}
+            """
+
+            params = select_params + (company_id,) + window_params
+            result = db.execute_query(query, params, company_id=company_id)
+            if not result:
+                return f"No cash flow data found for company {company_id}"
+
+            row = result[0]
+            net_current = float(row['inflow_current'] or 0) - float(row['outflow_current'] or 0)
+            net_previous = float(row['inflow_previous'] or 0) - float(row['outflow_previous'] or 0)
+            return f"""
+**💰 CASH FLOW COMPARISON ({KIND_TITLES.get(kind, 'Period over Period')}) - Company {company_id}**
+
+📅 **Current:** {current.label} ({window_span(current)})
+📅 **Previous:** {window_span(previous)}
+
+📊 **Change:**
+{format_change('Cash Inflows', row['inflow_current'], row['inflow_previous'])}
+{format_change('Cash Outflows', row['outflow_current'], row['outflow_previous'])}
+{format_change('Net Cash Flow', net_current, net_previous)}
+{format_change('Transactions', row['transactions_current'], row['transactions_previous'], money=False)}
+
+*Live data from AWS RDS production database*
+"""
 
         except Exception as e:
-            return f"Error retrieving transaction breakdown: {str(e)}"
\ No newline at end of file
+            print(f"❌ Error in get_cashflow_comparison: {str(e)}")
+            return f"Error retrieving cash flow comparison: {str(e)}"
@@ -0,0 +1,150 @@
+import re
+from calendar import monthrange
+from datetime import date, timedelta
+
+from agents.time_window import DateRange, parse_date_range
+
+
+COMPARISON_KEYWORDS = ['compare', 'compared', 'comparison', 'vs', 'versus', 'growth', 'change', 'mom', 'yoy',
+                       'month over month', 'month-over-month', 'year over year', 'year-over-year',
+                       'rolling', 'trailing']
+COMPARISON_PATTERN = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in COMPARISON_KEYWORDS) + r')\b')
+KIND_TITLES = {'mom': 'Month over Month', 'yoy': 'Year over Year', 'rolling': 'Rolling 30 Days'}
+ROLLING_DAYS = 30
+
+# Splits "this quarter vs last quarter" into the current part and the baseline part
+BASELINE_SPLIT = re.compile(r'\b(?:compared?\s+(?:to|with)|vs\.?|versus|against)\s')
+
+
+def is_comparison_query(text):
+    return COMPARISON_PATTERN.search(text.lower()) is not None
+
+
+def shift_months(day, months):
+    """Same day-of-month `months` away, clamped to the end of shorter months"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def _shifted(date_range, months):
+    return DateRange(shift_months(date_range.start, months), shift_months(date_range.end, months))
+
+
+def _month_span(date_range):
+    """Length in whole months for month-aligned ranges (months, quarters, years), else None"""
+    start, end = date_range.start, date_range.end
+    if start.day != 1 or end.day != 1:
+        return None
+    return (end.year * 12 + end.month) - (start.year * 12 + start.month)
+
+
+def detect_comparison_kind(text):
+    text = text.lower()
+    if any(word in text for word in ['yoy', 'year over year', 'year-over-year', 'last year',
+                                     'previous year', 'same period']):
+        return 'yoy'
+    if any(word in text for word in ['rolling', 'trailing']) or \
+            re.search(r'\b(?:last|past)\s+\d+\s+days?\b', text):
+        return 'rolling'
+    return 'mom'
+
+
+def comparison_windows(kind='mom', current=None, previous=None, today=None):
+    """Resolve (current, previous) DateRanges for a comparison.
+
+    Without a current window: MoM is month-to-date vs the same days of last
+    month, YoY is year-to-date vs the same days of last year and rolling is
+    the last 30 days vs the 30 before. A baseline that isn't given is derived
+    from the current window. A current window that runs past today is cut at
+    today, and a baseline longer than a to-date window is cut to its length,
+    so both sides cover the same number of elapsed days.
+    """
+    today = today or date.today()
+    tomorrow = today + timedelta(days=1)
+
+    if current is None:
+        if kind == 'yoy':
+            current = DateRange(date(today.year, 1, 1), tomorrow, "year to date")
+        elif kind == 'rolling':
+            current = DateRange(tomorrow - timedelta(days=ROLLING_DAYS), tomorrow, f"last {ROLLING_DAYS} days")
+        else:
+            current = DateRange(today.replace(day=1), tomorrow, "month to date")
+
+    if previous is None:
+        span = _month_span(current)
+        if kind == 'yoy':
+            previous = _shifted(current, -12)
+        elif kind == 'mom' and (span or current.start.day == 1):
+            # Calendar periods step back by their own length in months; month-to-date by one month
+            previous = _shifted(current, -(span or 1))
+        else:
+            previous = current.previous()
+
+    if current.start < tomorrow <= current.end:
+        if current.end > tomorrow:
+            current = DateRange(current.start, tomorrow, f"{current.label}, to date")
+        cut = previous.start + timedelta(days=current.days)
+        if cut < previous.end:
+            previous = DateRange(previous.start, cut)
+    return current, previous
+
+
+def parse_comparison(text, today=None):
+    """(kind, current, previous) from chat text; windows are None when not mentioned"""
+    kind = detect_comparison_kind(text)
+    parts = BASELINE_SPLIT.split(text.lower(), maxsplit=1)
+    current = parse_date_range(parts[0], today=today)
+    previous = parse_date_range(parts[1], today=today) if len(parts) > 1 else None
+    if previous is not None and kind == 'yoy' and current is None:
+        # "vs last year" names the comparison, not a window to compare against
+        previous = None
+    return kind, current, previous
+
+
+def comparison_select(metrics, column, current, previous):
+    """Conditional aggregates computing every metric for both windows in one pass.
+
+    metrics is a list of (alias, aggregate, expression), e.g.
+    ('revenue', 'SUM({})', 'sales_items.total'). Each becomes
+    `<alias>_current` and `<alias>_previous` columns. Returns (sql, params);
+    the params come before any WHERE params since the SELECT list is bound first.
+    """
+    columns = []
+    params = ()
+    for alias, aggregate, expression in metrics:
+        for suffix, window in (('current', current), ('previous', previous)):
+            case = f"CASE WHEN {column} >= %s AND {column} < %s THEN {expression} END"
+            columns.append(f"{aggregate.format(case)} AS {alias}_{suffix}")
+            params += (window.start, window.end)
+    return ",\n       ".join(columns), params
+
+
+def comparison_filter(column, current, previous):
+    """WHERE fragment restricting the scan to the two windows (sargable, index range union)"""
+    sql = f" AND (({column} >= %s AND {column} < %s) OR ({column} >= %s AND {column} < %s))"
+    return sql, (current.start, current.end, previous.start, previous.end)
+
+
+def pct_change(current, previous):
+    if not previous:
+        return None
+    return (current - previous) / abs(previous) * 100
+
+
+def format_change(label, current, previous, money=True):
+    """One markdown line: value, prior value, absolute and percentage delta"""
+    current, previous = float(current or 0), float(previous or 0)
+    delta = current - previous
+    change = pct_change(current, previous)
+    arrow = '▲' if delta > 0 else '▼' if delta < 0 else '▬'
+    if money:
+        values = f"${current:,.2f} vs ${previous:,.2f} ({'+' if delta >= 0 else '-'}${abs(delta):,.2f}"
+    else:
+        values = f"{current:,.0f} vs {previous:,.0f} ({delta:+,.0f}"
+    percent = f"{arrow} {change:+.1f}%" if change is not None else "no prior data"
+    return f"- **{label}**: {values}, {percent})"
+
+
+def window_span(date_range):
+    return f"{date_range.start.isoformat()} to {(date_range.end - timedelta(days=1)).isoformat()}"
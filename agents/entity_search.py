@@ -0,0 +1,249 @@
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from agents.sql_templates import ENTITY, PERIOD_PATTERNS, QUOTED
+from database.dimension_cache import dimension_cache
+
+
+# Entity kinds: dimension table searched and the words that point a phrase at that kind
+ENTITY_KINDS = {
+    'customer': {'table': 'contacts', 'words': ('customer', 'client')},
+    'product': {'table': 'products', 'words': ('product', 'item', 'sku')},
+}
+# Names usually follow one of these ("sales for Acme", "stock of blue widget")
+CUE_WORDS = r"(?:for|of|from|to|about)"
+CUE_PHRASE = re.compile(r"\b" + CUE_WORDS + r"\s+((?:(?!\b" + CUE_WORDS + r"\b)[\w&.' -])+)", re.IGNORECASE)
+# Words that describe the question rather than name something
+GENERIC_WORDS = {
+    'sales', 'sale', 'revenue', 'stock', 'inventory', 'products', 'product', 'items', 'item', 'customers',
+    'customer', 'client', 'clients', 'company', 'report', 'summary', 'performance', 'orders', 'order', 'units',
+    'cash', 'flow', 'cashflow', 'quantity', 'levels', 'all', 'our', 'my', 'the', 'a', 'an', 'each', 'every',
+    'total', 'me', 'show', 'what', 'is', 'are', 'how', 'much', 'many', 'region', 'regions', 'warehouse',
+    'forecast', 'low', 'top', 'best', 'by', 'in', 'on', 'and', 'with', 'during', 'since', 'compared', 'vs',
+    'day', 'days', 'daily', 'week', 'weeks', 'weekly', 'month', 'months', 'monthly', 'quarter', 'quarters',
+    'quarterly', 'year', 'years', 'yearly', 'annual', 'today', 'yesterday', 'date', 'period', 'time', 'now',
+    'this', 'last', 'next', 'current', 'previous', 'past', 'details', 'detail', 'breakdown', 'overview', 'list',
+    'analysis', 'trend', 'trends', 'status', 'please', 'it', 'them', 'so', 'far',
+}
+# Hinted ("customer Acme") and quoted names may match part of a name; a capitalised
+# phrase after a cue word is only taken when it matches a name almost exactly
+MIN_SCORE = 0.5
+UNHINTED_MIN_SCORE = 0.8
+
+Entity = namedtuple('Entity', ['kind', 'id', 'name', 'score'])
+
+
+def normalize_name(text):
+    return re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+
+
+def trigrams(text):
+    """Padded character trigrams of each word ("acme" -> "  a", " ac", "acm", "cme", "me ")"""
+    grams = set()
+    for word in normalize_name(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class EntityIndex:
+    """Trigram index over (id, name) pairs for fuzzy name lookups.
+
+    Each name gets a slot; postings map a trigram to the slots whose names
+    contain it, cached as NumPy arrays so a search is one bincount over
+    the query's postings - well under a millisecond for a company's
+    catalogue. The score averages how much of the query the name covers
+    with the Dice coefficient, so "acme" finds "Acme Corporation Ltd" while
+    closer names still rank first. update() touches only changed names;
+    it and search() hold the index's lock, so a search never sees a
+    half-applied update.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self._grams = {}
+        self._slots = {}
+        self._slot_ids = []
+        self._free = []
+        self._sizes = np.zeros(64, dtype=np.int32)
+        self._postings = {}
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self.names)
+
+    def _add(self, entity_id, name):
+        grams = trigrams(name)
+        if not grams:
+            return
+        if self._free:
+            slot = self._free.pop()
+            self._slot_ids[slot] = entity_id
+        else:
+            slot = len(self._slot_ids)
+            self._slot_ids.append(entity_id)
+            if slot >= len(self._sizes):
+                self._sizes = np.concatenate([self._sizes, np.zeros(len(self._sizes), dtype=np.int32)])
+        self._sizes[slot] = len(grams)
+        self.names[entity_id] = name
+        self._grams[entity_id] = grams
+        self._slots[entity_id] = slot
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(slot)
+            self._arrays.pop(gram, None)
+
+    def _remove(self, entity_id):
+        slot = self._slots.pop(entity_id, None)
+        if slot is None:
+            return
+        self.names.pop(entity_id, None)
+        for gram in self._grams.pop(entity_id, ()):
+            slots = self._postings.get(gram)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._postings[gram]
+            self._arrays.pop(gram, None)
+        self._slot_ids[slot] = None
+        self._sizes[slot] = 0
+        self._free.append(slot)
+
+    def _posting(self, gram):
+        array = self._arrays.get(gram)
+        if array is None:
+            array = np.fromiter(self._postings[gram], dtype=np.int64, count=len(self._postings[gram]))
+            self._arrays[gram] = array
+        return array
+
+    def update(self, entries):
+        """Make the index match {id: name}; returns how many ids were added, renamed or removed"""
+        changed = 0
+        with self._lock:
+            for entity_id in [i for i in self.names if i not in entries]:
+                self._remove(entity_id)
+                changed += 1
+            for entity_id, name in entries.items():
+                if self.names.get(entity_id) != name:
+                    self._remove(entity_id)
+                    self._add(entity_id, name)
+                    changed += 1
+        return changed
+
+    def search(self, text, limit=5, min_score=MIN_SCORE):
+        """[(id, name, score)] best first"""
+        query = trigrams(text)
+        with self._lock:
+            postings = [self._posting(gram) for gram in query if gram in self._postings]
+            if not postings:
+                return []
+            counts = np.bincount(np.concatenate(postings))
+            slots = np.flatnonzero(counts)
+            shared = counts[slots]
+            scores = (shared / len(query) + 2 * shared / (len(query) + self._sizes[slots])) / 2
+            keep = scores >= min_score
+            slots, scores = slots[keep], scores[keep]
+            best = np.argsort(-scores, kind='stable')[:limit]
+            return [(self._slot_ids[slots[i]], self.names[self._slot_ids[slots[i]]], float(scores[i])) for i in best]
+
+
+def candidate_phrases(message):
+    """Phrases in a question that may name a customer or product: (phrase, kind or None, minimum score).
+
+    Only quoted phrases, names after a kind word ("customer Acme") and
+    capitalised phrases after a cue word ("sales for Acme Corp") are taken.
+    """
+    phrases = []
+    for match in re.finditer(QUOTED, message):
+        phrases.append((match.group(1) or match.group(2), None, MIN_SCORE))
+    for match in re.finditer(ENTITY, message):
+        kind = next((k for k, spec in ENTITY_KINDS.items() if match.group(1).lower() in spec['words']), None)
+        phrases.append((match.group(2), kind, MIN_SCORE if kind else UNHINTED_MIN_SCORE))
+
+    text = message
+    for pattern in PERIOD_PATTERNS:
+        text = re.sub(pattern, ' , ', text, flags=re.IGNORECASE)
+    for match in CUE_PHRASE.finditer(text):
+        words = [w for w in re.findall(r"[\w&.'-]+", match.group(1))
+                 if normalize_name(w) and normalize_name(w) not in GENERIC_WORDS and not w.isdigit()]
+        if any(w[0].isupper() for w in words):
+            phrases.append((' '.join(words), None, UNHINTED_MIN_SCORE))
+    return [phrase for phrase in phrases if len(normalize_name(phrase[0])) >= 3]
+
+
+class EntitySearch:
+    """Per-company customer and product name indexes, built from the dimension cache.
+
+    An index is built the first time a company is searched. When the
+    dimension cache reloads (change-tracker events, expiry) only the
+    changed names are re-indexed.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, kind, company_id):
+        dimension = dimension_cache.get(ENTITY_KINDS[kind]['table'], company_id)
+        if dimension is None or dimension.labels is None:
+            return None
+        key = (kind, str(company_id))
+        with self._lock:
+            index, source = self._indexes.get(key, (None, None))
+            if index is None:
+                index = EntityIndex()
+            if source is not dimension:
+                entries = {int(i): str(label) for i, label in zip(dimension.ids, dimension.labels)
+                           if label is not None and label == label and str(label).strip()}
+                index.update(entries)
+                self._indexes[key] = (index, dimension)
+            return index
+
+    def search(self, kind, company_id, text, limit=5):
+        index = self.index(kind, company_id)
+        return index.search(text, limit) if index is not None else []
+
+    def resolve(self, message, company_id, kinds=None):
+        """{kind: Entity} for names found in a question, best match per kind"""
+        kinds = kinds or tuple(ENTITY_KINDS)
+        found = {}
+        for phrase, hinted, min_score in candidate_phrases(message):
+            if hinted is not None and hinted not in kinds:
+                continue
+            # An unhinted phrase names one thing: keep only its best match across kinds
+            best = None
+            for kind in ([hinted] if hinted else kinds):
+                for entity_id, name, score in self.search(kind, company_id, phrase, limit=1):
+                    if score >= min_score and (best is None or score > best.score):
+                        best = Entity(kind, entity_id, name, score)
+            if best is not None and (best.kind not in found or best.score > found[best.kind].score):
+                found[best.kind] = best
+        if found:
+            print(f"🔎 Resolved {', '.join(f'{e.kind} {e.name!r} ({e.score:.2f})' for e in found.values())}")
+        return found
+
+
+def entity_filter(columns, entities):
+    """SQL fragment and params restricting a query to resolved entities, for the kinds it has a column for"""
+    sql, params = "", ()
+    for kind, entity in (entities or {}).items():
+        column = columns.get(kind)
+        if column:
+            sql += f" AND {column} = %s"
+            params += (entity.id,)
+    return sql, params
+
+
+def entity_note(entities):
+    """Line shown above an answer that was filtered to named customers/products"""
+    if not entities:
+        return ""
+    return "🔎 Filtered to " + ", ".join(f"{e.kind} **{e.name}**" for e in entities.values()) + "\n\n"
+
+
+# Global entity search instance
+entity_search = EntitySearch()
@@ -1,71 +1,179 @@
+import asyncio
 import re
+import numpy as np
 import pandas as pd
 from database.db_connection import db
+from database.dimension_cache import dimension_cache, product_label
+from database.async_db import async_db
+from database.batch import fetch_by_company
+from agents.entity_search import entity_filter, entity_note, entity_search
+from agents.time_window import date_filter, parse_date_range, period_suffix
+
+
+# Aggregates shared by the single-company and batch inventory summaries
+INVENTORY_SUMMARY_METRICS = """
+       COUNT(DISTINCT product_id)   as total_products,
+       SUM(quantity)                as total_quantity,
+       AVG(quantity)                as avg_quantity_per_product,
+       COUNT(DISTINCT warehouse_id) as total_warehouses
+"""
 
+INVENTORY_KEYWORDS = ['inventory', 'stock', 'levels', 'warehouse', 'quantity', 'in stock', 'risk', 'stockout']
+# Trigger words for _detect_method, checked in the order of the branches there
+RISK_WORDS = ['risk', 'stockout', 'prediction', 'alert']
+LOW_STOCK_WORDS = ['low', 'minimum']
+OUT_OF_STOCK_WORDS = ['out of stock', 'zero']
+PRODUCT_WORDS = ['product', 'item']
+LOW_STOCK_LIMIT = 15
 
-class InventoryAgent:
-    def __init__(self):
-        self.keywords = ['inventory', 'stock', 'levels', 'warehouse', 'quantity', 'in stock', 'risk', 'stockout']
+# Methods that can be narrowed to a named product ("stock of blue widget")
+ENTITY_METHODS = {"get_inventory_summary", "get_low_stock_items", "get_out_of_stock_items", "get_product_inventory"}
+ENTITY_KINDS = ('product',)
+STOCK_ENTITY_COLUMNS = {'product': 'stock.product_id'}
 
-    def process_query(self, message, company_id, method_name="auto"):
-        """Process inventory query with optional specific method"""
-        if method_name == "auto":
-            method_name = self._detect_method(message)
 
-        method_map = {
+def _whole(value):
+    """Threshold from the float dimension arrays, shown as an integer when it is one"""
+    if value is None or value != value:
+        return None
+    return int(value) if float(value).is_integer() else value
+
+
+class InventoryAgent:
+    def __init__(self):
+        self.keywords = INVENTORY_KEYWORDS
+        # Dispatch table built once; read-only afterwards, so safe to share across sessions
+        self.method_map = {
             "get_inventory_summary": self.get_inventory_summary,
             "get_inventory_risk": self.get_inventory_risk,
             "get_low_stock_items": self.get_low_stock_items,
             "get_out_of_stock_items": self.get_out_of_stock_items,
             "get_product_inventory": self.get_product_inventory
         }
+        # Methods with a native asyncio version; the rest run in a thread from process_query_async
+        self.async_method_map = {
+            "get_inventory_summary": self.get_inventory_summary_async,
+            "get_low_stock_items": self.get_low_stock_items_async,
+        }
 
-        method = method_map.get(method_name, self.get_inventory_summary)
-        return method(company_id)
+    def process_query(self, message, company_id, method_name="auto", date_range=None):
+        """Process inventory query with optional specific method and date range"""
+        if method_name == "auto":
+            method_name = self._detect_method(message)
+        if date_range is None:
+            date_range = parse_date_range(message)
+
+        method = self.method_map.get(method_name, self.get_inventory_summary)
+        if method_name in ENTITY_METHODS:
+            entities = entity_search.resolve(message, company_id, kinds=ENTITY_KINDS)
+            if entities:
+                return entity_note(entities) + method(company_id, date_range=date_range, entities=entities)
+        return method(company_id, date_range=date_range)
+
+    async def process_query_async(self, message, company_id, method_name="auto", date_range=None):
+        """process_query for asyncio callers; methods without an async version run in a worker thread"""
+        if method_name == "auto":
+            method_name = self._detect_method(message)
+        if method_name not in self.method_map:
+            method_name = "get_inventory_summary"
+        method = self.async_method_map.get(method_name)
+        if method is None:
+            return await asyncio.to_thread(self.process_query, message, company_id, method_name, date_range)
+        if date_range is None:
+            date_range = parse_date_range(message)
+        if method_name in ENTITY_METHODS:
+            entities = await asyncio.to_thread(entity_search.resolve, message, company_id, ENTITY_KINDS)
+            if entities:
+                return entity_note(entities) + await method(company_id, date_range=date_range, entities=entities)
+        return await method(company_id, date_range=date_range)
 
     def _detect_method(self, message):
         """Detect which method to call based on message content"""
         message_lower = message.lower()
 
-        if any(word in message_lower for word in ['risk', 'stockout', 'prediction', 'alert']):
+        if any(word in message_lower for word in RISK_WORDS):
             return "get_inventory_risk"
-        elif any(word in message_lower for word in ['low', 'minimum']):
+        elif any(word in message_lower for word in LOW_STOCK_WORDS):
             return "get_low_stock_items"
-        elif any(word in message_lower for word in ['out of stock', 'zero']):
+        elif any(word in message_lower for word in OUT_OF_STOCK_WORDS):
             return "get_out_of_stock_items"
-        elif any(word in message_lower for word in ['product', 'item']):
+        elif any(word in message_lower for word in PRODUCT_WORDS):
             return "get_product_inventory"
         else:
             return "get_inventory_summary"
 
-    def get_inventory_summary(self, company_id):
+    def get_inventory_summary(self, company_id, date_range=None, entities=None):
         """Get inventory summary - FIXED with parameterized query"""
         try:
-            # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT COUNT(DISTINCT product_id)   as total_products,
-                       SUM(quantity)                as total_quantity,
-                       AVG(quantity)                as avg_quantity_per_product,
-                       COUNT(DISTINCT warehouse_id) as total_warehouses
-                FROM stock
-                WHERE company_id = %s
-                  AND stock_type = 'purchase'
-            """
-
+            query, params = self._inventory_summary_query(date_range, entities)
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
-            
-            if result and len(result) > 0:
-                summary = result[0]
+            result = db.execute_query(query, (company_id,) + params, company_id=company_id)
+            return self._render_inventory_summary(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving inventory summary: {str(e)}"
+
+    async def get_inventory_summary_async(self, company_id, date_range=None, entities=None):
+        """get_inventory_summary on the asyncio data layer"""
+        try:
+            query, params = self._inventory_summary_query(date_range, entities)
+            result = await async_db.fetch(query, (company_id,) + params, company_id=company_id)
+            return self._render_inventory_summary(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving inventory summary: {str(e)}"
+
+    def _inventory_summary_query(self, date_range=None, entities=None):
+        date_sql, date_params = date_filter("stock.stock_date", date_range)
+        entity_sql, entity_params = entity_filter(STOCK_ENTITY_COLUMNS, entities)
+        # FIXED: Using %s placeholder instead of f-string
+        query = f"""
+            SELECT {INVENTORY_SUMMARY_METRICS}
+            FROM stock
+            WHERE company_id = %s
+              AND stock_type = 'purchase'{date_sql}{entity_sql}
+        """
+        return query, date_params + entity_params
+
+    def _render_inventory_summary(self, company_id, result, date_range=None):
+        if result and len(result) > 0:
+            return self._format_inventory_summary(company_id, result[0], date_range)
+        return f"No inventory data found for company {company_id}"
+
+    def get_inventory_summary_many(self, company_ids, chunk_size=100, date_range=None):
+        """Inventory summaries for many companies via grouped IN-list queries; returns {company_id: summary}"""
+        date_sql, date_params = date_filter("stock.stock_date", date_range)
+        query = f"""
+            SELECT company_id,
+                   {INVENTORY_SUMMARY_METRICS}
+            FROM stock
+            WHERE company_id IN ({{company_ids}})
+              AND stock_type = 'purchase'{date_sql}
+            GROUP BY company_id
+        """
+        try:
+            rows, failed = fetch_by_company(query, company_ids, date_params, chunk_size=chunk_size)
+        except Exception as e:
+            return {str(c): f"Error retrieving inventory summary: {str(e)}" for c in company_ids}
+
+        summaries = {}
+        for c in company_ids:
+            if str(c) in rows:
+                summaries[str(c)] = self._format_inventory_summary(c, rows[str(c)][0], date_range)
+            elif str(c) in failed:
+                summaries[str(c)] = "Error retrieving inventory summary: database query failed"
+            else:
+                summaries[str(c)] = f"No inventory data found for company {c}"
+        return summaries
 
-                # Handle None values before formatting
-                total_products = summary['total_products'] or 0
-                total_quantity = float(summary['total_quantity'] or 0)
-                avg_quantity_per_product = float(summary['avg_quantity_per_product'] or 0)
-                total_warehouses = summary['total_warehouses'] or 0
+    def _format_inventory_summary(self, company_id, summary, date_range=None):
+        """Render one inventory summary row"""
+        # Handle None values before formatting
+        total_products = summary['total_products'] or 0
+        total_quantity = float(summary['total_quantity'] or 0)
+        avg_quantity_per_product = float(summary['avg_quantity_per_product'] or 0)
+        total_warehouses = summary['total_warehouses'] or 0
 
-                response_data = f"""
-**Inventory Overview - Company {company_id}**
+        return f"""
+**Inventory Overview - Company {company_id}{period_suffix(date_range)}**
 
 📦 **Stock Summary:**
 - Total Products: {total_products:,}
@@ -75,18 +183,13 @@ class InventoryAgent:
 
 *Live data from AWS RDS database*
 """
-                return response_data
-            else:
-                return f"No inventory data found for company {company_id}"
 
-        except Exception as e:
-            return f"Error retrieving inventory summary: {str(e)}"
-
-    def get_inventory_risk(self, company_id):
+    def get_inventory_risk(self, company_id, date_range=None):
         """Get inventory risk assessment - FIXED with parameterized query"""
         try:
+            date_sql, date_params = date_filter("stock.stock_date", date_range)
             # FIXED: Using %s placeholder instead of f-string
-            query = """
+            query = f"""
                 SELECT stock.product_id,
                        stock.warehouse_id,
                        stock.quantity,
@@ -107,20 +210,21 @@ class InventoryAgent:
                          LEFT JOIN goods_receipt_note ON goods_receipt_note.grn_id = stock.grn_id
                          LEFT JOIN products ON products.product_id = stock.product_id
                 WHERE stock.company_id = %s
-                  AND stock.stock_type = 'purchase'
+                  AND stock.stock_type = 'purchase'{date_sql}
                 GROUP BY stock.stock_id LIMIT 50
             """
 
             # FIXED: Passing company_id as parameter tuple
-            df = db.execute_query_dataframe(query, (company_id,))
+            df = db.execute_query_dataframe(query, (company_id,) + date_params, company_id=company_id, columnar=True)
             
             if not df.empty:
                 low_stock_count = len(df[df['quantity'] <= df['min_qty_alert']])
                 total_value = df['cost'].sum()
                 avg_risk_score = (low_stock_count / len(df)) * 100
+                latest_stock_date = df['stock_date'].max()
 
                 response_data = f"""
-**Inventory Risk Assessment - Company {company_id}**
+**Inventory Risk Assessment - Company {company_id}{period_suffix(date_range)}**
 
 ⚠️ **Risk Analysis:**
 - Products at Risk: {low_stock_count} items below minimum levels
@@ -129,7 +233,7 @@ class InventoryAgent:
 - Items Monitored: {len(df)} stock entries
 
 🔍 **Key Findings:**
-- Recent stock activity up to {df['stock_date'].max().strftime('%Y-%m-%d') if df['stock_date'].max() else 'N/A'}
+- Recent stock activity up to {latest_stock_date.strftime('%Y-%m-%d') if pd.notna(latest_stock_date) else 'N/A'}
 - Multiple warehouse locations covered
 - Reorder alerts configured for risk management
 
@@ -142,81 +246,106 @@ class InventoryAgent:
         except Exception as e:
             return f"Error analyzing inventory risk: {str(e)}"
 
-    def get_low_stock_items(self, company_id):
+    def get_low_stock_items(self, company_id, date_range=None, entities=None):
         """Get low stock items - FIXED with parameterized query"""
         try:
-            # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT stock.product_id,
-                       stock.quantity,
-                       products.min_qty_alert,
-                       products.reorder_qty_alert,
-                       (products.min_qty_alert - stock.quantity) as shortage,
-                       stock.warehouse_id
-                FROM stock
-                         LEFT JOIN products ON products.product_id = stock.product_id
-                WHERE stock.company_id = %s
-                  AND stock.quantity <= products.min_qty_alert
-                  AND stock.stock_type = 'purchase'
-                ORDER BY shortage DESC LIMIT 15
-            """
-
+            query, params = self._low_stock_query(date_range, entities)
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
-            
-            if result:
-                if len(result) == 0:
-                    return "✅ No items are currently below minimum stock levels."
-
-                response_data = f"**Low Stock Alerts - Company {company_id}**\n\n"
-                response_data += "🚨 **Immediate Attention Required:**\n"
-
-                for item in result:
-                    response_data += f"📦 **Product {item['product_id']}** (Warehouse {item['warehouse_id']}):\n"
-                    response_data += f"   Current Stock: {item['quantity']} units\n"
-                    response_data += f"   Minimum Required: {item['min_qty_alert']} units\n"
-                    response_data += f"   Shortage: {item['shortage']} units\n"
-                    response_data += f"   Reorder Point: {item['reorder_qty_alert']} units\n\n"
-
-                return response_data
-            else:
-                return "No low stock items found."
+            result = db.execute_query(query, (company_id,) + params, company_id=company_id)
+            products = dimension_cache.get('products', company_id) if result else None
+            return self._render_low_stock_items(company_id, result, products, date_range)
+        except Exception as e:
+            return f"Error retrieving low stock items: {str(e)}"
 
+    async def get_low_stock_items_async(self, company_id, date_range=None, entities=None):
+        """get_low_stock_items on the asyncio data layer"""
+        try:
+            query, params = self._low_stock_query(date_range, entities)
+            result = await async_db.fetch(query, (company_id,) + params, company_id=company_id)
+            # Product names come from the dimension cache; load it off the event loop
+            products = await asyncio.to_thread(dimension_cache.get, 'products', company_id) if result else None
+            return self._render_low_stock_items(company_id, result, products, date_range)
         except Exception as e:
             return f"Error retrieving low stock items: {str(e)}"
 
-    def get_out_of_stock_items(self, company_id):
+    def _low_stock_query(self, date_range=None, entities=None):
+        """(query, params after company_id) for the most short items.
+
+        Unlike the other stock queries this one joins products: each row is
+        compared with its own product's threshold and only the top shortages
+        are returned, which needs the thresholds in SQL.
+        """
+        date_sql, date_params = date_filter("stock.stock_date", date_range)
+        entity_sql, entity_params = entity_filter(STOCK_ENTITY_COLUMNS, entities)
+        # FIXED: Using %s placeholder instead of f-string
+        query = f"""
+            SELECT stock.product_id,
+                   stock.quantity,
+                   products.min_qty_alert,
+                   products.reorder_qty_alert,
+                   (products.min_qty_alert - stock.quantity) as shortage,
+                   stock.warehouse_id
+            FROM stock
+                     LEFT JOIN products ON products.product_id = stock.product_id
+            WHERE stock.company_id = %s
+              AND stock.quantity <= products.min_qty_alert
+              AND stock.stock_type = 'purchase'{date_sql}{entity_sql}
+            ORDER BY shortage DESC LIMIT {LOW_STOCK_LIMIT}
+        """
+        return query, date_params + entity_params
+
+    def _render_low_stock_items(self, company_id, result, products, date_range=None):
+        if not result:
+            return "No low stock items found."
+
+        response_data = f"**Low Stock Alerts - Company {company_id}{period_suffix(date_range)}**\n\n"
+        response_data += "🚨 **Immediate Attention Required:**\n"
+
+        for item in result:
+            response_data += f"📦 **{product_label(products, item['product_id'])}** (Warehouse {item['warehouse_id']}):\n"
+            response_data += f"   Current Stock: {item['quantity']} units\n"
+            response_data += f"   Minimum Required: {item['min_qty_alert']} units\n"
+            response_data += f"   Shortage: {item['shortage']} units\n"
+            response_data += f"   Reorder Point: {item['reorder_qty_alert']} units\n\n"
+
+        return response_data
+
+    def get_out_of_stock_items(self, company_id, date_range=None, entities=None):
         """Get out of stock items - FIXED with parameterized query"""
         try:
+            date_sql, date_params = date_filter("stock.stock_date", date_range)
+            entity_sql, entity_params = entity_filter(STOCK_ENTITY_COLUMNS, entities)
             # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT stock.product_id,
-                       stock.warehouse_id,
-                       products.min_qty_alert,
-                       products.reorder_qty_alert
+            # Alert levels come from the product dimension cache, so stock is read without a join
+            query = f"""
+                SELECT product_id,
+                       warehouse_id
                 FROM stock
-                         LEFT JOIN products ON products.product_id = stock.product_id
-                WHERE stock.company_id = %s
-                  AND stock.quantity = 0
-                  AND stock.stock_type = 'purchase'
+                WHERE company_id = %s
+                  AND quantity = 0
+                  AND stock_type = 'purchase'{date_sql}{entity_sql}
                 ORDER BY product_id LIMIT 15
             """
 
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
+            result = db.execute_query(query, (company_id,) + date_params + entity_params, company_id=company_id)
+            products = dimension_cache.get('products', company_id) if result else None
             
             if result:
                 if len(result) == 0:
                     return "✅ No items are currently out of stock."
 
-                response_data = f"**Out of Stock Items - Company {company_id}**\n\n"
+                response_data = f"**Out of Stock Items - Company {company_id}{period_suffix(date_range)}**\n\n"
                 response_data += "❌ **Zero Stock Alert:**\n"
 
                 for item in result:
-                    response_data += f"📦 **Product {item['product_id']}** (Warehouse {item['warehouse_id']}):\n"
+                    ids = [item['product_id']]
+                    min_qty_alert = _whole(products.attribute('min_qty_alert', ids)[0]) if products is not None else None
+                    reorder_qty_alert = _whole(products.attribute('reorder_qty_alert', ids)[0]) if products is not None else None
+                    response_data += f"📦 **{product_label(products, item['product_id'])}** (Warehouse {item['warehouse_id']}):\n"
                     response_data += f"   Status: COMPLETELY OUT OF STOCK\n"
-                    response_data += f"   Minimum Required: {item['min_qty_alert']} units\n"
-                    response_data += f"   Reorder Point: {item['reorder_qty_alert']} units\n\n"
+                    response_data += f"   Minimum Required: {min_qty_alert} units\n"
+                    response_data += f"   Reorder Point: {reorder_qty_alert} units\n\n"
 
                 return response_data
             else:
@@ -225,31 +354,33 @@ class InventoryAgent:
         except Exception as e:
             return f"Error retrieving out of stock items: {str(e)}"
 
-    def get_product_inventory(self, company_id):
+    def get_product_inventory(self, company_id, date_range=None, entities=None):
         """Get product inventory distribution - FIXED with parameterized query"""
         try:
+            date_sql, date_params = date_filter("stock.stock_date", date_range)
+            entity_sql, entity_params = entity_filter(STOCK_ENTITY_COLUMNS, entities)
             # FIXED: Using %s placeholder instead of f-string
-            query = """
+            query = f"""
                 SELECT product_id,
                        SUM(quantity)                as total_quantity,
                        COUNT(DISTINCT warehouse_id) as warehouse_count,
                        AVG(quantity)                as avg_quantity
                 FROM stock
                 WHERE company_id = %s
-                  AND stock_type = 'purchase'
+                  AND stock_type = 'purchase'{date_sql}{entity_sql}
                 GROUP BY product_id
                 ORDER BY total_quantity DESC LIMIT 15
             """
 
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
+            result = db.execute_query(query, (company_id,) + date_params + entity_params, company_id=company_id)
             
             if result:
-                response_data = f"**Product Inventory Distribution - Company {company_id}**\n\n"
+                response_data = f"**Product Inventory Distribution - Company {company_id}{period_suffix(date_range)}**\n\n"
                 response_data += "📊 **Stock by Product:**\n"
 
                 for product in result:
-                    response_data += f"📦 **Product {product['product_id']}**:\n"
+                    response_data += f"📦 **{dimension_cache.product_name(company_id, product['product_id'])}**:\n"
                     response_data += f"   Total Quantity: {product['total_quantity']:,} units\n"
                     response_data += f"   Warehouses: {product['warehouse_count']} locations\n"
                     response_data += f"   Average per Location: {product['avg_quantity']:,.0f} units\n\n"
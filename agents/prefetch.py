@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+from agents.registry import agent_registry
+from database.change_tracker import change_tracker
+from database.db_connection import db
+from resilience import CircuitBreaker, deadline_scope
+
+
+# Agent methods warmed when a company is selected, as (agent registry name, method name)
+PREFETCH_METHODS = [
+    ('sales', 'get_regional_sales'),
+    ('sales', 'get_product_sales'),
+    ('inventory', 'get_low_stock_items'),
+    ('cashflow', 'get_transaction_breakdown'),
+]
+PREFETCH_DEADLINE = 30
+
+
+class Prefetcher:
+    """Warms the query cache for a newly selected company in the background.
+
+    One low-priority thread runs the methods in PREFETCH_METHODS through
+    the normal agent code, so the first chat question about regions,
+    products, low stock or the transaction breakdown is a cache hit. It
+    runs one query at a time, waits while foreground queries are in
+    flight, stops while the database circuit is open, and takes the most
+    recently selected company first. A company is warmed again only after
+    the change tracker reports new data for it.
+    """
+
+    def __init__(self, methods=None, max_pending=20, idle_wait=2.0):
+        self.methods = methods or PREFETCH_METHODS
+        self.max_pending = max_pending
+        self.idle_wait = idle_wait
+        self._pending = OrderedDict()
+        self._warmed = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.completed = 0
+
+    def start(self):
+        """Start the background worker (safe to call on every rerun)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+            self._thread.start()
+            print(f"🔥 Prefetcher started ({len(self.methods)} queries per company)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def schedule(self, company_id):
+        """Queue a company for warming unless it is already warm for its current data version"""
+        company_id = str(company_id)
+        version = change_tracker.version(company_id)
+        with self._lock:
+            if self._warmed.get(company_id) == version:
+                return False
+            self._pending[company_id] = version
+            self._pending.move_to_end(company_id)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+        self._wake.set()
+        return True
+
+    def _next(self):
+        with self._lock:
+            if not self._pending:
+                self._wake.clear()
+                return None
+            # Newest selection first: that is the company the user is looking at
+            return self._pending.popitem(last=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._next()
+            if item is None:
+                self._wake.wait(timeout=60)
+                continue
+            self.warm(*item)
+
+    def _wait_for_idle(self):
+        """Hold off while other queries are in flight; False if the database is unavailable"""
+        while db.single_flight.in_flight() > 0 and not self._stop.is_set():
+            time.sleep(self.idle_wait)
+        return db.circuit_breaker.state != CircuitBreaker.OPEN
+
+    def warm(self, company_id, version=None):
+        started = time.time()
+        for agent_name, method_name in self.methods:
+            if not self._wait_for_idle():
+                print(f"⏸️ Prefetch for company {company_id} stopped (database unavailable)")
+                return
+            try:
+                with deadline_scope(PREFETCH_DEADLINE):
+                    result = getattr(agent_registry.get(agent_name), method_name)(company_id)
+            except Exception as e:
+                result = f"Error: {e}"
+            # Agents report failures as text; don't mark the company warm on an error
+            if isinstance(result, str) and result.startswith("Error"):
+                print(f"⚠️ Prefetch {agent_name}.{method_name} failed for company {company_id}")
+                return
+
+        with self._lock:
+            self._warmed[company_id] = change_tracker.version(company_id) if version is None else version
+            self.completed += 1
+        print(f"🔥 Prefetched {len(self.methods)} queries for company {company_id} in {time.time() - started:.1f}s")
+
+    def stats(self):
+        with self._lock:
+            return {'pending': len(self._pending), 'warm_companies': len(self._warmed), 'completed': self.completed}
+
+
+# Global prefetcher instance
+prefetcher = Prefetcher()
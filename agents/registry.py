@@ -0,0 +1,46 @@
+import threading
+
+from agents.sales_agent import SalesAgent
+from agents.inventory_agent import InventoryAgent
+from agents.cashflow_agent import CashFlowAgent
+from agents.sql_agent import SqlAgent
+
+
+AGENT_CLASSES = {
+    'sales': SalesAgent,
+    'inventory': InventoryAgent,
+    'cashflow': CashFlowAgent,
+    'sql': SqlAgent,
+}
+
+
+class AgentRegistry:
+    """Process-wide agent singletons, created once on first use and shared by every session and thread.
+
+    Agents keep no per-request state (their dispatch tables are built in
+    __init__ and only read afterwards), so one instance can serve
+    concurrent sessions.
+    """
+
+    def __init__(self, classes=None):
+        self._classes = dict(classes or AGENT_CLASSES)
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        agent = self._instances.get(name)
+        if agent is None:
+            with self._lock:
+                agent = self._instances.get(name)
+                if agent is None:
+                    agent = self._classes[name]()
+                    self._instances[name] = agent
+                    print(f"🧩 Agent '{name}' created")
+        return agent
+
+    def all(self):
+        return {name: self.get(name) for name in self._classes}
+
+
+# Global agent registry instance
+agent_registry = AgentRegistry()
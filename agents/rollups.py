@@ -0,0 +1,342 @@
+import base64
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from agents.time_window import DateRange
+from database.db_connection import db
+from database.rollup_store import rollup_store
+from database.sketches import DDSketch, HyperLogLog
+
+
+ROLLUP_BACKFILL_DAYS = int(os.getenv('ROLLUP_BACKFILL_DAYS', '1095'))
+ROLLUP_REBUILD_DAYS = int(os.getenv('ROLLUP_REBUILD_DAYS', '7'))
+ROLLUP_SETTLE_DAYS = int(os.getenv('ROLLUP_SETTLE_DAYS', str(ROLLUP_REBUILD_DAYS)))
+ROLLUP_MAX_TAIL_DAYS = int(os.getenv('ROLLUP_MAX_TAIL_DAYS', '14'))
+
+# One row per invoice per day: enough to sum revenue exactly and sketch customers and invoice totals
+SALES_ROLLUP_QUERY = """
+    SELECT CAST(issue_date AS DATE) AS day,
+           invoice_id,
+           customer_id,
+           SUM(total)      AS invoice_total,
+           COUNT(total)    AS valued_lines,
+           SUM(quantity)   AS units,
+           MAX(issue_date) AS latest
+    FROM sales_facts
+    WHERE company_id = %s
+      AND status IN ('unpaid', 'paid', 'remaining'){date_filter}
+    GROUP BY CAST(issue_date AS DATE), invoice_id, customer_id
+"""
+
+# One row per voucher per day
+CASHFLOW_ROLLUP_QUERY = """
+    SELECT CAST(voucher_date AS DATE) AS day,
+           voucher_id,
+           COUNT(*)                 AS transactions,
+           SUM(COALESCE(credit, 0)) AS inflow,
+           SUM(COALESCE(debit, 0))  AS outflow
+    FROM voucher_items
+    WHERE company_id = %s{date_filter}
+    GROUP BY CAST(voucher_date AS DATE), voucher_id
+"""
+
+
+# Source rows added since the last build, by day: finds invoices or vouchers entered with an earlier date
+NEW_KEYS_QUERY = """
+    SELECT CAST({date_column} AS DATE) AS day, MAX({key}) AS max_key
+    FROM {table}
+    WHERE company_id = %s
+      AND {key} > %s
+    GROUP BY CAST({date_column} AS DATE)
+"""
+
+MAX_KEY_QUERY = "SELECT MAX({key}) AS max_key FROM {table} WHERE company_id = %s"
+
+
+def _encode(sketch):
+    return base64.b64encode(sketch.to_bytes()).decode('ascii')
+
+
+def _decode(text):
+    return HyperLogLog.from_bytes(base64.b64decode(text))
+
+
+def _whole(value):
+    """Show integral unit counts without a trailing .0"""
+    return int(value) if float(value).is_integer() else value
+
+
+def _sales_day(rows):
+    customers = HyperLogLog()
+    customers.add_many(rows['customer_id'])
+    invoice_values = DDSketch()
+    invoice_values.add_many(rows['invoice_total'])
+    return {
+        'invoices': int(rows['invoice_id'].nunique()),
+        'revenue': float(rows['invoice_total'].sum()),
+        'valued_lines': int(rows['valued_lines'].sum()),
+        'units': float(rows['units'].sum()),
+        'latest': pd.Timestamp(rows['latest'].max()).isoformat(),
+        'customers': _encode(customers),
+        'invoice_values': invoice_values.to_dict(),
+    }
+
+
+def _sales_summary(days):
+    """A SALES_SUMMARY_METRICS-shaped row merged from day payloads, plus invoice total quantiles"""
+    customers, invoice_values = HyperLogLog(), DDSketch()
+    invoices = valued_lines = 0
+    revenue = units = 0.0
+    latest = None
+    for day in days:
+        invoices += day['invoices']
+        revenue += day['revenue']
+        valued_lines += day['valued_lines']
+        units += day['units']
+        latest = max(latest, day['latest']) if latest else day['latest']
+        customers.merge(_decode(day['customers']))
+        invoice_values.merge(DDSketch.from_dict(day['invoice_values']))
+    return {
+        'total_invoices': invoices,
+        'total_revenue': revenue,
+        'avg_invoice_value': revenue / valued_lines if valued_lines else None,
+        'unique_customers': customers.estimate(),
+        'latest_invoice': datetime.fromisoformat(latest) if latest else None,
+        'total_units_sold': _whole(units),
+        'median_invoice_total': invoice_values.quantile(0.5),
+        'p90_invoice_total': invoice_values.quantile(0.9),
+        'approximate': True,
+    }
+
+
+def _cashflow_day(rows):
+    vouchers = HyperLogLog()
+    vouchers.add_many(rows['voucher_id'])
+    return {
+        'transactions': int(rows['transactions'].sum()),
+        'inflow': float(rows['inflow'].sum()),
+        'outflow': float(rows['outflow'].sum()),
+        'vouchers': _encode(vouchers),
+    }
+
+
+def _cashflow_summary(days):
+    """A CASHFLOW_SUMMARY_METRICS-shaped row merged from day payloads"""
+    vouchers = HyperLogLog()
+    transactions, inflow, outflow = 0, 0.0, 0.0
+    for day in days:
+        transactions += day['transactions']
+        inflow += day['inflow']
+        outflow += day['outflow']
+        vouchers.merge(_decode(day['vouchers']))
+    return {
+        'transaction_count': transactions,
+        'total_inflow': inflow,
+        'total_outflow': outflow,
+        'unique_vouchers': vouchers.estimate(),
+        'approximate': True,
+    }
+
+
+# Rollup kind -> per-day query, its date column, day payload builder, range merger, the tables whose
+# change events can touch it and the (table, key, date column) that dates new source rows
+ROLLUP_KINDS = {
+    'sales': {'query': SALES_ROLLUP_QUERY, 'date_column': 'issue_date', 'day': _sales_day,
+              'summary': _sales_summary, 'tables': ('sales_invoice', 'sales_items'),
+              'keys': ('sales_invoice', 'invoice_id', 'invoice_date')},
+    'cashflow': {'query': CASHFLOW_ROLLUP_QUERY, 'date_column': 'voucher_date', 'day': _cashflow_day,
+                 'summary': _cashflow_summary, 'tables': ('voucher_items',),
+                 'keys': ('voucher_items', 'voucher_id', 'voucher_date')},
+}
+
+
+class DailyRollups:
+    """Per-company, per-day rollups of the sales and cash flow summaries.
+
+    Each day keeps exact sums and counts plus mergeable sketches: a
+    HyperLogLog of customers (sales) or vouchers (cash flow) and a DDSketch
+    of invoice totals. A summary for any date range merges the stored days
+    instead of rescanning history; the last `settle_days` (still open to
+    edits) and any days after the last build are rolled up live from a small
+    tail query. Distinct counts are estimates (about 1.6% standard error);
+    invoices are counted exactly because each invoice falls on a single day.
+
+    precompute.py builds the rollups nightly: a backfill of `backfill_days`
+    the first time, then the last `rebuild_days` again to pick up late edits.
+    Between builds, change events re-roll the stored days that gained
+    backdated invoices or vouchers (see invalidate_company).
+    """
+
+    def __init__(self, backfill_days=ROLLUP_BACKFILL_DAYS, rebuild_days=ROLLUP_REBUILD_DAYS,
+                 max_tail_days=ROLLUP_MAX_TAIL_DAYS, settle_days=ROLLUP_SETTLE_DAYS):
+        self.backfill_days = backfill_days
+        self.rebuild_days = rebuild_days
+        self.max_tail_days = max_tail_days
+        self.settle_days = settle_days
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _max_key(self, kind, company_id):
+        """Highest source key in the database, 0 when there are no rows, or None if the query failed"""
+        table, key, _ = ROLLUP_KINDS[kind]['keys']
+        rows = db.execute_query(MAX_KEY_QUERY.format(key=key, table=table), (company_id,), company_id=company_id)
+        if rows is None or db.last_result_stale_since() is not None:
+            return None
+        return int(rows[0]['max_key'] or 0) if rows else 0
+
+    def _fetch_days(self, kind, company_id, start, end):
+        """{day: payload} rolled up from the database for [start, end), or None if the query failed"""
+        spec = ROLLUP_KINDS[kind]
+        date_sql, date_params = DateRange(start, end).sql(spec['date_column'])
+        rows = db.execute_query(spec['query'].format(date_filter=date_sql), (company_id,) + date_params,
+                                company_id=company_id)
+        if rows is None or db.last_result_stale_since() is not None:
+            return None
+        frame = pd.DataFrame(rows)
+        if frame.empty:
+            return {}
+        frame['day'] = pd.to_datetime(frame['day']).dt.date
+        for column in frame.columns.drop(['day', 'latest'], errors='ignore'):
+            frame[column] = pd.to_numeric(frame[column])
+        return {day: spec['day'](group) for day, group in frame.groupby('day')}
+
+    def build(self, company_id, kind, today=None):
+        """Roll up completed days (before today); returns the number of days stored, or None on failure"""
+        today = today or date.today()
+        coverage = rollup_store.coverage(company_id, kind)
+        if coverage is None:
+            start = today - timedelta(days=self.backfill_days)
+        else:
+            # Overlap the previous build so a missed night leaves no gap
+            start = max(coverage[0], min(coverage[1], today) - timedelta(days=self.rebuild_days))
+        if start >= today:
+            return 0
+
+        # Read the watermark first: rows added while the days are fetched are re-checked on the next event
+        max_key = self._max_key(kind, company_id)
+        days = self._fetch_days(kind, company_id, start, today) if max_key is not None else None
+        if days is None:
+            print(f"❌ {kind} rollup for company {company_id} failed: database unavailable")
+            return None
+        stored = rollup_store.put_days(company_id, kind, {day: json.dumps(payload) for day, payload in days.items()},
+                                       start, today)
+        rollup_store.advance_max_key(company_id, kind, max_key)
+        print(f"📐 Rolled up {kind} for company {company_id}: {stored} active days from {start}")
+        return stored
+
+    def build_many(self, company_ids, today=None):
+        """Build every rollup kind for many companies; returns the number of companies that failed"""
+        failed = 0
+        for company_id in company_ids:
+            try:
+                if any(self.build(company_id, kind, today) is None for kind in ROLLUP_KINDS):
+                    failed += 1
+            except Exception as e:
+                failed += 1
+                print(f"❌ Rollup for company {company_id} failed: {e}")
+        return failed
+
+    def subscribe_to(self, change_tracker):
+        change_tracker.subscribe(self.invalidate_company)
+
+    def invalidate_company(self, company_id, tables=None):
+        """Re-roll the stored days that gained backdated rows (ChangeTracker callback).
+
+        Invoices or vouchers past the stored key watermark are grouped by
+        date; days inside the built coverage are fetched again, later days are
+        left to the live tail. Edits to existing rows bring no new key: the
+        settle window and the nightly rebuild cover those.
+        """
+        for kind, spec in ROLLUP_KINDS.items():
+            if tables is not None and not set(tables).intersection(spec['tables']):
+                continue
+            try:
+                if self._refresh_backdated(kind, company_id) is None:
+                    print(f"⚠️ {kind} rollup for company {company_id} not refreshed: database unavailable")
+            except Exception as e:
+                print(f"⚠️ {kind} rollup for company {company_id} not refreshed: {e}")
+
+    def _refresh_backdated(self, kind, company_id):
+        """Number of stored days rolled up again, or None if the database failed (the watermark stays put)"""
+        coverage = rollup_store.coverage(company_id, kind)
+        watermark = rollup_store.max_key(company_id, kind)
+        if coverage is None or watermark is None:
+            return 0
+        table, key, date_column = ROLLUP_KINDS[kind]['keys']
+        rows = db.execute_query(NEW_KEYS_QUERY.format(table=table, key=key, date_column=date_column),
+                                (company_id, watermark), company_id=company_id)
+        if rows is None or db.last_result_stale_since() is not None:
+            return None
+        if not rows:
+            return 0
+
+        refreshed = 0
+        for row in rows:
+            if row['day'] is None:
+                continue
+            day = pd.Timestamp(row['day']).date()
+            if not coverage[0] <= day < coverage[1]:
+                continue
+            days = self._fetch_days(kind, company_id, day, day + timedelta(days=1))
+            if days is None:
+                return None
+            rollup_store.put_days(company_id, kind, {d: json.dumps(payload) for d, payload in days.items()},
+                                  day, day + timedelta(days=1))
+            refreshed += 1
+        rollup_store.advance_max_key(company_id, kind, max(int(row['max_key']) for row in rows))
+        if refreshed:
+            print(f"📐 Re-rolled {refreshed} backdated {kind} days for company {company_id}")
+        return refreshed
+
+    def summary(self, kind, company_id, date_range):
+        """Summary row for a date range merged from daily rollups, or None when they don't cover it"""
+        if date_range is None:
+            return None
+        coverage = rollup_store.coverage(company_id, kind)
+        usable = coverage is not None and date_range.start >= coverage[0]
+        if usable:
+            # Recent days still open to edits and days since the last build (up to today) are rolled up
+            # live; a long gap means rollups are stale
+            today = date.today()
+            tail_start = max(date_range.start, min(coverage[1], today - timedelta(days=self.settle_days)))
+            tail_end = min(date_range.end, today + timedelta(days=1))
+            usable = (tail_end - tail_start).days <= self.max_tail_days
+        if not usable:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            stored_end = min(date_range.end, tail_start)
+            days = []
+            if date_range.start < stored_end:
+                days = [json.loads(p) for p in rollup_store.get_days(company_id, kind, date_range.start, stored_end)]
+            if tail_start < tail_end:
+                tail = self._fetch_days(kind, company_id, tail_start, tail_end)
+                if tail is None:
+                    raise RuntimeError("database unavailable for the days since the last rollup")
+                days.extend(tail.values())
+            summary = ROLLUP_KINDS[kind]['summary'](days)
+        except Exception as e:
+            print(f"⚠️ {kind} rollup summary for company {company_id} unavailable: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        print(f"📐 {kind} summary for company {company_id} merged from {len(days)} daily rollups")
+        return summary
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+# Global daily rollups instance
+daily_rollups = DailyRollups()
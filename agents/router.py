@@ -0,0 +1,237 @@
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from agents.registry import agent_registry
+from database.change_tracker import change_tracker
+from database.snapshot_store import snapshot_store
+from llm.openrouter_client import llm_client
+from resilience import time_budget
+
+
+# Chat routing keywords; routes are checked in this order
+GUIDE_WORDS = ['how to', 'how do i', 'create', 'make', 'generate', 'add', 'new']
+ROUTE_KEYWORDS = [
+    ("cashflow", ['cash', 'flow', 'financial', 'payment', 'voucher', 'liquidity']),
+    ("sales", ['sales', 'revenue', 'invoice', 'order', 'sell', 'customer']),
+    ("inventory", ['inventory', 'stock', 'warehouse', 'quantity', 'low stock', 'out of stock']),
+]
+HELP_WORDS = ['help', 'what can', 'assist', 'support', 'guide', 'manual']
+
+# Summary kinds served by get_summary: route -> agent method
+SUMMARY_METHODS = {
+    "sales": "get_sales_summary",
+    "cashflow": "get_cashflow_summary",
+    "inventory": "get_inventory_summary",
+}
+
+# Footer of live agent answers, replaced by the computed-at time when a snapshot is served
+LIVE_FOOTER = re.compile(r"\*Live data from [^*\n]*\*")
+
+# With CHAT_LLM_ROUTING=1 the LLM picks the agent; the keyword guess is fetched speculatively meanwhile
+LLM_ROUTING = os.getenv('CHAT_LLM_ROUTING', '0') == '1'
+SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', 8))
+# Longest wait (seconds) for a kept speculative fetch, cut short by the request deadline
+SPECULATION_WAIT = int(os.getenv('SPECULATION_WAIT', 30))
+
+HELP_TEXT = """
+I'm your AI assistant for Company {company_id}, connected to AWS RDS with live ERP data.
+
+I can help you with:
+
+📊 **Data Analysis:**
+• Sales performance and revenue reports
+• Inventory levels and stock management
+• Cash flow and financial position
+• Month-over-month, year-over-year and rolling comparisons
+
+📝 **Procedural Guides:**
+• How to create Sales Invoices
+• How to manage inventory
+• How to process payments
+
+Try asking me:
+• "How do I create a sales invoice?"
+• "Show me sales summary"
+• "What's our cash flow position?"
+• "How do sales this month compare to last month?"
+• "Any inventory alerts?"
+"""
+
+
+def detect_route(query):
+    """First route whose keywords appear in the query, or None"""
+    query_lower = query.lower()
+    return next((name for name, words in ROUTE_KEYWORDS if any(word in query_lower for word in words)), None)
+
+
+def _snapshot(company_id, method_name):
+    """A snapshot's payload labelled with when it was computed, or None if it may be out of date"""
+    # The snapshot must have been computed from the data the change tracker sees now
+    snapshot = snapshot_store.get(company_id, method_name, change_tracker.signature(company_id))
+    if snapshot is None:
+        return None
+    payload, computed_at = snapshot
+    label = f"*Precomputed snapshot from {computed_at.strftime('%Y-%m-%d %H:%M')} (no changes since)*"
+    labelled, replaced = LIVE_FOOTER.subn(label, payload)
+    return labelled if replaced else f"{payload.rstrip()}\n\n{label}\n"
+
+
+def get_summary(route, company_id):
+    """Serve a summary from the nightly snapshot store, querying live only if it is stale or missing"""
+    method_name = SUMMARY_METHODS[route]
+    snapshot = _snapshot(company_id, method_name)
+    if snapshot is not None:
+        return snapshot
+    return getattr(agent_registry.get(route), method_name)(company_id)
+
+
+async def get_summary_async(route, company_id):
+    """get_summary for asyncio callers: the live query runs on the async data layer"""
+    method_name = SUMMARY_METHODS[route]
+    snapshot = _snapshot(company_id, method_name)
+    if snapshot is not None:
+        return snapshot
+    return await getattr(agent_registry.get(route), f"{method_name}_async")(company_id)
+
+
+def llm_route(query, company_id):
+    """(route, method) chosen by the LLM intent classifier; route is None for general or unclassified questions"""
+    classified = llm_client.classify_intent(query, company_id) or {}
+    route = classified.get("intent")
+    # Without an LLM answer the keyword router's own choice stands
+    if classified.get("source") == "fallback" or route not in SUMMARY_METHODS:
+        return None, None
+    agent = agent_registry.get(route)
+    method = classified.get("suggested_agent_method")
+    if method not in agent.method_map:
+        method = agent._detect_method(query)
+    return route, method
+
+
+class SpeculativeRouter:
+    """Starts the keyword-routed agent query while the LLM classifies the question.
+
+    If the LLM picks the same route and method the speculative result is
+    used, so a turn costs about max(LLM, DB) instead of LLM + DB. Otherwise
+    the speculative query is cancelled (or its result dropped if it already
+    started) and the LLM's choice is run.
+    """
+
+    def __init__(self, max_workers=SPECULATION_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-fetch")
+        self._lock = threading.Lock()
+        self.kept = 0
+        self.discarded = 0
+
+    def _count(self, kept):
+        with self._lock:
+            if kept:
+                self.kept += 1
+            else:
+                self.discarded += 1
+
+    def run(self, guess, company_id, history=None):
+        """Return (intent, response) for a keyword-routed guess, confirmed or overruled by the LLM"""
+        # Ad-hoc SQL is itself an LLM call, so it is never started speculatively
+        future = None
+        if guess["route"] != "sql":
+            context = contextvars.copy_context()
+            future = self.executor.submit(context.run, run_intent, guess, company_id, history)
+
+        route, method = llm_route(guess["question"], company_id)
+        if route is None or (route == guess["route"] and method == guess["method"]):
+            if future is not None:
+                self._count(kept=True)
+                print(f"🎯 Speculative {guess['route']} fetch kept (LLM agreed)")
+                try:
+                    return guess, future.result(timeout=max(0, time_budget(SPECULATION_WAIT)))
+                except FutureTimeoutError:
+                    # The fetch keeps its worker until the database gives up; this request doesn't wait for it
+                    print(f"⏱️ Speculative {guess['route']} fetch still running at the deadline")
+                    return guess, (f"Fetching the {guess['route']} data for company {company_id} took too long. "
+                                   f"Please try again in a moment.")
+            return guess, run_intent(guess, company_id, history)
+
+        if future is not None:
+            self._count(kept=False)
+            cancelled = future.cancel()
+            print(f"🗑️ Speculative {guess['route']} fetch {'cancelled' if cancelled else 'discarded'} "
+                  f"(LLM chose {route}.{method})")
+        intent = dict(guess, route=route, method=method)
+        return intent, run_intent(intent, company_id, history)
+
+    def stats(self):
+        with self._lock:
+            return {'kept': self.kept, 'discarded': self.discarded}
+
+
+speculative_router = SpeculativeRouter()
+
+
+def run_intent(intent, company_id, history=None):
+    """Answer a routed question: {route, method, question, date_range}"""
+    if intent["route"] == "sql":
+        # Ad-hoc questions go to validated text-to-SQL; without an LLM fall back to the sales summary
+        response = agent_registry.get("sql").process_query(intent["question"], company_id,
+                                                           date_range=intent.get("date_range"), history=history)
+        if response is not None:
+            return response
+        return agent_registry.get("sales").process_query(intent["question"], company_id)
+
+    agent = agent_registry.get(intent["route"])
+    return agent.process_query(intent["question"], company_id, method_name=intent["method"],
+                               date_range=intent.get("date_range"))
+
+
+def process_user_query(query, company_id, conversation=None):
+    """Process user query using keyword matching and agents"""
+    query_lower = query.lower()
+
+    # Follow-ups ("what about last month?") re-run the previous question for the new period
+    if conversation is not None:
+        follow_up = conversation.resolve_follow_up(query)
+        if follow_up is not None:
+            print(f"🔁 Follow-up: re-running {follow_up['route']} question for {follow_up['date_range'].label}")
+            conversation.remember(follow_up)
+            try:
+                return run_intent(follow_up, company_id)
+            except Exception as e:
+                print(f"❌ Follow-up failed: {e}")
+                return f"I couldn't re-run that question for {follow_up['date_range'].label}. Could you rephrase it?"
+
+    # Check for procedure/help queries first
+    if any(word in query_lower for word in GUIDE_WORDS):
+        if any(word in query_lower for word in ['invoice', 'sales invoice', 'bill']):
+            return agent_registry.get("sales").process_query(query, company_id)
+        elif any(word in query_lower for word in ['purchase', 'vendor', 'supplier']):
+            return "Purchase invoice creation guide coming soon!"
+        elif any(word in query_lower for word in ['payment', 'voucher', 'receipt']):
+            return "Payment voucher creation guide coming soon!"
+
+    # Keyword-based intent detection
+    route = detect_route(query)
+    if route is None and any(word in query_lower for word in HELP_WORDS):
+        return HELP_TEXT.format(company_id=company_id)
+    route = route or "sql"
+
+    intent = {"route": route, "question": query, "date_range": None,
+              "method": None if route == "sql" else agent_registry.get(route)._detect_method(query)}
+    # Questions that lean on earlier turns ("and by region?") get the recent history
+    history = None
+    if route == "sql" and conversation is not None and conversation.is_follow_up(query):
+        history = conversation.history_for_llm()
+
+    try:
+        if LLM_ROUTING:
+            intent, response = speculative_router.run(intent, company_id, history)
+        else:
+            response = run_intent(intent, company_id, history)
+    except:
+        return f"I can help you with data analysis or procedural guides for Company {company_id}. What specific information would you like?"
+
+    if conversation is not None:
+        conversation.remember(intent)
+    return response
@@ -1,48 +1,142 @@
+import asyncio
 import re
 import pandas as pd
 from database.db_connection import db
+from database.async_db import async_db
+from database.batch import fetch_by_company
+from database.dimension_cache import dimension_cache, product_label
+from agents.entity_search import entity_filter, entity_note, entity_search
+from agents.rollups import daily_rollups
+from agents.time_window import date_filter, parse_date_range, period_suffix
+from agents.comparison import (KIND_TITLES, comparison_filter, comparison_select, comparison_windows,
+                               format_change, is_comparison_query, parse_comparison, window_span)
+
+
+# Aggregates shared by the single-company and batch sales summaries
+SALES_SUMMARY_METRICS = """
+       COUNT(DISTINCT sales_invoice.invoice_id)  as total_invoices,
+       SUM(sales_items.total)                    as total_revenue,
+       AVG(sales_items.total)                    as avg_invoice_value,
+       COUNT(DISTINCT sales_invoice.customer_id) as unique_customers,
+       MAX(sales_invoice.invoice_date)           as latest_invoice,
+       SUM(sales_items.quantity)                 as total_units_sold
+"""
 
+# Wide per-line sales rows used for forecasting (fetched through the columnar path); sales_facts
+# already carries the delivery date, region and currency, so no joins are needed
+FORECAST_QUERY = """
+    SELECT issue_date, delivery_date, total, sub_total, discount, region_id, region, customer_id,
+           warehouse_id, product_id, quantity, price, tax, status, currency_id, currency, project_id,
+           salesman_id
+    FROM sales_facts
+    WHERE company_id = %s
+      AND status IN ('unpaid', 'paid', 'remaining'){date_filter}
+    ORDER BY issue_date DESC LIMIT 100
+"""
 
-class SalesAgent:
-    def __init__(self):
-        self.keywords = ['sales', 'revenue', 'report', 'performance', 'units sold', 'orders', 'forecast', 'invoice']
+# Current vs previous window aggregates for the comparison engine: (alias, aggregate, expression)
+SALES_COMPARISON_METRICS = [
+    ('revenue', 'SUM({})', 'sales_items.total'),
+    ('units', 'SUM({})', 'sales_items.quantity'),
+    ('invoices', 'COUNT(DISTINCT {})', 'sales_invoice.invoice_id'),
+    ('customers', 'COUNT(DISTINCT {})', 'sales_invoice.customer_id'),
+]
+
+SALES_KEYWORDS = ['sales', 'revenue', 'report', 'performance', 'units sold', 'orders', 'forecast', 'invoice']
+# Trigger words for _detect_method, checked in the order of the branches there
+GUIDE_ACTION_WORDS = ['create', 'new', 'how to', 'make', 'generate', 'add']
+GUIDE_SUBJECT_WORDS = ['invoice', 'sales invoice', 'bill']
+FORECAST_WORDS = ['forecast', 'projection', 'prediction']
+REGION_WORDS = ['region', 'area', 'territory', 'location']
+PRODUCT_WORDS = ['product', 'item', 'sku']
+TOP_WORDS = ['top', 'best', 'popular', 'leading']
+
+# Methods that can be narrowed to a named customer or product, and the columns their queries filter on
+ENTITY_METHODS = {"get_sales_summary", "get_sales_forecast", "get_regional_sales", "get_product_sales",
+                  "get_top_products"}
+ENTITY_KINDS = ('customer', 'product')
+SALES_ENTITY_COLUMNS = {'customer': 'sales_invoice.customer_id', 'product': 'sales_items.product_id'}
+FACT_ENTITY_COLUMNS = {'customer': 'customer_id', 'product': 'product_id'}
 
-    def process_query(self, message, company_id, method_name="auto"):
-        """Process sales query with optional specific method"""
-        if method_name == "auto":
-            method_name = self._detect_method(message)
 
-        method_map = {
+class SalesAgent:
+    def __init__(self):
+        self.keywords = SALES_KEYWORDS
+        # Dispatch table built once; read-only afterwards, so safe to share across sessions
+        self.method_map = {
             "get_sales_summary": self.get_sales_summary,
+            "get_sales_comparison": self.get_sales_comparison,
             "get_sales_forecast": self.get_sales_forecast,
             "get_regional_sales": self.get_regional_sales,
             "get_product_sales": self.get_product_sales,
             "get_top_products": self.get_top_products,
             "get_invoice_creation_guide": self.get_invoice_creation_guide
         }
+        # Methods with a native asyncio version; the rest run in a thread from process_query_async
+        self.async_method_map = {
+            "get_sales_summary": self.get_sales_summary_async,
+            "get_regional_sales": self.get_regional_sales_async,
+            "get_product_sales": self.get_product_sales_async,
+            "get_top_products": self.get_top_products_async,
+        }
 
-        method = method_map.get(method_name, self.get_sales_summary)
-        return method(company_id)
+    def process_query(self, message, company_id, method_name="auto", date_range=None):
+        """Process sales query with optional specific method and date range"""
+        if method_name == "auto":
+            method_name = self._detect_method(message)
+        if method_name == "get_sales_comparison":
+            kind, current, previous = parse_comparison(message)
+            return self.get_sales_comparison(company_id, date_range=date_range or current,
+                                             kind=kind, baseline=previous)
+        if date_range is None:
+            date_range = parse_date_range(message)
+
+        method = self.method_map.get(method_name, self.get_sales_summary)
+        if method_name in ENTITY_METHODS:
+            # "sales for Acme" -> filter on Acme's customer_id
+            entities = entity_search.resolve(message, company_id, kinds=ENTITY_KINDS)
+            if entities:
+                return entity_note(entities) + method(company_id, date_range=date_range, entities=entities)
+        return method(company_id, date_range=date_range)
+
+    async def process_query_async(self, message, company_id, method_name="auto", date_range=None):
+        """process_query for asyncio callers; methods without an async version run in a worker thread"""
+        if method_name == "auto":
+            method_name = self._detect_method(message)
+        if method_name not in self.method_map:
+            method_name = "get_sales_summary"
+        method = self.async_method_map.get(method_name)
+        if method is None:
+            return await asyncio.to_thread(self.process_query, message, company_id, method_name, date_range)
+        if date_range is None:
+            date_range = parse_date_range(message)
+        if method_name in ENTITY_METHODS:
+            entities = await asyncio.to_thread(entity_search.resolve, message, company_id, ENTITY_KINDS)
+            if entities:
+                return entity_note(entities) + await method(company_id, date_range=date_range, entities=entities)
+        return await method(company_id, date_range=date_range)
 
     def _detect_method(self, message):
         """Detect which method to call based on message content"""
         message_lower = message.lower()
 
-        if any(word in message_lower for word in ['create', 'new', 'how to', 'make', 'generate', 'add']) and \
-           any(word in message_lower for word in ['invoice', 'sales invoice', 'bill']):
+        if any(word in message_lower for word in GUIDE_ACTION_WORDS) and \
+           any(word in message_lower for word in GUIDE_SUBJECT_WORDS):
             return "get_invoice_creation_guide"
-        elif any(word in message_lower for word in ['forecast', 'projection', 'prediction']):
+        elif any(word in message_lower for word in FORECAST_WORDS):
             return "get_sales_forecast"
-        elif any(word in message_lower for word in ['region', 'area', 'territory', 'location']):
+        elif is_comparison_query(message_lower):
+            return "get_sales_comparison"
+        elif any(word in message_lower for word in REGION_WORDS):
             return "get_regional_sales"
-        elif any(word in message_lower for word in ['product', 'item', 'sku']):
+        elif any(word in message_lower for word in PRODUCT_WORDS):
             return "get_product_sales"
-        elif any(word in message_lower for word in ['top', 'best', 'popular', 'leading']):
+        elif any(word in message_lower for word in TOP_WORDS):
             return "get_top_products"
         else:
             return "get_sales_summary"
 
-    def get_invoice_creation_guide(self, company_id):
+    def get_invoice_creation_guide(self, company_id, date_range=None):
         """Return the step-by-step guide for creating a sales invoice"""
         guide = f"""
 **📝 SALES INVOICE CREATION GUIDE - Eccountant ERP**
@@ -151,107 +245,129 @@ The system checks:
 """
         return guide
 
-    def get_sales_summary(self, company_id):
+    def get_sales_summary(self, company_id, date_range=None, entities=None):
         """Get sales summary - FIXED with parameterized query"""
         try:
-            # FIXED: Using %s placeholder instead of f-string
-            query = """
-                SELECT COUNT(DISTINCT sales_invoice.invoice_id)  as total_invoices,
-                       SUM(sales_items.total)                    as total_revenue,
-                       AVG(sales_items.total)                    as avg_invoice_value,
-                       COUNT(DISTINCT sales_invoice.customer_id) as unique_customers,
-                       MAX(sales_invoice.invoice_date)           as latest_invoice,
-                       SUM(sales_items.quantity)                 as total_units_sold
-                FROM sales_items
-                         LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
-                         LEFT JOIN contacts ON contacts.contact_id = sales_invoice.customer_id
-                WHERE sales_items.company_id = %s
-                  AND sales_invoice.status IN ('unpaid', 'paid', 'remaining')
-            """
-
+            # A date range is answered from daily rollups when they cover it
+            summary = daily_rollups.summary('sales', company_id, date_range) if entities is None else None
+            if summary is not None:
+                return self._format_sales_summary(company_id, summary, date_range)
+            query, params = self._sales_summary_query(date_range, entities)
             # FIXED: Passing company_id as parameter tuple
-            result = db.execute_query(query, (company_id,))
-            
-            if result and len(result) > 0:
-                summary = result[0]
-
-                # Handle None values
-                total_invoices = summary['total_invoices'] or 0
-                total_revenue = float(summary['total_revenue'] or 0)
-                avg_invoice_value = float(summary['avg_invoice_value'] or 0)
-                unique_customers = summary['unique_customers'] or 0
-                total_units_sold = summary['total_units_sold'] or 0
-
-                if summary['latest_invoice']:
-                    latest_activity = summary['latest_invoice'].strftime('%Y-%m-%d')
-                else:
-                    latest_activity = 'N/A'
+            result = db.execute_query(query, (company_id,) + params, company_id=company_id)
+            return self._render_sales_summary(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving sales summary: {str(e)}"
 
-                response_data = f"""
-**Sales Performance Summary - Company {company_id}**
+    async def get_sales_summary_async(self, company_id, date_range=None, entities=None):
+        """get_sales_summary on the asyncio data layer"""
+        try:
+            if date_range is not None and entities is None:
+                summary = await asyncio.to_thread(daily_rollups.summary, 'sales', company_id, date_range)
+                if summary is not None:
+                    return self._format_sales_summary(company_id, summary, date_range)
+            query, params = self._sales_summary_query(date_range, entities)
+            result = await async_db.fetch(query, (company_id,) + params, company_id=company_id)
+            return self._render_sales_summary(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving sales summary: {str(e)}"
+
+    def _sales_summary_query(self, date_range=None, entities=None):
+        date_sql, date_params = date_filter("sales_invoice.invoice_date", date_range)
+        entity_sql, entity_params = entity_filter(SALES_ENTITY_COLUMNS, entities)
+        # FIXED: Using %s placeholder instead of f-string
+        query = f"""
+            SELECT {SALES_SUMMARY_METRICS}
+            FROM sales_items
+                     LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
+            WHERE sales_items.company_id = %s
+              AND sales_invoice.status IN ('unpaid', 'paid', 'remaining'){date_sql}{entity_sql}
+        """
+        return query, date_params + entity_params
+
+    def _render_sales_summary(self, company_id, result, date_range=None):
+        if result and len(result) > 0:
+            return self._format_sales_summary(company_id, result[0], date_range)
+        return f"No sales data found for company {company_id}"
+
+    def get_sales_summary_many(self, company_ids, chunk_size=100, date_range=None):
+        """Sales summaries for many companies via grouped IN-list queries; returns {company_id: summary}"""
+        date_sql, date_params = date_filter("sales_invoice.invoice_date", date_range)
+        query = f"""
+            SELECT sales_items.company_id,
+                   {SALES_SUMMARY_METRICS}
+            FROM sales_items
+                     LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
+            WHERE sales_items.company_id IN ({{company_ids}})
+              AND sales_invoice.status IN ('unpaid', 'paid', 'remaining'){date_sql}
+            GROUP BY sales_items.company_id
+        """
+        try:
+            rows, failed = fetch_by_company(query, company_ids, date_params, chunk_size=chunk_size)
+        except Exception as e:
+            return {str(c): f"Error retrieving sales summary: {str(e)}" for c in company_ids}
+
+        summaries = {}
+        for c in company_ids:
+            if str(c) in rows:
+                summaries[str(c)] = self._format_sales_summary(c, rows[str(c)][0], date_range)
+            elif str(c) in failed:
+                summaries[str(c)] = "Error retrieving sales summary: database query failed"
+            else:
+                summaries[str(c)] = f"No sales data found for company {c}"
+        return summaries
+
+    def _format_sales_summary(self, company_id, summary, date_range=None):
+        """Render one sales summary row"""
+        # Handle None values
+        total_invoices = summary['total_invoices'] or 0
+        total_revenue = float(summary['total_revenue'] or 0)
+        avg_invoice_value = float(summary['avg_invoice_value'] or 0)
+        unique_customers = summary['unique_customers'] or 0
+        total_units_sold = summary['total_units_sold'] or 0
+
+        if summary['latest_invoice']:
+            latest_activity = summary['latest_invoice'].strftime('%Y-%m-%d')
+        else:
+            latest_activity = 'N/A'
+
+        # Rollup-merged summaries estimate distinct customers and add invoice total quantiles
+        distribution = ""
+        if summary.get('median_invoice_total') is not None:
+            distribution = (f"- Median Invoice Total: ${float(summary['median_invoice_total']):,.2f}\n"
+                            f"- 90th Percentile Invoice Total: ${float(summary['p90_invoice_total']):,.2f}\n")
+        source = ("From daily rollups; unique customers are estimated (about ±2%)" if summary.get('approximate')
+                  else "Live data from AWS RDS database")
+
+        return f"""
+**Sales Performance Summary - Company {company_id}{period_suffix(date_range)}**
 
 📊 **Key Metrics:**
 - Total Invoices: {total_invoices:,}
 - Total Revenue: ${total_revenue:,.2f}
 - Average Invoice Value: ${avg_invoice_value:,.2f}
-- Unique Customers: {unique_customers:,}
+- Unique Customers: {'~' if summary.get('approximate') else ''}{unique_customers:,}
 - Total Units Sold: {total_units_sold:,}
-- Latest Activity: {latest_activity}
+{distribution}- Latest Activity: {latest_activity}
 
-*Live data from AWS RDS database*
+*{source}*
 """
-                return response_data
-            else:
-                return f"No sales data found for company {company_id}"
-
-        except Exception as e:
-            return f"Error retrieving sales summary: {str(e)}"
 
-    def get_sales_forecast(self, company_id):
+    def get_sales_forecast(self, company_id, date_range=None, entities=None):
         """Get sales forecast - FIXED with parameterized query"""
         try:
-            query = """
-                SELECT sales_invoice.invoice_date  AS issue_date,
-                       CASE
-                           WHEN sales_invoice.note_id IS NULL OR sales_invoice.note_id = 0
-                               THEN sales_invoice.invoice_date
-                           ELSE store_issue_note.note_date
-                           END                     AS delivery_date,
-                       sales_items.total,
-                       sales_items.subtotal        AS sub_total,
-                       sales_items.discount_amount AS discount,
-                       contacts.region             AS region_id,
-                       origins.title               AS region,
-                       sales_invoice.customer_id,
-                       sales_invoice.warehouse_id,
-                       sales_items.product_id,
-                       sales_items.quantity,
-                       sales_items.price,
-                       sales_items.tax,
-                       sales_invoice.status,
-                       sales_invoice.currency      AS currency_id,
-                       foreign_currency.title      AS currency,
-                       sales_invoice.project_id,
-                       sales_invoice.salesman      AS salesman_id
-                FROM sales_items
-                         LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
-                         LEFT JOIN store_issue_note ON store_issue_note.note_id = sales_invoice.note_id
-                         LEFT JOIN contacts ON contacts.contact_id = sales_invoice.customer_id
-                         LEFT JOIN origins ON origins.id = contacts.region
-                         LEFT JOIN foreign_currency ON foreign_currency.fc_id = sales_invoice.currency
-                WHERE sales_items.company_id = %s
-                  AND sales_invoice.status IN ('unpaid', 'paid', 'remaining')
-                ORDER BY sales_invoice.invoice_date DESC LIMIT 100
-            """
-
-            df = db.execute_query_dataframe(query, (company_id,))
+            date_sql, date_params = date_filter("issue_date", date_range)
+            entity_sql, entity_params = entity_filter(FACT_ENTITY_COLUMNS, entities)
+            query = FORECAST_QUERY.format(date_filter=date_sql + entity_sql)
+            df = db.execute_query_dataframe(query, (company_id,) + date_params + entity_params, company_id=company_id,
+                                            columnar=True)
             if not df.empty:
                 recent_revenue = float(df['total'].sum() or 0)
                 avg_daily = recent_revenue / min(30, len(df)) if len(df) > 0 else 0
                 monthly_forecast = avg_daily * 30
 
                 response_data = f"""
-**Sales Forecasting Analysis - Company {company_id}**
+**Sales Forecasting Analysis - Company {company_id}{period_suffix(date_range)}**
 
 🔮 **Revenue Projections:**
 - Recent Sample Revenue: ${recent_revenue:,.2f}
@@ -273,76 +389,150 @@ The system checks:
         except Exception as e:
             return f"Error generating sales forecast: {str(e)}"
 
-    def get_regional_sales(self, company_id):
+    def get_regional_sales(self, company_id, date_range=None, entities=None):
         """Get regional sales - FIXED with parameterized query"""
         try:
-            query = """
-                SELECT origins.title                            AS region,
-                       COUNT(DISTINCT sales_invoice.invoice_id) as invoice_count,
-                       SUM(sales_items.total)                   as regional_revenue,
-                       SUM(sales_items.quantity)                as units_sold,
-                       AVG(sales_items.total)                   as avg_order_value
-                FROM sales_items
-                         LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
-                         LEFT JOIN contacts ON contacts.contact_id = sales_invoice.customer_id
-                         LEFT JOIN origins ON origins.id = contacts.region
-                WHERE sales_items.company_id = %s
-                  AND sales_invoice.status IN ('unpaid', 'paid', 'remaining')
-                GROUP BY origins.title
-                ORDER BY regional_revenue DESC
-            """
-
-            result = db.execute_query(query, (company_id,))
-            if result:
-                response_data = f"**Regional Sales Performance - Company {company_id}**\n\n"
-                response_data += "🏢 **Performance by Region:**\n"
-
-                for i, region in enumerate(result, 1):
-                    response_data += f"{i}. **{region['region']}**: ${region['regional_revenue']:,.2f} ({region['invoice_count']} orders, {region['units_sold']} units)\n"
-                    response_data += f"   Average Order: ${region['avg_order_value']:,.2f}\n\n"
-
-                return response_data
-            else:
-                return f"No regional sales data found for company {company_id}"
+            query, params = self._regional_sales_query(date_range, entities)
+            result = db.execute_query(query, (company_id,) + params, company_id=company_id)
+            return self._render_regional_sales(company_id, result, date_range)
+        except Exception as e:
+            return f"Error retrieving regional sales: {str(e)}"
 
+    async def get_regional_sales_async(self, company_id, date_range=None, entities=None):
+        """get_regional_sales on the asyncio data layer"""
+        try:
+            query, params = self._regional_sales_query(date_range, entities)
+            result = await async_db.fetch(query, (company_id,) + params, company_id=company_id)
+            return self._render_regional_sales(company_id, result, date_range)
         except Exception as e:
             return f"Error retrieving regional sales: {str(e)}"
 
-    def get_product_sales(self, company_id):
+    def _regional_sales_query(self, date_range=None, entities=None):
+        date_sql, date_params = date_filter("issue_date", date_range)
+        entity_sql, entity_params = entity_filter(FACT_ENTITY_COLUMNS, entities)
+        query = f"""
+            SELECT region,
+                   COUNT(DISTINCT invoice_id) as invoice_count,
+                   SUM(total)                 as regional_revenue,
+                   SUM(quantity)              as units_sold,
+                   AVG(total)                 as avg_order_value
+            FROM sales_facts
+            WHERE company_id = %s
+              AND status IN ('unpaid', 'paid', 'remaining'){date_sql}{entity_sql}
+            GROUP BY region
+            ORDER BY regional_revenue DESC
+        """
+        return query, date_params + entity_params
+
+    def _render_regional_sales(self, company_id, result, date_range=None):
+        if not result:
+            return f"No regional sales data found for company {company_id}"
+
+        response_data = f"**Regional Sales Performance - Company {company_id}{period_suffix(date_range)}**\n\n"
+        response_data += "🏢 **Performance by Region:**\n"
+
+        for i, region in enumerate(result, 1):
+            response_data += f"{i}. **{region['region']}**: ${region['regional_revenue']:,.2f} ({region['invoice_count']} orders, {region['units_sold']} units)\n"
+            response_data += f"   Average Order: ${region['avg_order_value']:,.2f}\n\n"
+
+        return response_data
+
+    def get_product_sales(self, company_id, date_range=None, entities=None):
         """Get product sales - FIXED with parameterized query"""
         try:
-            query = """
-                SELECT sales_items.product_id,
-                       SUM(sales_items.quantity)                as total_sold,
-                       SUM(sales_items.total)                   as total_revenue,
-                       AVG(sales_items.price)                   as avg_price,
-                       COUNT(DISTINCT sales_invoice.invoice_id) as order_count
+            query, params = self._product_sales_query(date_range, entities)
+            result = db.execute_query(query, (company_id,) + params, company_id=company_id)
+            products = dimension_cache.get('products', company_id) if result else None
+            return self._render_product_sales(company_id, result, products, date_range)
+        except Exception as e:
+            return f"Error retrieving product sales: {str(e)}"
+
+    async def get_product_sales_async(self, company_id, date_range=None, entities=None):
+        """get_product_sales on the asyncio data layer"""
+        try:
+            query, params = self._product_sales_query(date_range, entities)
+            result = await async_db.fetch(query, (company_id,) + params, company_id=company_id)
+            # Product names come from the dimension cache; load it off the event loop
+            products = await asyncio.to_thread(dimension_cache.get, 'products', company_id) if result else None
+            return self._render_product_sales(company_id, result, products, date_range)
+        except Exception as e:
+            return f"Error retrieving product sales: {str(e)}"
+
+    def _product_sales_query(self, date_range=None, entities=None):
+        date_sql, date_params = date_filter("sales_invoice.invoice_date", date_range)
+        entity_sql, entity_params = entity_filter(SALES_ENTITY_COLUMNS, entities)
+        query = f"""
+            SELECT sales_items.product_id,
+                   SUM(sales_items.quantity)                as total_sold,
+                   SUM(sales_items.total)                   as total_revenue,
+                   AVG(sales_items.price)                   as avg_price,
+                   COUNT(DISTINCT sales_invoice.invoice_id) as order_count
+            FROM sales_items
+                     LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
+            WHERE sales_items.company_id = %s
+              AND sales_invoice.status IN ('unpaid', 'paid', 'remaining'){date_sql}{entity_sql}
+            GROUP BY sales_items.product_id
+            ORDER BY total_revenue DESC LIMIT 15
+        """
+        return query, date_params + entity_params
+
+    def _render_product_sales(self, company_id, result, products, date_range=None):
+        if not result:
+            return f"No product sales data found for company {company_id}"
+
+        response_data = f"**Product Sales Analysis - Company {company_id}{period_suffix(date_range)}**\n\n"
+        response_data += "📦 **Top Performing Products:**\n"
+
+        for i, product in enumerate(result, 1):
+            response_data += f"{i}. **{product_label(products, product['product_id'])}**:\n"
+            response_data += f"   Revenue: ${product['total_revenue']:,.2f}\n"
+            response_data += f"   Units Sold: {product['total_sold']:,}\n"
+            response_data += f"   Average Price: ${product['avg_price']:,.2f}\n"
+            response_data += f"   Orders: {product['order_count']}\n\n"
+
+        return response_data
+
+    def get_top_products(self, company_id, date_range=None, entities=None):
+        return self.get_product_sales(company_id, date_range=date_range, entities=entities)
+
+    async def get_top_products_async(self, company_id, date_range=None, entities=None):
+        return await self.get_product_sales_async(company_id, date_range=date_range, entities=entities)
+
+    def get_sales_comparison(self, company_id, date_range=None, kind="mom", baseline=None):
+        """Current vs previous period sales (MoM, YoY or rolling) in one conditional-aggregation query"""
+        try:
+            current, previous = comparison_windows(kind, date_range, baseline)
+            select_sql, select_params = comparison_select(SALES_COMPARISON_METRICS, "sales_invoice.invoice_date",
+                                                          current, previous)
+            window_sql, window_params = comparison_filter("sales_invoice.invoice_date", current, previous)
+            query = f"""
+                SELECT {select_sql}
                 FROM sales_items
                          LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
                 WHERE sales_items.company_id = %s
-                  AND sales_invoice.status IN ('unpaid', 'paid', 'remaining')
-                GROUP BY sales_items.product_id
-                ORDER BY total_revenue DESC LIMIT 15
+                  AND sales_invoice.status IN ('unpaid', 'paid', 'remaining'){window_sql}
             """
 
-            result = db.execute_query(query, (company_id,))
-            if result:
-                response_data = f"**Product Sales Analysis - Company {company_id}**\n\n"
-                response_data += "📦 **Top Performing Products:**\n"
+            params = select_params + (company_id,) + window_params
+            result = db.execute_query(query, params, company_id=company_id)
+            if not result:
+                return f"No sales data found for company {company_id}"
 
-                for i, product in enumerate(result, 1):
-                    response_data += f"{i}. **Product {product['product_id']}**:\n"
-                    response_data += f"   Revenue: ${product['total_revenue']:,.2f}\n"
-                    response_data += f"   Units Sold: {product['total_sold']:,}\n"
-                    response_data += f"   Average Price: ${product['avg_price']:,.2f}\n"
-                    response_data += f"   Orders: {product['order_count']}\n\n"
+            row = result[0]
+            return f"""
+**Sales Comparison ({KIND_TITLES.get(kind, 'Period over Period')}) - Company {company_id}**
 
-                return response_data
-            else:
-                return f"No product sales data found for company {company_id}"
+📅 **Current:** {current.label} ({window_span(current)})
+📅 **Previous:** {window_span(previous)}
 
-        except Exception as e:
-            return f"Error retrieving product sales: {str(e)}"
+📊 **Change:**
+{format_change('Revenue', row['revenue_current'], row['revenue_previous'])}
+{format_change('Units Sold', row['units_current'], row['units_previous'], money=False)}
+{format_change('Invoices', row['invoices_current'], row['invoices_previous'], money=False)}
+{format_change('Customers', row['customers_current'], row['customers_previous'], money=False)}
 
-    def get_top_products(self, company_id):
-        return self.get_product_sales(company_id)
\ No newline at end of file
+*Live data from AWS RDS database*
+"""
+
+        except Exception as e:
+            return f"Error retrieving sales comparison: {str(e)}"
@@ -0,0 +1,324 @@
+import os
+import re
+import threading
+from decimal import Decimal
+
+from database.db_connection import db
+from database.schema_discovery import SchemaDiscovery
+from llm.openrouter_client import llm_client
+from resilience import time_budget
+from agents.sql_templates import (bind_values, describe_placeholders, fill_template, normalize_question,
+                                  placeholders_in, sql_template_cache)
+
+
+# Tables the generated SQL may read. Tables with a company_id column are
+# rewritten into company-scoped derived tables; the rest must be shared lookups.
+SQL_AGENT_TABLES = ['sales_invoice', 'sales_items', 'store_issue_note', 'contacts', 'origins',
+                    'foreign_currency', 'stock', 'products', 'voucher_items']
+SHARED_LOOKUP_TABLES = {'origins', 'foreign_currency'}
+
+MAX_RESULT_ROWS = 200
+DISPLAY_ROWS = 20
+ROW_ESTIMATE_BUDGET = int(os.getenv('SQL_AGENT_ROW_BUDGET', 2_000_000))
+MAX_EXECUTION_MS = int(os.getenv('SQL_AGENT_MAX_EXECUTION_MS', 5000))
+
+FORBIDDEN_PATTERNS = [
+    (r'\bINTO\b', "SELECT ... INTO"),
+    (r'\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b', "locking reads"),
+    (r'\b(?:SLEEP|BENCHMARK|LOAD_FILE|GET_LOCK|RELEASE_LOCK)\s*\(', "server functions"),
+    (r'@', "variables"),
+    (r'\b(?:INFORMATION_SCHEMA|PERFORMANCE_SCHEMA|MYSQL|SYS)\s*\.', "system schemas"),
+]
+# Words that can follow a table name but are not an alias
+NOT_ALIASES = {'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN',
+               'ON', 'USING', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION', 'WINDOW', 'AS'}
+TABLE_REFERENCE = re.compile(r'\b(FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!(?:' + '|'.join(NOT_ALIASES) +
+                             r')\b)`?(\w+)`?)?', re.IGNORECASE)
+TOKEN = re.compile(r'`[^`]*`|\w+|\S')
+LITERAL = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')')
+# Functions whose arguments use FROM without naming a table: EXTRACT(YEAR FROM d), TRIM(x FROM s), ...
+FROM_FUNCTIONS = {'EXTRACT', 'TRIM', 'SUBSTRING', 'SUBSTR', 'POSITION'}
+# Keywords that end a FROM clause at the current nesting level
+FROM_CLAUSE_END = {'WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION', 'WINDOW', 'INTERSECT', 'EXCEPT'}
+TRAILING_LIMIT = re.compile(r'\bLIMIT\s+(\d+|%\(\w+\)s)(?:\s*(,|OFFSET)\s*(\d+|%\(\w+\)s))?\s*$',
+                            re.IGNORECASE)
+
+
+class UnsafeQueryError(Exception):
+    """Generated SQL was rejected by the planner"""
+
+
+def strip_literals(sql):
+    """Blank out string literals so keyword checks don't look inside them"""
+    return LITERAL.sub("''", sql)
+
+
+def function_froms(sql):
+    """Offsets of FROM keywords that are arguments of FROM_FUNCTIONS rather than table references"""
+    # Blank literals without moving anything, so offsets match the original text
+    masked = LITERAL.sub(lambda m: ' ' * len(m.group(0)), sql)
+    offsets = set()
+    calls = []
+    previous = None
+    for match in TOKEN.finditer(masked):
+        token = match.group(0).upper()
+        if token == '(':
+            calls.append(previous)
+        elif token == ')':
+            if calls:
+                calls.pop()
+        elif token == 'FROM' and calls and calls[-1] in FROM_FUNCTIONS:
+            offsets.add(match.start())
+        previous = token
+    return offsets
+
+
+def check_table_references(bare):
+    """Reject table references that the FROM/JOIN scoping could miss.
+
+    Scoping rewrites the table right after each FROM or JOIN, so every table
+    must be introduced that way: no comma-separated tables anywhere in a FROM
+    clause (at any subquery depth), no parenthesized table lists, and no
+    STRAIGHT_JOIN or TABLE. A parenthesis after FROM/JOIN must open a subquery.
+    FROM inside EXTRACT, TRIM, SUBSTRING or POSITION is not a table reference.
+    """
+    matches = list(TOKEN.finditer(bare))
+    tokens = [match.group(0).upper() for match in matches]
+    skipped = function_froms(bare)
+    depth = 0
+    in_from = set()
+    for i, token in enumerate(tokens):
+        if token in ('STRAIGHT_JOIN', 'TABLE'):
+            raise UnsafeQueryError(f"{token} is not allowed")
+        if token == 'FROM' and matches[i].start() in skipped:
+            continue
+        if token in ('FROM', 'JOIN'):
+            if token == 'FROM':
+                in_from.add(depth)
+            following = tokens[i + 1:i + 3]
+            if following[:1] == ['('] and following[1:] != ['SELECT']:
+                raise UnsafeQueryError("parenthesized table references are not allowed")
+        elif token == '(':
+            depth += 1
+        elif token == ')':
+            in_from.discard(depth)
+            depth -= 1
+        elif token in FROM_CLAUSE_END:
+            in_from.discard(depth)
+        elif token == ',' and depth in in_from:
+            raise UnsafeQueryError("use explicit JOIN ... ON instead of comma-separated tables")
+
+
+class SqlAgent:
+    """Answers ad-hoc questions with LLM-written SQL that is validated, company-scoped and cost-capped"""
+
+    def __init__(self):
+        self.keywords = ['list', 'which', 'how many', 'show me', 'who', 'what']
+        self.schema = SchemaDiscovery()
+        self._company_tables = None
+        self._schema_text = None
+        self._lock = threading.Lock()
+
+    def process_query(self, message, company_id, date_range=None, history=None):
+        """Answer a free-form question; returns None when no SQL could be generated (LLM unavailable)
+
+        date_range replaces the question's period (follow-ups like "what about
+        last month?"). history is recent conversation for questions that only
+        make sense in context; such answers bypass the template cache.
+        """
+        try:
+            schema_text = self._load_schema()
+            if not schema_text:
+                return None
+
+            template, values = normalize_question(message)
+            if date_range is not None:
+                if 'period1' not in values:
+                    template += " for {period1}"
+                values['period1'] = date_range
+            schema_hash = sql_template_cache.fingerprint(schema_text)
+            slots = bind_values(values)
+            params = dict(slots, company_id=company_id)
+
+            cached = None if history else sql_template_cache.get(template, schema_hash)
+            if cached is not None and not set(slots) <= placeholders_in(cached[0]):
+                # Written with a literal value for some slot: it would answer a different question
+                sql_template_cache.invalidate(template, schema_hash)
+                cached = None
+            if cached is not None:
+                sql, explanation = cached
+                print(f"⚡ SQL template cache hit: {template}")
+            else:
+                generated = llm_client.generate_sql(template, schema_text, company_id,
+                                                    placeholders=describe_placeholders(values), history=history)
+                if generated is None:
+                    return None
+                sql, explanation = generated['sql'], generated.get('explanation')
+                print(f"🧠 Generated SQL: {sql}")
+
+            scoped_sql = self.plan(sql, params)
+            self.check_cost(scoped_sql, params)
+
+            result = db.execute_query(self.apply_time_limit(scoped_sql), params, company_id=company_id)
+            if result is None:
+                if cached is not None:
+                    sql_template_cache.invalidate(template, schema_hash)
+                return f"Error running the generated query for company {company_id}"
+            if cached is None and not history:
+                # Only SQL that passed validation, the cost check and a real run is reused, and only
+                # if every slot is bound: a literal "10" or "March 2025" would be replayed for later questions
+                literal = set(slots) - placeholders_in(sql)
+                if literal:
+                    print(f"⚠️ Not caching SQL for '{template}': no parameter for {', '.join(sorted(literal))}")
+                else:
+                    sql_template_cache.put(template, schema_hash, sql, explanation)
+            return self._format_result(company_id, fill_template(explanation or '', values), sql, result)
+
+        except UnsafeQueryError as e:
+            print(f"⛔ Generated SQL rejected: {e}")
+            return f"I couldn't answer that safely: {e}. Try rephrasing the question or ask for a sales, inventory or cash flow summary."
+        except Exception as e:
+            return f"Error answering question: {str(e)}"
+
+    def _load_schema(self):
+        """Allowed tables and their columns, read once from SchemaDiscovery"""
+        with self._lock:
+            if self._schema_text is not None:
+                return self._schema_text
+
+            company_tables = self.schema.get_tables_with_column(SQL_AGENT_TABLES)
+            if not company_tables:
+                print("❌ SQL agent could not discover company tables")
+                return None
+
+            lines = []
+            for table in SQL_AGENT_TABLES:
+                if table not in company_tables and table not in SHARED_LOOKUP_TABLES:
+                    continue
+                columns = self.schema.get_table_structure(table) or []
+                described = ', '.join(f"{c['COLUMN_NAME']} {c['DATA_TYPE']}" for c in columns)
+                lines.append(f"- {table}({described})")
+
+            self._company_tables = company_tables
+            self._schema_text = '\n'.join(lines)
+            return self._schema_text
+
+    def plan(self, sql, params=None):
+        """Validate generated SQL and return it company-scoped and row-capped.
+
+        Every company table reference becomes
+        (SELECT * FROM t WHERE company_id = %(company_id)s) AS t, so the
+        predicate is enforced whatever the WHERE clause says. Named
+        parameters must all be present in params.
+        """
+        params = params or {}
+        unknown = placeholders_in(sql) - set(params)
+        if unknown:
+            raise UnsafeQueryError(f"unknown parameters {', '.join(sorted(unknown))}")
+        sql = sql.strip().rstrip(';').strip()
+        bare = strip_literals(sql)
+
+        if ';' in bare:
+            raise UnsafeQueryError("only a single statement is allowed")
+        if '--' in bare or '/*' in bare or '#' in bare:
+            raise UnsafeQueryError("comments are not allowed")
+        if not re.match(r'^SELECT\b', bare, re.IGNORECASE):
+            raise UnsafeQueryError("only SELECT queries are allowed")
+        for pattern, what in FORBIDDEN_PATTERNS:
+            if re.search(pattern, bare, re.IGNORECASE):
+                raise UnsafeQueryError(f"{what} are not allowed")
+        check_table_references(bare)
+
+        # Literal % must survive pyformat parameter substitution; named parameters stay as they are
+        sql = re.sub(r'%%\((\w+)\)s', r'%(\1)s', sql.replace('%', '%%'))
+
+        skipped = function_froms(sql)
+
+        def scope(match):
+            if match.start() in skipped:
+                return match.group(0)
+            keyword, table, alias = match.groups()
+            table_key = table.lower()
+            if table_key in self._company_tables:
+                return f"{keyword} (SELECT * FROM {table_key} WHERE company_id = %(company_id)s) AS {alias or table_key}"
+            if table_key in SHARED_LOOKUP_TABLES:
+                return match.group(0)
+            raise UnsafeQueryError(f"table '{table}' is not available")
+
+        if all(match.start() in skipped for match in TABLE_REFERENCE.finditer(sql)):
+            raise UnsafeQueryError("the query reads no tables")
+        sql = TABLE_REFERENCE.sub(scope, sql)
+
+        limit = TRAILING_LIMIT.search(sql)
+        if limit:
+            first, second = (self._limit_value(group, params) for group in (limit.group(1), limit.group(3)))
+            if limit.group(2) == ',':
+                offset, count = first, second
+            else:
+                offset, count = second or 0, first
+            capped = f"LIMIT {min(count, MAX_RESULT_ROWS)}" + (f" OFFSET {offset}" if offset else "")
+            sql = sql[:limit.start()] + capped
+        else:
+            sql = f"{sql}\nLIMIT {MAX_RESULT_ROWS}"
+        return sql
+
+    @staticmethod
+    def _limit_value(token, params):
+        """LIMIT/OFFSET operand as an int, resolving a named parameter"""
+        if token is None:
+            return None
+        match = re.match(r'%\((\w+)\)s', token)
+        value = params[match.group(1)] if match else token
+        try:
+            return max(0, int(value))
+        except (TypeError, ValueError):
+            raise UnsafeQueryError("LIMIT must be a whole number")
+
+    def check_cost(self, sql, params):
+        """Reject the query when EXPLAIN estimates more rows examined than the budget"""
+        plan = db.execute_query(f"EXPLAIN {sql}", params)
+        if not plan:
+            raise UnsafeQueryError("the query could not be planned")
+
+        estimate = 1
+        for step in plan:
+            estimate *= max(1, int(step.get('rows') or 1))
+        print(f"📐 EXPLAIN row estimate: {estimate:,} (budget {ROW_ESTIMATE_BUDGET:,})")
+        if estimate > ROW_ESTIMATE_BUDGET:
+            raise UnsafeQueryError(f"it would examine about {estimate:,} rows (limit {ROW_ESTIMATE_BUDGET:,})")
+        return estimate
+
+    def apply_time_limit(self, sql):
+        """Server-side cap: the agent's own limit, or less if the request deadline is closer"""
+        limit_ms = max(1, min(MAX_EXECUTION_MS, int(time_budget(MAX_EXECUTION_MS / 1000) * 1000)))
+        return re.sub(r'^\s*SELECT\b', f'SELECT /*+ MAX_EXECUTION_TIME({limit_ms}) */', sql,
+                      count=1, flags=re.IGNORECASE)
+
+    def _format_result(self, company_id, explanation, sql, rows):
+        if not rows:
+            return f"No matching data found for company {company_id}"
+
+        columns = list(rows[0].keys())
+        response_data = f"**Query Results - Company {company_id}**\n\n"
+        if explanation:
+            response_data += f"🔎 {explanation}\n\n"
+        response_data += "| " + " | ".join(columns) + " |\n"
+        response_data += "|" + "---|" * len(columns) + "\n"
+        for row in rows[:DISPLAY_ROWS]:
+            response_data += "| " + " | ".join(self._format_value(row[c]) for c in columns) + " |\n"
+        if len(rows) > DISPLAY_ROWS:
+            response_data += f"\n*Showing {DISPLAY_ROWS} of {len(rows)} rows*\n"
+        response_data += f"\n```sql\n{sql}\n```\n\n*Live data from AWS RDS database*\n"
+        return response_data
+
+    @staticmethod
+    def _format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, (float, Decimal)):
+            return f"{float(value):,.2f}"
+        if isinstance(value, int):
+            return f"{value:,}"
+        if hasattr(value, 'strftime'):
+            return value.strftime('%Y-%m-%d')
+        return str(value).replace('|', '\\|')
@@ -0,0 +1,238 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from agents.time_window import DateRange, MONTHS, parse_date_range, year_range
+
+
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     '.cache', 'sql_templates.sqlite3')
+
+# Date phrases replaced by {periodN}, most specific first
+PERIOD_PATTERNS = [
+    r'\d{4}-\d{2}-\d{2}\s*(?:to|and|-|until)\s*\d{4}-\d{2}-\d{2}',
+    r'\b(?:today|yesterday)\b',
+    r'\b(?:last|past|previous)\s+\d+\s+(?:day|week|month)s?\b',
+    r'\b(?:ytd|year to date|mtd|month to date)\b',
+    r'\b(?:this|current|last|previous)\s+(?:week|month|quarter|year)\b',
+    r'\b\d{4}\s*q[1-4]\b',
+    r'\bq[1-4](?:\s*(?:of\s+)?\d{4})?\b',
+    r'\b(?:' + '|'.join(name for name in MONTHS if name != 'may') + r')\b(?:\s+\d{4})?',
+    r'\bmay\s+\d{4}\b',
+]
+SINGLE_DATE = r'\b\d{4}-\d{2}-\d{2}\b'
+BARE_YEAR = r'\b(in|for|during|of|since)\s+(\d{4})\b'
+ENTITY = (r"\b(customer|client|product|item|supplier|vendor|warehouse|region)\s+(?:named\s+|called\s+)?"
+          r"([A-Z][\w&.'-]*(?:\s+[A-Z][\w&.'-]*)*)")
+QUOTED = r'"([^"]+)"|(?<!\w)\'([^\']+)\'(?!\w)'
+NUMBER = r'\b\d+(?:\.\d+)?\b'
+PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+
+def normalize_question(message, today=None):
+    """Split a question into a reusable template and its parameter values.
+
+    "Top 5 customers by revenue in March 2025" becomes
+    ("top {n1} customers by revenue in {period1}", {'n1': 5, 'period1': DateRange(...)}).
+    Quoted strings and names after customer/product/... become {textN}/{nameN}.
+    """
+    values = {}
+    counters = {}
+
+    def placeholder(kind, value):
+        counters[kind] = counters.get(kind, 0) + 1
+        name = f"{kind}{counters[kind]}"
+        values[name] = value
+        return f"{{{name}}}"
+
+    # Entities and quoted text first: they are case- and content-sensitive
+    text = re.sub(QUOTED, lambda m: placeholder('text', m.group(1) or m.group(2)), message.strip())
+    text = re.sub(ENTITY, lambda m: f"{m.group(1)} " + placeholder('name', m.group(2)), text)
+    text = text.lower()
+
+    for pattern in PERIOD_PATTERNS:
+        text = re.sub(pattern, lambda m: placeholder('period', parse_date_range(m.group(0), today=today)), text)
+    text = re.sub(SINGLE_DATE, lambda m: placeholder('period', _day_range(m.group(0))), text)
+    text = re.sub(BARE_YEAR, lambda m: f"{m.group(1)} " + placeholder('period', _year_range(m.group(2))), text)
+    text = re.sub(NUMBER, lambda m: placeholder('n', _number(m.group(0))), text)
+
+    template = re.sub(r'\s+', ' ', text).strip(' ?!.')
+    # A phrase the date parser didn't understand stays literal text
+    for name, value in list(values.items()):
+        if name.startswith('period') and value is None:
+            return re.sub(r'\s+', ' ', message.lower()).strip(' ?!.'), {}
+    return template, values
+
+
+def _day_range(text):
+    """A single ISO day, or None if it doesn't exist (2024-02-30)"""
+    try:
+        day = date.fromisoformat(text)
+        return DateRange(day, day + timedelta(days=1), text)
+    except (ValueError, OverflowError):
+        return None
+
+
+def _year_range(text):
+    try:
+        return year_range(int(text))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _number(text):
+    return float(text) if '.' in text else int(text)
+
+
+def bind_values(values):
+    """Query parameters for template values; a period binds as {name}_start and {name}_end"""
+    params = {}
+    for name, value in values.items():
+        if isinstance(value, DateRange):
+            params[f"{name}_start"] = value.start
+            params[f"{name}_end"] = value.end
+        else:
+            params[name] = value
+    return params
+
+
+def describe_placeholders(values):
+    """Prompt text telling the LLM which named parameters to use for each template slot"""
+    lines = []
+    for name, value in values.items():
+        if isinstance(value, DateRange):
+            lines.append(f"- {{{name}}}: a date range - use column >= %({name}_start)s AND column < %({name}_end)s "
+                         f"(example: {value.label})")
+        elif name.startswith('n'):
+            lines.append(f"- {{{name}}}: a number - use %({name})s (example: {value})")
+        else:
+            lines.append(f"- {{{name}}}: a text value - use %({name})s, with CONCAT('%', %({name})s, '%') "
+                         f"for partial matches (example: {value})")
+    return '\n'.join(lines)
+
+
+def fill_template(text, values):
+    """Put example values back into template text (e.g. a stored explanation)"""
+    for name, value in values.items():
+        shown = value.label if isinstance(value, DateRange) else str(value)
+        text = text.replace(f"{{{name}}}", shown)
+    return text
+
+
+def placeholders_in(sql):
+    return set(PLACEHOLDER.findall(sql))
+
+
+class SqlTemplateCache:
+    """Local SQLite store of validated, parameterized SQL keyed by question template.
+
+    Entries carry no company id - company scoping is applied when the SQL is
+    planned - so one entry serves every company. The schema fingerprint is part
+    of the key, so a schema change stops old SQL from being reused.
+    """
+
+    def __init__(self, path=None, max_entries=2000):
+        self.path = path or os.getenv('SQL_TEMPLATE_DB_PATH', DEFAULT_TEMPLATE_PATH)
+        self.max_entries = max_entries
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(schema_text):
+        return hashlib.sha1(schema_text.encode('utf-8')).hexdigest()[:16]
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    connection = sqlite3.connect(self.path, timeout=30)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS sql_templates (
+                            template    TEXT NOT NULL,
+                            schema_hash TEXT NOT NULL,
+                            sql_text    TEXT NOT NULL,
+                            explanation TEXT,
+                            hits        INTEGER NOT NULL DEFAULT 0,
+                            created_at  TEXT NOT NULL,
+                            last_used   TEXT NOT NULL,
+                            PRIMARY KEY (template, schema_hash)
+                        )
+                    """)
+                    connection.commit()
+                    connection.close()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, template, schema_hash):
+        """Return (sql, explanation) for the template, or None"""
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT sql_text, explanation FROM sql_templates WHERE template = ? AND schema_hash = ?",
+                    (template, schema_hash)).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE sql_templates SET hits = hits + 1, last_used = ? WHERE template = ? AND schema_hash = ?",
+                        (datetime.now().isoformat(), template, schema_hash))
+                    connection.commit()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ SQL template cache read failed: {e}")
+            return None
+        return row
+
+    def put(self, template, schema_hash, sql, explanation=None):
+        now = datetime.now().isoformat()
+        try:
+            connection = self._connect()
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO sql_templates "
+                    "(template, schema_hash, sql_text, explanation, hits, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                    (template, schema_hash, sql, explanation, now, now))
+                # Keep the most recently used templates
+                connection.execute(
+                    "DELETE FROM sql_templates WHERE rowid NOT IN "
+                    "(SELECT rowid FROM sql_templates ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,))
+                connection.commit()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ SQL template cache write failed: {e}")
+
+    def invalidate(self, template, schema_hash):
+        """Drop a template whose SQL stopped working"""
+        try:
+            connection = self._connect()
+            try:
+                connection.execute("DELETE FROM sql_templates WHERE template = ? AND schema_hash = ?",
+                                   (template, schema_hash))
+                connection.commit()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ SQL template cache invalidation failed: {e}")
+
+    def stats(self):
+        try:
+            connection = self._connect()
+            try:
+                count, hits = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM sql_templates").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return {'templates': 0, 'hits': 0}
+        return {'templates': count, 'hits': hits}
+
+
+# Global SQL template cache instance
+sql_template_cache = SqlTemplateCache()
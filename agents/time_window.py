@@ -0,0 +1,166 @@
+import re
+from datetime import date, timedelta
+
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'sept': 9, 'october': 10, 'november': 11, 'december': 12,
+}
+UNIT_DAYS = {'day': 1, 'week': 7}
+
+
+class DateRange:
+    """Half-open date window [start, end) pushed down into SQL as sargable predicates"""
+
+    def __init__(self, start, end, label=None):
+        self.start = start
+        self.end = end
+        self.label = label or f"{start.isoformat()} to {(end - timedelta(days=1)).isoformat()}"
+
+    @property
+    def days(self):
+        return (self.end - self.start).days
+
+    def sql(self, column):
+        """(' AND column >= %s AND column < %s', params) - no function on the column, so indexes apply"""
+        return f" AND {column} >= %s AND {column} < %s", (self.start, self.end)
+
+    def previous(self):
+        """The window of the same length immediately before this one"""
+        return DateRange(self.start - timedelta(days=self.days), self.start)
+
+    def __eq__(self, other):
+        return isinstance(other, DateRange) and (self.start, self.end) == (other.start, other.end)
+
+    def __hash__(self):
+        return hash((self.start, self.end))
+
+    def __repr__(self):
+        return f"DateRange({self.start.isoformat()}, {self.end.isoformat()}, {self.label!r})"
+
+
+def date_filter(column, date_range):
+    """SQL fragment and params for an optional date range"""
+    if date_range is None:
+        return "", ()
+    return date_range.sql(column)
+
+
+def period_suffix(date_range):
+    """Heading suffix like ' (this month)' for agent responses"""
+    return f" ({date_range.label})" if date_range else ""
+
+
+def add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_range(year, month, label=None):
+    start = date(year, month, 1)
+    return DateRange(start, add_months(start, 1), label or start.strftime('%B %Y'))
+
+
+def quarter_range(year, quarter, label=None):
+    start = date(year, 3 * (quarter - 1) + 1, 1)
+    return DateRange(start, add_months(start, 3), label or f"Q{quarter} {year}")
+
+
+def year_range(year, label=None):
+    return DateRange(date(year, 1, 1), date(year + 1, 1, 1), label or str(year))
+
+
+def parse_date_range(text, today=None):
+    """Turn a period mentioned in chat text into a DateRange, or None if there is none.
+
+    Understands today/yesterday, this/last week|month|quarter|year, MTD/YTD,
+    last N days|weeks (rolling, through today), last N months (the N full
+    months before this one), Q1-Q4 [year], month names [year], a bare year,
+    and explicit ISO ranges ("from 2024-01-01 to 2024-03-31"; reversed bounds
+    are swapped). Dates that don't exist ("2024-02-30", "in 0000") give None.
+    """
+    if not text:
+        return None
+    try:
+        return _parse_date_range(text.lower(), today or date.today())
+    except (ValueError, OverflowError):
+        return None
+
+
+def _parse_date_range(text, today):
+    iso = re.search(r'(\d{4}-\d{2}-\d{2})\s*(?:to|and|-|until)\s*(\d{4}-\d{2}-\d{2})', text)
+    if iso:
+        start, end = sorted((date.fromisoformat(iso.group(1)), date.fromisoformat(iso.group(2))))
+        return DateRange(start, end + timedelta(days=1))
+
+    if re.search(r'\btoday\b', text):
+        return DateRange(today, today + timedelta(days=1), "today")
+    if re.search(r'\byesterday\b', text):
+        return DateRange(today - timedelta(days=1), today, "yesterday")
+
+    match = re.search(r'\b(?:last|past|previous)\s+(\d+)\s+(day|week|month)s?\b', text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == 'month':
+            # Whole calendar months before this one, like "last month"
+            end = today.replace(day=1)
+            return DateRange(add_months(end, -count), end, f"last {count} months")
+        start = today - timedelta(days=count * UNIT_DAYS[unit] - 1)
+        return DateRange(start, today + timedelta(days=1), f"last {count} {unit}s")
+
+    if re.search(r'\b(?:ytd|year to date)\b', text):
+        return DateRange(date(today.year, 1, 1), today + timedelta(days=1), "year to date")
+    if re.search(r'\b(?:mtd|month to date)\b', text):
+        return DateRange(today.replace(day=1), today + timedelta(days=1), "month to date")
+
+    match = re.search(r'\b(this|current|last|previous)\s+(week|month|quarter|year)\b', text)
+    if match:
+        current = match.group(1) in ('this', 'current')
+        unit = match.group(2)
+        label = f"{'this' if current else 'last'} {unit}"
+        if unit == 'week':
+            start = today - timedelta(days=today.weekday())
+            if not current:
+                start -= timedelta(days=7)
+            return DateRange(start, start + timedelta(days=7), label)
+        if unit == 'month':
+            start = add_months(today.replace(day=1), 0 if current else -1)
+            return DateRange(start, add_months(start, 1), label)
+        if unit == 'quarter':
+            quarter_start = add_months(date(today.year, 1, 1), 3 * ((today.month - 1) // 3))
+            start = quarter_start if current else add_months(quarter_start, -3)
+            return DateRange(start, add_months(start, 3), label)
+        return year_range(today.year if current else today.year - 1, label)
+
+    match = re.search(r'\b(\d{4})\s*q([1-4])\b', text)
+    if match:
+        return quarter_range(int(match.group(1)), int(match.group(2)))
+    match = re.search(r'\bq([1-4])(?:\s*(?:of\s+)?(\d{4}))?\b', text)
+    if match:
+        quarter = int(match.group(1))
+        if match.group(2):
+            year = int(match.group(2))
+        else:
+            # A quarter that hasn't started yet means last year's
+            year = today.year if 3 * (quarter - 1) + 1 <= today.month else today.year - 1
+        return quarter_range(year, quarter)
+
+    month_names = '|'.join(MONTHS)
+    match = re.search(rf'\b({month_names})\b(?:\s+(\d{{4}}))?', text)
+    # "may" is only a month when a year or a preposition makes it one
+    if match and match.group(1) == 'may' and not match.group(2) and \
+            not re.search(r'\b(?:in|for|during|of|since)\s+may\b', text):
+        match = None
+    if match:
+        month = MONTHS[match.group(1)]
+        if match.group(2):
+            year = int(match.group(2))
+        else:
+            year = today.year if month <= today.month else today.year - 1
+        return month_range(year, month)
+
+    match = re.search(r'\b(?:in|for|during|of)\s+(\d{4})\b', text)
+    if match:
+        return year_range(int(match.group(1)))
+
+    return None
@@ -0,0 +1,3 @@
+from .client import ChatApiClient
+
+__all__ = ['ChatApiClient']
@@ -0,0 +1,27 @@
+"""Run the chat API service.
+
+    python -m api [--host 0.0.0.0] [--port 8000] [--workers 4]
+
+Each worker is a separate process with its own thread pool, DB connections
+and caches; run more workers (or more hosts behind a load balancer) to
+scale across cores and nodes.
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ERP chat API service")
+    parser.add_argument('--host', default=os.getenv('API_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('API_WORKERS', os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    print(f"🚀 Starting chat API on {args.host}:{args.port} with {args.workers} worker process(es)")
+    uvicorn.run("api.server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
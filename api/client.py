@@ -0,0 +1,51 @@
+import os
+import uuid
+from datetime import datetime
+
+import requests
+
+
+class ChatApiClient:
+    """HTTP client for the chat API service (api.server)"""
+
+    def __init__(self, base_url=None, timeout=30):
+        self.base_url = (base_url or os.getenv('CHAT_API_URL', 'http://localhost:8000')).rstrip('/')
+        self.timeout = timeout
+        # Keep-alive connections to the API, shared by every call from this process
+        self.session = requests.Session()
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def _get(self, path, **params):
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def chat(self, message, company_id, session_id=None):
+        """Return (response, stale_since) for one chat turn"""
+        response = self.session.post(
+            f"{self.base_url}/chat",
+            json={"company_id": company_id, "message": message, "session_id": session_id},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["response"], self._parse_time(data.get("stale_since"))
+
+    def summary(self, kind, company_id):
+        """Return (summary, stale_since) for 'sales', 'cashflow' or 'inventory'"""
+        data = self._get(f"/companies/{company_id}/summary/{kind}")
+        return data["summary"], self._parse_time(data.get("stale_since"))
+
+    def companies(self, search=None, page=1, page_size=50):
+        data = self._get("/companies", search=search or "", page=page, page_size=page_size)
+        return data["companies"], data["total"]
+
+    def health(self):
+        return self._get("/health")
+
+    @staticmethod
+    def _parse_time(value):
+        return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from agents.prefetch import prefetcher
+from agents.rollups import daily_rollups
+from agents.router import SUMMARY_METHODS, get_summary, get_summary_async, process_user_query, speculative_router
+from database.db_connection import db
+from database.async_db import async_db
+from database.company_directory import company_directory
+from database.health_monitor import health_monitor
+from database.change_tracker import change_tracker
+from database.dimension_cache import dimension_cache
+from database.snapshot_store import snapshot_store
+from llm.conversation import Conversation
+from resilience import deadline_scope
+
+
+# Blocking agent calls run on this many threads; each keeps its own DB connection
+API_WORKER_THREADS = int(os.getenv('API_WORKER_THREADS', 16))
+# Server-side conversations kept per process (least recently used are dropped)
+API_MAX_SESSIONS = int(os.getenv('API_MAX_SESSIONS', 1000))
+# Time budgets (seconds) for a chat turn and a summary
+CHAT_TURN_DEADLINE = 20
+SUMMARY_DEADLINE = 10
+
+executor = ThreadPoolExecutor(max_workers=API_WORKER_THREADS, thread_name_prefix="api-worker")
+
+
+class SessionStore:
+    """Bounded LRU of conversations keyed by (session_id, company_id).
+
+    Conversations live in the API process, so follow-up questions only work
+    when a session keeps reaching the same process (sticky sessions when
+    several instances run behind a load balancer).
+    """
+
+    def __init__(self, max_sessions=API_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, company_id):
+        key = (session_id, str(company_id))
+        with self._lock:
+            conversation = self._sessions.get(key)
+            if conversation is None:
+                conversation = Conversation()
+                self._sessions[key] = conversation
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(key)
+            return conversation
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionStore()
+
+
+def _run_with_deadline(seconds, func, *args):
+    """Run on a worker thread under a deadline; returns (result, stale_since) read on that same thread"""
+    with deadline_scope(seconds):
+        result = func(*args)
+    return result, db.last_result_stale_since()
+
+
+async def run_blocking(seconds, func, *args):
+    """Hand a blocking agent call to the worker pool without tying up the event loop"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, _run_with_deadline, seconds, func, *args)
+
+
+def _company_id(value):
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+async def chat(request):
+    """POST /chat {company_id, message, session_id} -> {response, stale_since}"""
+    try:
+        payload = await request.json()
+    except ValueError:
+        return _error("Request body must be JSON")
+    if not isinstance(payload, dict):
+        return _error("Request body must be a JSON object")
+
+    company_id = _company_id(payload.get("company_id"))
+    message = payload.get("message")
+    message = message.strip() if isinstance(message, str) else ""
+    if company_id is None:
+        return _error("company_id must be numeric")
+    if not message:
+        return _error("message is required")
+
+    change_tracker.track(company_id)
+    conversation = None
+    if payload.get("session_id"):
+        conversation = sessions.get(payload["session_id"], company_id)
+        conversation.add("user", message)
+
+    try:
+        response, stale_since = await run_blocking(CHAT_TURN_DEADLINE, process_user_query,
+                                                   message, company_id, conversation)
+    except Exception as e:
+        print(f"❌ API chat error: {e}")
+        return _error(f"Error processing query: {str(e)}", status_code=500)
+
+    if conversation is not None:
+        conversation.add("assistant", response)
+    return JSONResponse({"response": response, "stale_since": _iso(stale_since)})
+
+
+async def summary(request):
+    """GET /companies/{company_id}/summary/{kind} -> {summary, stale_since}"""
+    company_id = _company_id(request.path_params["company_id"])
+    kind = request.path_params["kind"]
+    if company_id is None:
+        return _error("company_id must be numeric")
+    if kind not in SUMMARY_METHODS:
+        return _error(f"Unknown summary '{kind}' (use {', '.join(SUMMARY_METHODS)})", status_code=404)
+
+    change_tracker.track(company_id)
+    # A summary request means the company was just selected; warm its likely follow-ups
+    prefetcher.schedule(company_id)
+    try:
+        if async_db.available:
+            # Native asyncio path: no worker thread is held while the query runs
+            with deadline_scope(SUMMARY_DEADLINE):
+                result = await get_summary_async(kind, company_id)
+            stale_since = async_db.last_result_stale_since()
+        else:
+            result, stale_since = await run_blocking(SUMMARY_DEADLINE, get_summary, kind, company_id)
+    except Exception as e:
+        print(f"❌ API summary error: {e}")
+        return _error(f"Error loading summary: {str(e)}", status_code=500)
+    return JSONResponse({"summary": result, "stale_since": _iso(stale_since)})
+
+
+async def companies(request):
+    """GET /companies?search=&page=&page_size= -> {companies, total} from the cached directory"""
+    try:
+        page = int(request.query_params.get("page", 1))
+        page_size = min(200, int(request.query_params.get("page_size", 50)))
+    except ValueError:
+        return _error("page and page_size must be numbers")
+
+    entries, total = company_directory.search(request.query_params.get("search"), page=page, page_size=page_size)
+    return JSONResponse({
+        "companies": [dict(entry, last_activity=_iso(entry.get('last_activity'))) for entry in entries],
+        "total": total,
+    })
+
+
+async def health(request):
+    """GET /health -> database status from the background monitor plus worker/session counts"""
+    status = health_monitor.status()
+    return JSONResponse({
+        "connected": status['connected'],
+        "circuit": status['circuit'],
+        "latency_ms": status['latency_ms'],
+        "last_error": status['last_error'],
+        "last_checked": _iso(status['last_checked']),
+        "workers": API_WORKER_THREADS,
+        "sessions": len(sessions),
+        "query_cache": db.query_cache.stats(),
+        "single_flight": db.single_flight.stats(),
+        "replicas": db.replica_router.status(),
+        "tenant_limits": db.tenant_limiter.stats(),
+        "local_replica": db.local_replica.stats(),
+        "dimensions": dimension_cache.stats(),
+        "rollups": daily_rollups.stats(),
+        "speculation": speculative_router.stats(),
+        "prefetch": prefetcher.stats(),
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Background refreshers and cache invalidation, once per server process
+    health_monitor.start()
+    company_directory.start()
+    db.query_cache.subscribe_to(change_tracker)
+    db.local_replica.subscribe_to(change_tracker)
+    dimension_cache.subscribe_to(change_tracker)
+    change_tracker.subscribe(snapshot_store.invalidate_company)
+    daily_rollups.subscribe_to(change_tracker)
+    change_tracker.start()
+    db.replica_router.start()
+    db.local_replica.start()
+    prefetcher.start()
+    print(f"🌐 Chat API ready ({API_WORKER_THREADS} worker threads)")
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        await async_db.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/companies", companies, methods=["GET"]),
+        Route("/companies/{company_id}/summary/{kind}", summary, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
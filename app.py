@@ -1,19 +1,30 @@
 import streamlit as st
 import pandas as pd
-from agents.sales_agent import SalesAgent
-from agents.inventory_agent import InventoryAgent
-from agents.cashflow_agent import CashFlowAgent
+from agents.registry import agent_registry
+from agents.router import get_summary, process_user_query
+from agents.prefetch import prefetcher
+from agents.rollups import daily_rollups
+from api.client import ChatApiClient
 from database.db_connection import db
 from database.schema_discovery import SchemaDiscovery
+from database.company_directory import company_directory
+from database.health_monitor import health_monitor
+from database.change_tracker import change_tracker
+from database.dimension_cache import dimension_cache
+from database.snapshot_store import snapshot_store
+from resilience import deadline_scope
+from llm.conversation import Conversation
 import plotly.express as px
+import os
 import time
 import io
 from datetime import datetime
 
-# Initialize agents
-sales_agent = SalesAgent()
-inventory_agent = InventoryAgent()
-cashflow_agent = CashFlowAgent()
+# Time budgets (seconds) for a chat turn and for the sidebar metrics
+CHAT_TURN_DEADLINE = 20
+SIDEBAR_DEADLINE = 10
+# Chat messages rendered per page; older pages load on demand
+CHAT_PAGE_SIZE = 20
 
 # Page configuration
 st.set_page_config(
@@ -23,6 +34,18 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource(show_spinner=False)
+def load_agents():
+    """Agents are process-wide singletons: built once, shared by every session and rerun"""
+    return agent_registry.all()
+
+
+# With CHAT_API_URL set, chat turns and summaries are answered by the chat API service
+chat_api = ChatApiClient() if os.getenv('CHAT_API_URL') else None
+if chat_api is None:
+    load_agents()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -55,52 +78,66 @@ st.markdown("""
 
 
 def test_database_connection():
-    """Test database connection and return status"""
+    """Read the background health monitor's last status (never queries the DB on render)"""
+    health_monitor.start()
+    status = health_monitor.status()
+    if status['last_checked'] is None:
+        return False, "Checking connection..."
+    if status['circuit'] == 'open':
+        return False, "Unavailable (failing fast)"
+    if status['connected']:
+        return True, f"AWS RDS Connected ✓ ({status['latency_ms']:.0f} ms)"
+    return False, "Connection Error"
+
+
+def get_available_companies(search=None, page=1, page_size=50):
+    """Get a page of companies from the cached company directory (never blocks on the DB)"""
+    company_directory.start()
+    return company_directory.search(search, page=page, page_size=page_size)
+
+
+def format_company_option(company_id):
+    """Selectbox label with cached row counts and last activity"""
+    entry = company_directory.get_company(company_id)
+    if not entry or not entry['total_rows']:
+        return str(company_id)
+    label = f"{company_id} · {entry['total_rows']:,} rows"
+    if entry['last_activity']:
+        label += f" · last {entry['last_activity'].strftime('%Y-%m-%d')}"
+    return label
+
+
+def load_summary(kind, company_id):
+    """Summary from the chat API when configured, otherwise from the snapshot store or live agents"""
+    if chat_api is None:
+        return get_summary(kind, company_id)
     try:
-        result = db.execute_query("SELECT 1 as test")
-        if result and len(result) > 0:
-            return True, "AWS RDS Connected ✓"
-        return False, "No data returned"
+        return chat_api.summary(kind, company_id)[0]
     except Exception as e:
-        return False, f"Connection Error"
+        print(f"❌ Chat API summary error: {e}")
+        return f"Error loading {kind} summary: {str(e)}"
 
 
-def get_available_companies():
-    """Get list of verified companies with rich data - DEMO OPTIMIZED"""
-    # PRE-VERIFIED COMPANIES - These are known to have rich data for demos
-    verified_companies = ["922", "1336", "1387", "1415"]
-    
+def answer_query(prompt, company_id, conversation):
+    """Return (response, stale_since) from the chat API when configured, otherwise in-process"""
+    if chat_api is None:
+        response = process_user_query(prompt, company_id, conversation)
+        return response, db.last_result_stale_since()
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = chat_api.new_session_id()
     try:
-        # Still try to get dynamic list, but fall back to verified list
-        query = """
-            SELECT DISTINCT company_id
-            FROM sales_items
-            WHERE company_id IS NOT NULL
-            UNION
-            SELECT DISTINCT company_id
-            FROM voucher_items
-            WHERE company_id IS NOT NULL
-            ORDER BY company_id LIMIT 10
-        """
-        result = db.execute_query(query)
-        if result and len(result) > 0:
-            dynamic_companies = [str(company['company_id']) for company in result]
-            # Merge verified with dynamic, keeping verified at top
-            all_companies = verified_companies + [c for c in dynamic_companies if c not in verified_companies]
-            return all_companies[:10]
+        return chat_api.chat(prompt, company_id, st.session_state.chat_session_id)
     except Exception as e:
-        print(f"Error getting companies: {e}")
-    
-    # Fallback to verified companies
-    return verified_companies
+        print(f"❌ Chat API error: {e}")
+        return f"❌ Chat service unavailable: {str(e)}", None
 
 
 def generate_combined_report(company_id):
     """Generate combined data from all three agents for download"""
     try:
-        sales_data = sales_agent.get_sales_summary(company_id)
-        cashflow_data = cashflow_agent.get_cashflow_summary(company_id)
-        inventory_data = inventory_agent.get_inventory_summary(company_id)
+        sales_data = load_summary("sales", company_id)
+        cashflow_data = load_summary("cashflow", company_id)
+        inventory_data = load_summary("inventory", company_id)
 
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         csv_data = f"ERP AI Chatbot - Company {company_id} Report\n"
@@ -145,13 +182,30 @@ def main():
 
     # Company selection
     st.sidebar.title("🏢 Company Selection")
-    available_companies = get_available_companies()
-    
+    company_search = st.sidebar.text_input("Search Company ID", "", help="Filter the cached company list")
+    page_size = 50
+    available_companies, total_companies = get_available_companies(company_search, page_size=page_size)
+    total_pages = max(1, -(-total_companies // page_size))
+    if total_pages > 1:
+        page = st.sidebar.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+        available_companies, _ = get_available_companies(company_search, page=page, page_size=page_size)
+
+    if not available_companies:
+        st.sidebar.warning("No companies match your search")
+        st.stop()
+
+    if company_directory.last_refresh:
+        st.sidebar.caption(f"{total_companies:,} companies · index refreshed "
+                           f"{company_directory.last_refresh.strftime('%H:%M:%S')}")
+    else:
+        st.sidebar.caption("Company index loading in background...")
+
     # Always default to first company (922 - most reliable)
     selected_company = st.sidebar.selectbox(
         "Select Company ID",
-        available_companies,
+        [c['company_id'] for c in available_companies],
         index=0,
+        format_func=format_company_option,
         help="Pre-selected companies verified with rich data"
     )
 
@@ -162,6 +216,22 @@ def main():
         st.sidebar.error(f"Invalid company ID: {e}")
         st.stop()
 
+    # Watch the selected company for new data so cached agent results stay valid
+    change_tracker.track(selected_company)
+    db.query_cache.subscribe_to(change_tracker)
+    db.local_replica.subscribe_to(change_tracker)
+    dimension_cache.subscribe_to(change_tracker)
+    change_tracker.subscribe(snapshot_store.invalidate_company)
+    daily_rollups.subscribe_to(change_tracker)
+    change_tracker.start()
+    db.replica_router.start()
+    db.local_replica.start()
+
+    # Warm the cache for the follow-up questions users usually ask next (the API does its own)
+    if chat_api is None:
+        prefetcher.start()
+        prefetcher.schedule(selected_company)
+
     # Connection status
     st.sidebar.title("🔗 Connection Status")
     db_connected, db_status = test_database_connection()
@@ -172,6 +242,9 @@ def main():
         st.sidebar.success("🚀 Live AWS RDS Data Available!")
     else:
         st.sidebar.error("⚠️ Database Connection Issue")
+        last_error = health_monitor.status()['last_error']
+        if last_error:
+            st.sidebar.caption(f"Last error: {last_error}")
         if not demo_mode:
             st.sidebar.warning("💡 Try enabling Demo Mode")
 
@@ -197,9 +270,9 @@ def main():
     st.sidebar.title("📈 Quick Preview")
 
     with st.sidebar:
-        with st.spinner("Loading metrics..."):
-            sales_result = sales_agent.get_sales_summary(selected_company)
-            cashflow_result = cashflow_agent.get_cashflow_summary(selected_company)
+        with st.spinner("Loading metrics..."), deadline_scope(SIDEBAR_DEADLINE):
+            sales_result = load_summary("sales", selected_company)
+            cashflow_result = load_summary("cashflow", selected_company)
 
     if "Total Invoices:" in sales_result:
         invoices = sales_result.split("Total Invoices:")[1].split("\n")[0].strip()
@@ -215,6 +288,24 @@ def main():
     chat_interface(selected_company, demo_mode)
 
 
+def get_conversation(company_id):
+    """The session's conversation, started with the greeting on first use"""
+    if "conversation" not in st.session_state:
+        conversation = Conversation()
+        conversation.add(
+            "assistant",
+            f"👋 Hello! I'm your AI ERP assistant for **Company {company_id}**. I'm connected to **AWS RDS** with live production data!\n\n"
+            f"I can help you analyze:\n\n"
+            f"• 📊 **Sales Data**: Revenue reports, orders, forecasting\n"
+            f"• 📦 **Inventory**: Stock levels, risk assessment, alerts\n"
+            f"• 💰 **Cash Flow**: Financial position, projections\n\n"
+            f"What would you like to know about your business data?"
+        )
+        st.session_state.conversation = conversation
+        st.session_state.chat_pages_shown = 1
+    return st.session_state.conversation
+
+
 def chat_interface(company_id, demo_mode=False):
     st.markdown(f"### 💬 AI Chat Interface <span class='company-badge'>Company {company_id}</span>",
                 unsafe_allow_html=True)
@@ -226,47 +317,39 @@ def chat_interface(company_id, demo_mode=False):
 
     with col1:
         if st.button("📊 Sales Summary", use_container_width=True):
-            if "messages" not in st.session_state:
-                st.session_state.messages = []
-            st.session_state.messages.append({"role": "user", "content": "Sales summary"})
+            st.session_state.pending_prompt = "Sales summary"
             st.rerun()
 
     with col2:
         if st.button("💰 Cash Flow", use_container_width=True):
-            if "messages" not in st.session_state:
-                st.session_state.messages = []
-            st.session_state.messages.append({"role": "user", "content": "Cash flow summary"})
+            st.session_state.pending_prompt = "Cash flow summary"
             st.rerun()
 
     with col3:
         if st.button("📦 Inventory", use_container_width=True):
-            if "messages" not in st.session_state:
-                st.session_state.messages = []
-            st.session_state.messages.append({"role": "user", "content": "Inventory summary"})
+            st.session_state.pending_prompt = "Inventory summary"
             st.rerun()
 
-    # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = [
-            {
-                "role": "assistant",
-                "content": f"👋 Hello! I'm your AI ERP assistant for **Company {company_id}**. I'm connected to **AWS RDS** with live production data!\n\n"
-                           f"I can help you analyze:\n\n"
-                           f"• 📊 **Sales Data**: Revenue reports, orders, forecasting\n"
-                           f"• 📦 **Inventory**: Stock levels, risk assessment, alerts\n"
-                           f"• 💰 **Cash Flow**: Financial position, projections\n\n"
-                           f"What would you like to know about your business data?"
-            }
-        ]
-
-    # Display chat messages
-    for message in st.session_state.messages:
+    conversation = get_conversation(company_id)
+
+    # Only the newest page(s) are rendered, so a rerun costs the same however long the chat gets
+    pages_shown = st.session_state.get("chat_pages_shown", 1)
+    hidden = len(conversation) - pages_shown * CHAT_PAGE_SIZE
+    if hidden > 0:
+        if st.button(f"⬆️ Show earlier messages ({hidden} more)"):
+            st.session_state.chat_pages_shown = pages_shown + 1
+            st.rerun()
+    elif conversation.summarized:
+        st.caption(f"🗂️ {conversation.summarized} older messages were summarized")
+
+    for message in conversation.page(1, pages_shown * CHAT_PAGE_SIZE):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
-    # Chat input
-    if prompt := st.chat_input(f"Ask about Company {company_id} data..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+    # Chat input (or a quick action queued on the previous run)
+    prompt = st.chat_input(f"Ask about Company {company_id} data...") or st.session_state.pop("pending_prompt", None)
+    if prompt:
+        conversation.add("user", prompt)
 
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -275,59 +358,15 @@ def chat_interface(company_id, demo_mode=False):
             with st.spinner("🤔 Analyzing real-time ERP data from AWS..."):
                 if demo_mode:
                     time.sleep(0.3)  # Smooth demo experience
-                response = process_user_query(prompt, company_id)
+                # Bound the whole turn so a slow DB or LLM can't hold it for a minute
+                with deadline_scope(CHAT_TURN_DEADLINE):
+                    response, stale_since = answer_query(prompt, company_id, conversation)
+                if stale_since:
+                    response += (f"\n\n⚠️ *Database unavailable - showing cached data from "
+                                 f"{stale_since.strftime('%H:%M:%S')}*")
             st.markdown(response)
 
-        st.session_state.messages.append({"role": "assistant", "content": response})
-
-
-def process_user_query(query, company_id):
-    """Process user query using keyword matching and agents"""
-    query_lower = query.lower()
-
-    # Check for procedure/help queries first
-    if any(word in query_lower for word in ['how to', 'how do i', 'create', 'make', 'generate', 'add', 'new']):
-        if any(word in query_lower for word in ['invoice', 'sales invoice', 'bill']):
-            return sales_agent.process_query(query, company_id)
-        elif any(word in query_lower for word in ['purchase', 'vendor', 'supplier']):
-            return "Purchase invoice creation guide coming soon!"
-        elif any(word in query_lower for word in ['payment', 'voucher', 'receipt']):
-            return "Payment voucher creation guide coming soon!"
-
-    # Keyword-based intent detection
-    if any(word in query_lower for word in ['cash', 'flow', 'financial', 'payment', 'voucher', 'liquidity']):
-        return cashflow_agent.process_query(query, company_id)
-    elif any(word in query_lower for word in ['sales', 'revenue', 'invoice', 'order', 'sell', 'customer']):
-        return sales_agent.process_query(query, company_id)
-    elif any(word in query_lower for word in ['inventory', 'stock', 'warehouse', 'quantity', 'low stock', 'out of stock']):
-        return inventory_agent.process_query(query, company_id)
-    elif any(word in query_lower for word in ['help', 'what can', 'assist', 'support', 'guide', 'manual']):
-        return f"""
-I'm your AI assistant for Company {company_id}, connected to AWS RDS with live ERP data.
-
-I can help you with:
-
-📊 **Data Analysis:**
-• Sales performance and revenue reports
-• Inventory levels and stock management
-• Cash flow and financial position
-
-📝 **Procedural Guides:**
-• How to create Sales Invoices
-• How to manage inventory
-• How to process payments
-
-Try asking me:
-• "How do I create a sales invoice?"
-• "Show me sales summary"
-• "What's our cash flow position?"
-• "Any inventory alerts?"
-"""
-    else:
-        try:
-            return sales_agent.process_query(query, company_id)
-        except:
-            return f"I can help you with data analysis or procedural guides for Company {company_id}. What specific information would you like?"
+        conversation.add("assistant", response)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Benchmarks for the data access paths.
+
+    python benchmark.py columnar [--rows 200000] [--company 922]
+    python benchmark.py batch [--companies 200] [--chunk-size 100]
+    python benchmark.py context [--rows 200] [--budget 1500]
+    python benchmark.py coalesce [--users 50] [--query-ms 200] [--company 922]
+
+Without --company the columnar benchmark runs against an in-memory stand-in
+cursor shaped like the get_sales_forecast result, so it needs no database.
+The batch benchmark always runs against the live database. The context
+benchmark compares raw and compacted LLM data context on sample agent output.
+The coalesce benchmark fires the same summary from many threads at once; without
+--company each execution is a stand-in sleep of --query-ms.
+"""
+import argparse
+import threading
+import datetime
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+import pandas as pd
+
+from database.columnar import fetch_columnar
+
+
+FORECAST_COLUMNS = [
+    'issue_date', 'delivery_date', 'total', 'sub_total', 'discount', 'region_id', 'region',
+    'customer_id', 'warehouse_id', 'product_id', 'quantity', 'price', 'tax', 'status',
+    'currency_id', 'currency', 'project_id', 'salesman_id',
+]
+
+
+class StandInCursor:
+    """Minimal DB-API cursor over pre-built tuples (what mysql.connector hands back)"""
+
+    def __init__(self, rows, columns, dictionary=False):
+        self.rows = rows
+        self.description = [(name,) for name in columns]
+        self.column_names = columns
+        self.dictionary = dictionary
+        self.position = 0
+
+    def _convert(self, rows):
+        if self.dictionary:
+            return [dict(zip(self.column_names, row)) for row in rows]
+        return rows
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return self._convert(rows)
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return self._convert(rows)
+
+
+def make_forecast_rows(count):
+    random.seed(42)
+    start = datetime.date(2023, 1, 1)
+    rows = []
+    for _ in range(count):
+        issued = start + datetime.timedelta(days=random.randint(0, 700))
+        total = Decimal(random.randint(100, 500000)) / 100
+        rows.append((
+            issued, issued + datetime.timedelta(days=random.randint(0, 5)),
+            total, total, Decimal('0.00'), random.randint(1, 40), f"Region {random.randint(1, 40)}",
+            random.randint(1, 5000), random.randint(1, 12), random.randint(1, 20000),
+            Decimal(random.randint(1, 50)), Decimal(random.randint(100, 10000)) / 100, Decimal('0.00'),
+            random.choice(['paid', 'unpaid', 'remaining']), 1, 'USD', None, random.randint(1, 30),
+        ))
+    return rows
+
+
+def measure(label, func):
+    """Time one run, then trace a second run for peak allocations (tracing skews timings)"""
+    started = time.perf_counter()
+    df = func()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frame_mb = df.memory_usage(deep=True).sum() / 1_048_576
+    print(f"{label:<12} {elapsed * 1000:>9.1f} ms   peak {peak / 1_048_576:>8.1f} MB   "
+          f"frame {frame_mb:>7.1f} MB   rows {len(df):,}")
+    return elapsed, peak
+
+
+def bench_columnar(args):
+    if args.company:
+        from agents.sales_agent import FORECAST_QUERY
+        from database.db_connection import db
+
+        query = FORECAST_QUERY.format(date_filter="").replace("LIMIT 100", f"LIMIT {args.rows}")
+        params = (args.company,)
+        dict_path = lambda: db.execute_query_dataframe(query, params)
+        columnar_path = lambda: db.execute_query_dataframe(query, params, columnar=True)
+    else:
+        rows = make_forecast_rows(args.rows)
+        dict_path = lambda: pd.DataFrame(StandInCursor(rows, FORECAST_COLUMNS, dictionary=True).fetchall())
+        columnar_path = lambda: fetch_columnar(StandInCursor(rows, FORECAST_COLUMNS), args.batch_size)
+
+    print(f"📏 Columnar fetch benchmark ({args.rows:,} rows, batch {args.batch_size:,})")
+    dict_time, dict_peak = measure("dict rows", dict_path)
+    col_time, col_peak = measure("columnar", columnar_path)
+    print(f"⚡ columnar is {dict_time / col_time:.1f}x faster with {dict_peak / max(col_peak, 1):.1f}x lower peak memory")
+
+
+def bench_batch(args):
+    from agents.registry import agent_registry
+    from database.company_directory import company_directory
+    from database.db_connection import db
+
+    company_directory.refresh()
+    entries, _ = company_directory.search(page_size=args.companies)
+    company_ids = [entry['company_id'] for entry in entries]
+    sales_agent, cashflow_agent, inventory_agent = (agent_registry.get(name) for name in ("sales", "cashflow", "inventory"))
+    agents = [
+        ("sales", sales_agent.get_sales_summary, sales_agent.get_sales_summary_many),
+        ("cashflow", cashflow_agent.get_cashflow_summary, cashflow_agent.get_cashflow_summary_many),
+        ("inventory", inventory_agent.get_inventory_summary, inventory_agent.get_inventory_summary_many),
+    ]
+
+    print(f"📏 Batch analytics benchmark ({len(company_ids)} companies, chunk {args.chunk_size})")
+    for name, single, many in agents:
+        db.query_cache.clear()
+        started = time.perf_counter()
+        for company_id in company_ids:
+            single(company_id)
+        loop_time = time.perf_counter() - started
+
+        db.query_cache.clear()
+        started = time.perf_counter()
+        many(company_ids, chunk_size=args.chunk_size)
+        batch_time = time.perf_counter() - started
+
+        print(f"{name:<10} per-company loop {loop_time:>8.2f} s   batch {batch_time:>8.2f} s   "
+              f"speedup {loop_time / batch_time:.1f}x")
+
+
+def bench_context(args):
+    from agents.cashflow_agent import CashFlowAgent
+    from agents.sales_agent import SalesAgent
+    from llm.context_builder import ContextBuilder, count_tokens, tiktoken
+
+    sales_summary = SalesAgent()._format_sales_summary(922, {
+        'total_invoices': 18250, 'total_revenue': Decimal('4829311.52'), 'avg_invoice_value': Decimal('264.62'),
+        'unique_customers': 1432, 'total_units_sold': 96120, 'latest_invoice': datetime.date(2025, 6, 30)})
+    cashflow_summary = CashFlowAgent()._format_cashflow_summary(922, {
+        'transaction_count': 58211, 'total_inflow': Decimal('9338120.10'), 'total_outflow': Decimal('9120388.75'),
+        'unique_vouchers': 20877})
+    columns = FORECAST_COLUMNS[:12]
+    rows = [dict(zip(columns, row[:12])) for row in make_forecast_rows(args.rows)]
+    raw = "\n\n".join([sales_summary, cashflow_summary, str(rows)])
+
+    started = time.perf_counter()
+    builder = ContextBuilder(budget=args.budget)
+    builder.add("sales summary", sales_summary).add("cash flow summary", cashflow_summary).add("rows", rows)
+    context, tokens = builder.build()
+    elapsed = time.perf_counter() - started
+
+    raw_tokens = count_tokens(raw)
+    print(f"📏 Prompt context benchmark ({args.rows:,} rows, budget {args.budget:,} tokens, "
+          f"{'tiktoken' if tiktoken else 'estimated'} counts)")
+    print(f"raw        {raw_tokens:>9,} tokens")
+    print(f"compact    {tokens:>9,} tokens   built in {elapsed * 1000:.1f} ms")
+    print(f"⚡ {raw_tokens / max(tokens, 1):.1f}x fewer prompt tokens")
+
+
+def bench_coalesce(args):
+    from database.single_flight import SingleFlight
+
+    if args.company:
+        from agents.registry import agent_registry
+        from database.db_connection import db
+
+        db.query_cache.clear()
+        flight = db.single_flight
+        sales_agent = agent_registry.get("sales")
+        run = lambda: sales_agent.get_sales_summary(args.company)
+    else:
+        flight = SingleFlight()
+        run = lambda: flight.do(("summary", args.company), time.sleep, args.query_ms / 1000)
+
+    before = flight.stats()
+    start = threading.Barrier(args.users)
+
+    def user():
+        start.wait()
+        run()
+
+    threads = [threading.Thread(target=user) for _ in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    after = flight.stats()
+    executions = after['executions'] - before['executions']
+    coalesced = after['coalesced'] - before['coalesced']
+    print(f"📏 Single-flight benchmark ({args.users} concurrent users, same summary)")
+    print(f"executions {executions:>6}   coalesced {coalesced:>6}   peak waiters {after['peak_waiters']:>4}   "
+          f"wall {elapsed * 1000:.0f} ms")
+    print(f"⚡ {coalesced / max(executions + coalesced, 1) * 100:.0f}% of executions saved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ERP chatbot data path benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    columnar = subparsers.add_parser("columnar", help="dict-per-row vs columnar DataFrame fetch")
+    columnar.add_argument("--rows", type=int, default=200_000)
+    columnar.add_argument("--batch-size", type=int, default=5000)
+    columnar.add_argument("--company", help="run against the live database for this company")
+    columnar.set_defaults(func=bench_columnar)
+
+    batch = subparsers.add_parser("batch", help="per-company loop vs grouped multi-company queries")
+    batch.add_argument("--companies", type=int, default=200)
+    batch.add_argument("--chunk-size", type=int, default=100)
+    batch.set_defaults(func=bench_batch)
+
+    context = subparsers.add_parser("context", help="raw vs compacted LLM data context")
+    context.add_argument("--rows", type=int, default=200)
+    context.add_argument("--budget", type=int, default=1500)
+    context.set_defaults(func=bench_context)
+
+    coalesce = subparsers.add_parser("coalesce", help="identical concurrent queries with single-flight")
+    coalesce.add_argument("--users", type=int, default=50)
+    coalesce.add_argument("--query-ms", type=int, default=200)
+    coalesce.add_argument("--company", help="run get_sales_summary against the live database for this company")
+    coalesce.set_defaults(func=bench_coalesce)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,19 @@
 from .db_connection import db, DatabaseConnection
 from .schema_discovery import SchemaDiscovery
+from .company_directory import company_directory, CompanyDirectory
+from .health_monitor import health_monitor, HealthMonitor
+from .change_tracker import change_tracker, ChangeTracker
+from .query_cache import QueryCache
+from .single_flight import SingleFlight
+from .replica_router import ReplicaRouter
+from .tenant_limiter import TenantLimiter
+from .local_replica import LocalReplica
+from .dimension_cache import dimension_cache, DimensionCache
+from .snapshot_store import snapshot_store, SnapshotStore
+from .rollup_store import rollup_store, RollupStore
+from .sketches import HyperLogLog, DDSketch
 
-__all__ = ['db', 'DatabaseConnection', 'SchemaDiscovery']
\ No newline at end of file
+__all__ = ['db', 'DatabaseConnection', 'SchemaDiscovery', 'company_directory', 'CompanyDirectory',
+           'health_monitor', 'HealthMonitor', 'change_tracker', 'ChangeTracker', 'QueryCache', 'SingleFlight',
+           'ReplicaRouter', 'TenantLimiter', 'LocalReplica', 'dimension_cache', 'DimensionCache',
+           'snapshot_store', 'SnapshotStore', 'rollup_store', 'RollupStore', 'HyperLogLog', 'DDSketch']
\ No newline at end of file
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+
+import pandas as pd
+
+from database.db_connection import apply_time_limit, check_read_only, db
+from database.derived_tables import expand_derived
+from database.query_cache import QueryCache
+from resilience import CircuitBreaker, FallbackCache, current_deadline, get_breaker, time_budget
+
+try:
+    import aiomysql
+except ImportError:  # Only the MySQL backend needs it; the SQLite stand-in works without
+    aiomysql = None
+
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 20))
+# Point the async layer at a local SQLite copy instead of MySQL (tests, local development)
+ASYNC_DB_SQLITE_PATH = os.getenv('ASYNC_DB_SQLITE_PATH')
+QUERY_TIMEOUT = 30
+
+_stale_since = contextvars.ContextVar('async_stale_since', default=None)
+
+
+class MySQLBackend:
+    """aiomysql connection pool over the same server settings as the blocking connection"""
+
+    available = aiomysql is not None
+
+    def __init__(self, config, pool_size=ASYNC_DB_POOL_SIZE):
+        self.config = config
+        self.pool_size = pool_size
+        # Pools belong to the event loop that created them (one per API worker process)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    async def _pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            if aiomysql is None:
+                raise RuntimeError("aiomysql is not installed (pip install aiomysql)")
+            pool = await aiomysql.create_pool(
+                host=self.config['host'], port=self.config['port'], user=self.config['user'],
+                password=self.config['password'], db=self.config['database'],
+                minsize=1, maxsize=self.pool_size, autocommit=True,
+                connect_timeout=self.config.get('connect_timeout', 30),
+            )
+            with self._lock:
+                existing = self._pools.setdefault(loop, pool)
+            if existing is not pool:
+                pool.close()
+                pool = existing
+            print(f"🔌 Async MySQL pool created (max {self.pool_size} connections)")
+        return pool
+
+    async def fetch(self, query, params):
+        pool = await self._pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params or ())
+                return list(await cursor.fetchall())
+
+    async def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+            await pool.wait_closed()
+
+
+class SQLiteBackend:
+    """Local stand-in: runs the same MySQL-style SQL against a read-only SQLite file.
+
+    %s / %(name)s placeholders are converted to SQLite's ? / :name. Queries
+    run on worker threads, so the event loop is never blocked.
+    """
+
+    available = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @staticmethod
+    def convert(query):
+        query = re.sub(r'%\((\w+)\)s', r':\1', query)
+        return query.replace('%s', '?').replace('%%', '%')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # mode=ro: the stand-in enforces read-only at the driver as well
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def _fetch(self, query, params):
+        cursor = self._connection().execute(self.convert(query), params or ())
+        return [dict(row) for row in cursor.fetchall()]
+
+    async def fetch(self, query, params):
+        return await asyncio.to_thread(self._fetch, query, params)
+
+    async def close(self):
+        pass
+
+
+class AsyncDatabase:
+    """asyncio-native read-only data layer for the agents.
+
+    `await fetch(...)` / `await fetch_df(...)` mirror execute_query and
+    execute_query_dataframe: the same write-statement guard, company id
+    validation, deadline and MAX_EXECUTION_TIME handling, circuit breaker,
+    query cache and last-good fallback. Identical in-flight queries share
+    one execution. One event loop can keep hundreds of queries in flight;
+    the pool caps how many hold a connection at once.
+    """
+
+    def __init__(self, backend, query_cache=None, fallback_cache=None, circuit_breaker=None):
+        self.backend = backend
+        self.query_cache = query_cache or QueryCache()
+        self.fallback_cache = fallback_cache or FallbackCache()
+        self.circuit_breaker = circuit_breaker or get_breaker('async_database')
+        self._in_flight = {}
+
+    @classmethod
+    def sqlite(cls, path):
+        """Stand-in over a local SQLite file with its own caches and breaker"""
+        return cls(SQLiteBackend(path), circuit_breaker=CircuitBreaker('async_sqlite'))
+
+    @property
+    def available(self):
+        """False when the backend's driver is missing (callers then use the blocking path)"""
+        return self.backend.available
+
+    @staticmethod
+    def last_result_stale_since():
+        """When the last query in this task was answered from the fallback cache (or None)"""
+        return _stale_since.get()
+
+    async def fetch(self, query, params=None, company_id=None):
+        """Execute a read-only query and return dict rows (None if the database can't answer)"""
+        check_read_only(query)
+        if company_id is not None:
+            try:
+                int(company_id)
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid company_id: {company_id}. Must be numeric.")
+
+        cache_key = (query, repr(params), False)
+        _stale_since.set(None)
+
+        # Only queries scoped to an explicit company are cached (so they can be invalidated)
+        if company_id is not None:
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        # Concurrent callers with the same (query, params) await the first caller's execution
+        flight_key = (asyncio.get_running_loop(), cache_key)
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_query(query, params, company_id, cache_key))
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+        # shield: a caller giving up doesn't cancel the query for the others
+        result, stale_since = await asyncio.shield(task)
+        _stale_since.set(stale_since)
+        return result
+
+    async def _run_query(self, query, params, company_id, cache_key):
+        """Returns (result, stale_since)"""
+        generation = self.query_cache.generation(company_id)
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            print("⏱️ Request deadline exceeded - skipping async query")
+            return self._serve_fallback(cache_key)
+        if not self.circuit_breaker.allow_request():
+            print("⛔ Database circuit open - skipping async query")
+            return self._serve_fallback(cache_key)
+
+        try:
+            result = await asyncio.wait_for(self.backend.fetch(apply_time_limit(expand_derived(query)), params),
+                                            timeout=time_budget(QUERY_TIMEOUT))
+        except Exception as e:
+            print(f"❌ Async query error: {type(e).__name__}: {e}")
+            self.circuit_breaker.record_failure()
+            return self._serve_fallback(cache_key)
+
+        self.circuit_breaker.record_success()
+        self.fallback_cache.put(cache_key, result)
+        if company_id is not None:
+            self.query_cache.put(cache_key, result, company_id, query, generation)
+        return result, None
+
+    def _serve_fallback(self, cache_key):
+        cached = self.fallback_cache.get(cache_key)
+        if cached is None:
+            return None, None
+        result, stored_at = cached
+        print(f"♻️ Serving cached result from {stored_at.strftime('%H:%M:%S')} (database unavailable)")
+        return result, stored_at
+
+    async def fetch_df(self, query, params=None, company_id=None):
+        """Execute a read-only query and return a DataFrame (empty if there is no result)"""
+        rows = await self.fetch(query, params, company_id)
+        return pd.DataFrame(rows) if rows else pd.DataFrame()
+
+    async def close(self):
+        await self.backend.close()
+
+
+# Global async database instance; against MySQL it shares caches and the circuit breaker
+# with the blocking connection, so change-tracker invalidation covers both
+if ASYNC_DB_SQLITE_PATH:
+    async_db = AsyncDatabase.sqlite(ASYNC_DB_SQLITE_PATH)
+else:
+    async_db = AsyncDatabase(MySQLBackend(db.config), query_cache=db.query_cache,
+                             fallback_cache=db.fallback_cache, circuit_breaker=db.circuit_breaker)
@@ -0,0 +1,47 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from database.db_connection import db
+
+
+# Shared pool so worker threads (and their per-thread DB connections) are reused across calls
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_QUERY_WORKERS', 4)),
+                               thread_name_prefix="batch-query")
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fetch_by_company(query_template, company_ids, params=(), chunk_size=100):
+    """Run a grouped query for many companies; returns ({company_id: [rows]}, failed_company_ids).
+
+    query_template must select `company_id` and contain `{company_ids}` where the
+    IN list goes, e.g. "... WHERE stock.company_id IN ({company_ids}) ... GROUP BY stock.company_id".
+    The company ids are bound before `params`. Chunks run in parallel on the shared pool.
+    """
+    company_ids = [str(c) for c in dict.fromkeys(company_ids)]
+    if not company_ids:
+        return {}, set()
+
+    def run_chunk(chunk):
+        query = query_template.format(company_ids=', '.join(['%s'] * len(chunk)))
+        return db.execute_query(query, tuple(chunk) + tuple(params))
+
+    # Each chunk runs in a copy of the caller's context so request deadlines carry over
+    chunks = list(chunked(company_ids, chunk_size))
+    futures = [_executor.submit(contextvars.copy_context().run, run_chunk, chunk) for chunk in chunks]
+
+    results = {}
+    failed = set()
+    for chunk, future in zip(chunks, futures):
+        rows = future.result()
+        if rows is None:
+            print(f"⚠️ Batch chunk failed for {len(chunk)} companies")
+            failed.update(chunk)
+            continue
+        for row in rows:
+            results.setdefault(str(row['company_id']), []).append(row)
+    return results, failed
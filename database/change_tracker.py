@@ -0,0 +1,239 @@
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+from database.db_connection import db
+
+
+# Every table the agents read, with a growing key column used as a high-water mark and the
+# columns they read. Row count and max key catch inserts and deletes; a last-modified column,
+# where the table has one, catches in-place UPDATEs. The small dimension tables ('small') also
+# get a checksum over the read columns on every poll; the large ones only every checksum_interval.
+# Columns missing from a table are skipped; tables without company_id are polled as a whole.
+WATCHED_TABLES = {
+    'sales_items': {'key': 'invoice_id',
+                    'columns': ('product_id', 'quantity', 'price', 'total', 'subtotal', 'discount_amount', 'tax')},
+    'sales_invoice': {'key': 'invoice_id',
+                      'columns': ('status', 'invoice_date', 'customer_id', 'note_id', 'currency', 'warehouse_id',
+                                  'salesman', 'project_id')},
+    'store_issue_note': {'key': 'note_id', 'columns': ('note_date',)},
+    'stock': {'key': 'stock_id',
+              'columns': ('product_id', 'warehouse_id', 'quantity', 'cost', 'overhead', 'stock_date', 'expired_at',
+                          'stock_type', 'invoice_id', 'grn_id')},
+    'voucher_items': {'key': 'voucher_id', 'columns': ('credit', 'debit', 'voucher_date')},
+    'products': {'key': 'product_id',
+                 'columns': ('title', 'name', 'product_name', 'min_qty_alert', 'reorder_qty_alert', 'max_qty_alert'),
+                 'small': True},
+    'contacts': {'key': 'contact_id', 'columns': ('name', 'title', 'contact_name', 'region'), 'small': True},
+    'purchase_invoice': {'key': 'invoice_id', 'columns': ('invoice_date',)},
+    'goods_receipt_note': {'key': 'grn_id', 'columns': ('received_date',)},
+    'origins': {'key': 'id', 'columns': ('title',), 'small': True},
+    'foreign_currency': {'key': 'fc_id', 'columns': ('title',), 'small': True},
+}
+UPDATED_COLUMNS = ('updated_at', 'modified_at', 'last_modified')
+
+
+class ChangeTracker:
+    """Polls cheap per-company high-water marks and publishes "data changed" events.
+
+    A company's table counts as changed when its row count, max key, max
+    updated timestamp or checksum of the read columns moves. A change to a
+    shared table (no company_id) is published for every known company.
+    Only companies tracked within the last `idle_after` seconds are polled;
+    it matches the query cache's long TTL, so nothing cached for a company
+    outlives its tracking. Subscribers are called as callback(company_id, tables).
+    """
+
+    def __init__(self, interval=60, tables=None, checksum_interval=3600, idle_after=3600):
+        self.db = db
+        self.interval = interval
+        self.checksum_interval = checksum_interval
+        self.idle_after = idle_after
+        self.tables = tables or WATCHED_TABLES
+        self._marks = {}
+        self._layouts = {}
+        self._versions = {}
+        self._companies = {}
+        self._last_checksum = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_poll = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def track(self, company_id):
+        """Poll this company until it has been idle for idle_after seconds (call on every use)"""
+        with self._lock:
+            self._companies[str(company_id)] = time.time()
+
+    def _active_companies(self):
+        """Tracked companies still in use; idle ones are dropped along with their marks"""
+        cutoff = time.time() - self.idle_after
+        with self._lock:
+            idle = {company_id for company_id, seen in self._companies.items() if seen < cutoff}
+            for company_id in idle:
+                del self._companies[company_id]
+            for key in [key for key in self._marks if key[1] in idle]:
+                del self._marks[key]
+            return sorted(self._companies)
+
+    def version(self, company_id):
+        """Counter bumped on every change event for the company (usable in cache keys)"""
+        with self._lock:
+            return self._versions.get(str(company_id), 0)
+
+    def start(self):
+        """Start the background polling loop (safe to call on every rerun)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-tracker", daemon=True)
+            self._thread.start()
+            print(f"📡 Change tracker started (every {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def signature(self, company_id):
+        """Digest of the company's last-polled marks (shared tables included); None until it has been polled
+
+        Stored with precomputed results so a reader can tell whether the data moved since.
+        Large tables' checksums are left out: they are only read every checksum_interval,
+        and an edit they catch is published as a change event instead.
+        """
+        company_id = str(company_id)
+        with self._lock:
+            marks = sorted((table, owner or '', repr(mark if self.tables[table].get('small') else mark[:3]))
+                           for (table, owner), mark in self._marks.items() if owner in (company_id, None))
+        if not any(owner == company_id for _, owner, _ in marks):
+            return None
+        return hashlib.sha1(repr(marks).encode()).hexdigest()
+
+    def covered_tables(self):
+        """Tables whose in-place edits are detected on every poll (last-modified column or small-table checksum)"""
+        with self._lock:
+            return {table for table, layout in self._layouts.items()
+                    if layout['updated'] or (layout['checksum'] and self.tables[table].get('small'))}
+
+    def _layout(self, table, columns):
+        """Which of the table's watched columns exist, looked up once in information_schema"""
+        with self._lock:
+            layout = self._layouts.get(table)
+        if layout is not None:
+            return layout
+        rows = self.db.execute_query(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,), workload='primary')
+        if not rows:
+            # Unknown for now: poll counts only and try again next time
+            return {'scoped': True, 'checksum': (), 'updated': None}
+        present = {row['COLUMN_NAME'].lower() for row in rows}
+        layout = {
+            'scoped': 'company_id' in present,
+            'checksum': tuple(c for c in columns['columns'] if c in present),
+            'updated': next((c for c in UPDATED_COLUMNS if c in present), None),
+        }
+        with self._lock:
+            self._layouts[table] = layout
+        return layout
+
+    def _marks_query(self, table, columns, layout, companies, checksum=False):
+        select = ["COUNT(*) AS row_count", f"MAX({columns['key']}) AS max_key"]
+        if layout['updated']:
+            select.append(f"MAX({layout['updated']}) AS max_updated")
+        if layout['checksum'] and (checksum or columns.get('small')):
+            values = ", ".join(f"IFNULL({column}, '')" for column in (columns['key'],) + layout['checksum'])
+            select.append(f"SUM(CRC32(CONCAT_WS('|', {values}))) AS checksum")
+        if not layout['scoped']:
+            return f"SELECT {', '.join(select)} FROM {table}", ()
+        query = f"SELECT company_id, {', '.join(select)} FROM {table} WHERE company_id IS NOT NULL"
+        params = ()
+        if companies:
+            query += f" AND company_id IN ({', '.join(['%s'] * len(companies))})"
+            params = tuple(companies)
+        return query + " GROUP BY company_id", params
+
+    def poll(self, companies=None):
+        """Read high-water marks once and publish events for companies whose data moved
+
+        companies overrides the tracked set (precompute polls every company it
+        computes). With no companies only the shared tables are polled.
+        """
+        companies = sorted(str(c) for c in companies) if companies is not None else self._active_companies()
+        now = time.time()
+        checksum = self._last_checksum is None or now - self._last_checksum >= self.checksum_interval
+        if checksum:
+            self._last_checksum = now
+
+        changed = {}
+        shared_changes = set()
+        for table, columns in self.tables.items():
+            layout = self._layout(table, columns)
+            if layout['scoped'] and not companies:
+                continue
+            query, params = self._marks_query(table, columns, layout, companies, checksum)
+            # Always the primary: a lagging replica would hide the change we are looking for
+            rows = self.db.execute_query(query, params, workload='primary')
+            if rows is None:
+                print(f"⚠️ Change tracker could not read marks for {table}")
+                continue
+            for row in rows:
+                company_id = str(row['company_id']) if layout['scoped'] else None
+                with self._lock:
+                    previous = self._marks.get((table, company_id))
+                    # Between checksum passes a large table keeps its last checksum
+                    kept = previous[3] if previous is not None and 'checksum' not in row else row.get('checksum')
+                    mark = (row['row_count'], row['max_key'], row.get('max_updated'), kept)
+                    self._marks[(table, company_id)] = mark
+                if _moved(previous, mark):
+                    if company_id is None:
+                        shared_changes.add(table)
+                    else:
+                        changed.setdefault(company_id, set()).add(table)
+
+        if shared_changes:
+            with self._lock:
+                known = companies or {company_id for _, company_id in self._marks if company_id is not None}
+            for company_id in known:
+                changed.setdefault(company_id, set()).update(shared_changes)
+
+        self.last_poll = datetime.now()
+        for company_id, tables in changed.items():
+            self._publish(company_id, tables)
+        return changed
+
+    def _publish(self, company_id, tables):
+        with self._lock:
+            self._versions[company_id] = self._versions.get(company_id, 0) + 1
+            subscribers = list(self._subscribers)
+        print(f"📡 Data changed for company {company_id}: {', '.join(sorted(tables))}")
+        for callback in subscribers:
+            try:
+                callback(company_id, tables)
+            except Exception as e:
+                print(f"❌ Change subscriber error: {e}")
+
+
+def _moved(previous, mark):
+    """True when a mark differs from the previous poll's; a first checksum is not a change"""
+    if previous is None:
+        return False
+    if previous[:3] != mark[:3]:
+        return True
+    return previous[3] is not None and mark[3] != previous[3]
+
+
+# Global change tracker instance
+change_tracker = ChangeTracker()
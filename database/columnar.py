@@ -0,0 +1,118 @@
+import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_NAT = np.iinfo(np.int64).min
+
+
+def _column_kind(value):
+    """Pick the NumPy buffer type for a column from its first non-NULL value"""
+    if isinstance(value, (Decimal, float)):
+        return 'float'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, datetime.datetime):
+        return 'datetime'
+    if isinstance(value, datetime.date):
+        return 'date'
+    return 'object'
+
+
+class _ColumnBuffer:
+    """Typed chunks for one result column, concatenated once at the end"""
+
+    def __init__(self, name):
+        self.name = name
+        self.kind = None
+        self.chunks = []
+        # NULLs seen before the column type is known
+        self.leading_nulls = 0
+
+    def append(self, values):
+        if self.kind is None:
+            first = next((v for v in values if v is not None), None)
+            if first is None:
+                self.leading_nulls += len(values)
+                return
+            self.kind = _column_kind(first)
+        self.chunks.append(self._convert(values))
+
+    def _convert(self, values):
+        count = len(values)
+        if self.kind == 'float':
+            return np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=count)
+        if self.kind == 'int':
+            try:
+                if None in values:
+                    # Same as pandas: integer columns with NULLs become float64 with NaN
+                    return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=count)
+                return np.fromiter(values, dtype=np.int64, count=count)
+            except OverflowError:
+                return self._as_object(values)
+        if self.kind in ('date', 'datetime'):
+            try:
+                return self._to_datetime64(values)
+            except (AttributeError, TypeError, ValueError):
+                return self._as_object(values)
+        return self._as_object(values)
+
+    def _to_datetime64(self, values):
+        # Integer offsets from the epoch are far cheaper than letting NumPy parse date objects
+        count = len(values)
+        if self.kind == 'date':
+            days = np.fromiter((_NAT if v is None else v.toordinal() - _EPOCH_ORDINAL for v in values),
+                               dtype=np.int64, count=count)
+            return days.view('datetime64[D]').astype('datetime64[ns]')
+        micros = np.fromiter(
+            (_NAT if v is None else
+             ((v.toordinal() - _EPOCH_ORDINAL) * 86400 + v.hour * 3600 + v.minute * 60 + v.second) * 1_000_000
+             + v.microsecond
+             for v in values),
+            dtype=np.int64, count=count)
+        return micros.view('datetime64[us]').astype('datetime64[ns]')
+
+    @staticmethod
+    def _as_object(values):
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    def _nulls(self, count):
+        if self.kind in ('float', 'int'):
+            return np.full(count, np.nan)
+        if self.kind in ('date', 'datetime'):
+            return np.full(count, np.datetime64('NaT'), dtype='datetime64[ns]')
+        return np.full(count, None, dtype=object)
+
+    def finish(self):
+        chunks = self.chunks
+        if self.leading_nulls:
+            chunks = [self._nulls(self.leading_nulls)] + chunks
+        if not chunks:
+            return np.empty(0, dtype=object)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+
+def fetch_columnar(cursor, batch_size=5000):
+    """Drain an executed DB-API cursor into a DataFrame, batch by batch.
+
+    Rows are read as tuples and transposed straight into typed NumPy buffers
+    (DECIMAL -> float64, DATE/DATETIME -> datetime64[ns]) so no dict is built
+    per row and no intermediate list of all rows is kept.
+    """
+    if cursor.description is None:
+        return pd.DataFrame()
+
+    columns = [_ColumnBuffer(description[0]) for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for column, values in zip(columns, zip(*rows)):
+            column.append(values)
+
+    return pd.DataFrame({column.name: column.finish() for column in columns})
@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime
+
+from database.db_connection import db
+
+
+class CompanyDirectory:
+    """Cached, periodically refreshed index of companies that have ERP data"""
+
+    def __init__(self, refresh_interval=900, pinned_companies=None):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        # Companies always listed first (pre-verified demo companies)
+        self.pinned_companies = [str(c) for c in (pinned_companies or [])]
+        self._companies = []
+        self._by_id = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background refresh loop (safe to call on every rerun)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="company-directory", daemon=True)
+            self._thread.start()
+            print(f"🏢 Company directory refresher started (every {self.refresh_interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def refresh(self):
+        """Rebuild the index from the database; keeps the old index on failure"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.time()
+            sales_query = """
+                SELECT sales_items.company_id,
+                       COUNT(*)                        AS sales_rows,
+                       MAX(sales_invoice.invoice_date) AS last_invoice
+                FROM sales_items
+                         LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
+                WHERE sales_items.company_id IS NOT NULL
+                GROUP BY sales_items.company_id
+            """
+            voucher_query = """
+                SELECT company_id,
+                       COUNT(*) AS voucher_rows
+                FROM voucher_items
+                WHERE company_id IS NOT NULL
+                GROUP BY company_id
+            """
+            sales_rows = self.db.execute_query(sales_query)
+            voucher_rows = self.db.execute_query(voucher_query)
+            if sales_rows is None and voucher_rows is None:
+                print("⚠️ Company directory refresh failed, keeping previous index")
+                return False
+
+            entries = {}
+            for row in sales_rows or []:
+                entry = self._entry(entries, row['company_id'])
+                entry['sales_rows'] = int(row['sales_rows'] or 0)
+                entry['last_activity'] = row['last_invoice']
+            for row in voucher_rows or []:
+                entry = self._entry(entries, row['company_id'])
+                entry['voucher_rows'] = int(row['voucher_rows'] or 0)
+            for entry in entries.values():
+                entry['total_rows'] = entry['sales_rows'] + entry['voucher_rows']
+
+            companies = sorted(entries.values(), key=lambda e: (-e['total_rows'], int(e['company_id'])))
+            with self._lock:
+                self._companies = companies
+                self._by_id = entries
+                self._last_refresh = datetime.now()
+            print(f"✅ Company directory refreshed: {len(companies)} companies in {time.time() - started:.1f}s")
+            return True
+        except Exception as e:
+            print(f"❌ Company directory refresh error: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    @staticmethod
+    def _entry(entries, company_id):
+        company_id = str(company_id)
+        if company_id not in entries:
+            entries[company_id] = {
+                'company_id': company_id,
+                'sales_rows': 0,
+                'voucher_rows': 0,
+                'total_rows': 0,
+                'last_activity': None,
+            }
+        return entries[company_id]
+
+    @property
+    def last_refresh(self):
+        return self._last_refresh
+
+    def get_company(self, company_id):
+        """Return the cached entry for a company, or None if unknown"""
+        with self._lock:
+            return self._by_id.get(str(company_id))
+
+    def search(self, term=None, page=1, page_size=50):
+        """Search the cached index by company id; returns (entries, total_matches).
+
+        Pinned companies come first. Never touches the database.
+        """
+        with self._lock:
+            companies = list(self._companies)
+            by_id = dict(self._by_id)
+
+        pinned = [by_id.get(c) or self._entry({}, c) for c in self.pinned_companies]
+        ordered = pinned + [c for c in companies if c['company_id'] not in self.pinned_companies]
+
+        term = (term or "").strip()
+        if term:
+            ordered = [c for c in ordered if term in c['company_id']]
+
+        total = len(ordered)
+        page = max(1, int(page))
+        start = (page - 1) * page_size
+        return ordered[start:start + page_size], total
+
+    def company_ids(self):
+        """All known company ids (pinned first)"""
+        entries, _ = self.search(page_size=len(self._companies) + len(self.pinned_companies) or 1)
+        return [e['company_id'] for e in entries]
+
+
+# Global company directory instance
+company_directory = CompanyDirectory(pinned_companies=["922", "1336", "1387", "1415"])
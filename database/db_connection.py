@@ -1,17 +1,66 @@
 import mysql.connector
 import streamlit as st
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from mysql.connector.pooling import MySQLConnectionPool
 import pandas as pd
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
+from database.columnar import fetch_columnar
+from database.derived_tables import expand_derived
+from database.query_cache import QueryCache
+from database.single_flight import SingleFlight
+from database.replica_router import ReplicaRouter
+from database.tenant_limiter import TenantLimiter
+from database.local_replica import LocalReplica
+from resilience import CircuitBreaker, FallbackCache, current_deadline, get_breaker, time_budget
 
 # Load environment variables
 load_dotenv()
 
+# Primary connections are checked out of a pool per query and returned afterwards
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_WAIT = float(os.getenv('DB_POOL_WAIT', '10'))
+
+WRITE_KEYWORDS = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'REPLACE']
+
+
+def check_read_only(query):
+    """Raise if any statement in the query writes (string literals and comments are ignored)"""
+    # Remove string literals and comments before checking
+    string_pattern = r'(\"[^\"]*\"|\'[^\']*\')'
+    query_without_strings = re.sub(string_pattern, "''", query)
+    comment_pattern = r'(--[^\n]*|/\*.*?\*/)'
+    query_clean = re.sub(comment_pattern, '', query_without_strings, flags=re.DOTALL | re.MULTILINE)
+
+    query_upper = query_clean.upper().strip()
+    statements = [s.strip() for s in query_upper.split(';') if s.strip()]
+
+    for statement in statements:
+        first_word = statement.split()[0] if statement.split() else ''
+        if first_word in WRITE_KEYWORDS:
+            raise Exception(f"Security violation: Write operation '{first_word}' detected. Read-only mode.")
+
+
+def apply_time_limit(query):
+    """Cap server-side execution time at what is left of the request deadline"""
+    deadline = current_deadline()
+    if deadline is None or 'MAX_EXECUTION_TIME' in query.upper():
+        return query
+    limit_ms = max(1, int(deadline.remaining() * 1000))
+    return re.sub(r'^\s*SELECT\b', f'SELECT /*+ MAX_EXECUTION_TIME({limit_ms}) */', query,
+                  count=1, flags=re.IGNORECASE)
+
 
 class DatabaseConnection:
     def __init__(self):
-        self.connection = None
+        # Per-thread query state (fallback staleness); connections come from the pool
+        self._local = threading.local()
+        self.pool = None
+        self._pool_lock = threading.Lock()
         try:
             self.config = {
                 'host': st.secrets.get("DB_HOST", os.getenv('DB_HOST')),
@@ -38,11 +87,25 @@ class DatabaseConnection:
                 'buffered': True
             }
         self.current_company_id = None
+        self.circuit_breaker = get_breaker('database')
+        # Last good result per (query, params), served if the DB can't answer in time
+        self.fallback_cache = FallbackCache()
+        # Fresh results for company-scoped queries, invalidated by the change tracker
+        self.query_cache = QueryCache()
+        # Identical concurrent queries wait on one execution instead of each hitting the DB
+        self.single_flight = SingleFlight()
         
         # Validate required config
         if not all([self.config['host'], self.config['database'], 
                     self.config['user'], self.config['password']]):
             raise ValueError("Missing required database configuration in .env file")
+
+        # Heavy analytical reads go to read replicas (DB_REPLICA_HOSTS) when they are caught up
+        self.replica_router = ReplicaRouter(self.config)
+        # Per-company cap on concurrent executions so one tenant can't starve the rest
+        self.tenant_limiter = TenantLimiter()
+        # Agent reads answered from local Parquet copies when LOCAL_REPLICA=1 and the data is synced
+        self.local_replica = LocalReplica(self)
         
         print(f"🔧 DatabaseConnection initialized with host: {self.config['host']}")
 
@@ -56,134 +119,282 @@ class DatabaseConnection:
         except (ValueError, TypeError):
             raise ValueError(f"Invalid company_id: {company_id}. Must be numeric.")
 
-    def get_connection(self):
-        try:
-            # Always try to reconnect if connection doesn't exist or is closed
-            if self.connection is None:
-                print(f"🔄 Connecting to AWS RDS (new connection)...")
-                self.connection = mysql.connector.connect(**self.config)
+    def _ping_policy(self):
+        """Ping retry attempts/delay that fit inside the current request deadline"""
+        deadline = current_deadline()
+        if deadline is None:
+            return 3, 5
+        delay = min(5, deadline.remaining() / 3)
+        return (3, delay) if delay >= 1 else (1, 0)
 
-                if self.connection.is_connected():
+    def _get_pool(self):
+        """The primary connection pool, created on first use (its connections open eagerly)"""
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    print(f"🔄 Connecting to AWS RDS (pool of {DB_POOL_SIZE})...")
+                    self.pool = MySQLConnectionPool(pool_name='erp_primary', pool_size=DB_POOL_SIZE,
+                                                    pool_reset_session=True, **self.config)
                     print("✅ Connected to AWS RDS MySQL successfully!")
-                    db_info = self.connection.get_server_info()
-                    print(f"✅ MySQL Server version: {db_info}")
-                    return self.connection
-                else:
-                    print("❌ Connection failed - not connected")
-                    return None
-            else:
-                # Check if existing connection is still alive
-                try:
-                    self.connection.ping(reconnect=True, attempts=3, delay=5)
-                    if self.connection.is_connected():
-                        print(f"🔗 Using existing connection (connected)")
-                        return self.connection
-                    else:
-                        print(f"🔄 Reconnecting (connection lost)...")
-                        self.connection = mysql.connector.connect(**self.config)
-                        if self.connection.is_connected():
-                            print("✅ Reconnected to AWS RDS MySQL successfully!")
-                            return self.connection
-                        else:
-                            print("❌ Reconnection failed")
-                            self.connection = None
-                            return None
-                except Error as e:
-                    print(f"🔄 Connection ping failed, reconnecting: {e}")
-                    try:
-                        self.connection = mysql.connector.connect(**self.config)
-                        if self.connection.is_connected():
-                            print("✅ Reconnected to AWS RDS MySQL successfully!")
-                            return self.connection
-                        else:
-                            print("❌ Reconnection failed")
-                            self.connection = None
-                            return None
-                    except Error as e2:
-                        print(f"❌ Reconnection error: {e2}")
-                        self.connection = None
-                        return None
+        return self.pool
+
+    def _checkout(self, pool):
+        """Take a pooled connection, waiting while all are in use (up to DB_POOL_WAIT or the deadline)"""
+        wait_until = time.time() + time_budget(DB_POOL_WAIT)
+        while True:
+            try:
+                return pool.get_connection()
+            except PoolError:
+                if time.time() >= wait_until:
+                    raise
+                time.sleep(0.05)
 
+    def get_connection(self):
+        """Check a primary connection out of the pool, or None; hand it back with release_connection()"""
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            print("⏱️ Request deadline exceeded - skipping connection attempt")
+            return None
+
+        # Fail fast while the database is known to be down
+        if not self.circuit_breaker.allow_request():
+            print("⛔ Database circuit open - skipping connection attempt")
+            return None
+
+        try:
+            pool = self._get_pool()
         except Error as e:
-            error_msg = f"❌ AWS RDS Connection Error: {e}"
-            print(error_msg)
+            print(f"❌ AWS RDS Connection Error: {e}")
             st.error(f"Database Error: {e}")
-            self.connection = None
+            self.circuit_breaker.record_failure()
+            return None
+
+        try:
+            connection = self._checkout(pool)
+        except PoolError:
+            # Busy, not down: don't count it against the circuit, but free a half-open trial for the next caller
+            print(f"🚦 All {DB_POOL_SIZE} pooled connections busy")
+            self.circuit_breaker.release()
+            return None
+        except Error as e:
+            print(f"❌ AWS RDS Connection Error: {e}")
+            self.circuit_breaker.record_failure()
+            return None
+
+        try:
+            # Pooled connections may have idled out server-side
+            attempts, delay = self._ping_policy()
+            connection.ping(reconnect=True, attempts=attempts, delay=delay)
+        except Error as e:
+            print(f"❌ Pooled connection unusable: {e}")
+            self.release_connection(connection, broken=True)
+            self.circuit_breaker.record_failure()
             return None
+
+        self.circuit_breaker.record_success()
+        return connection
+
+    def release_connection(self, connection, broken=False):
+        """Return a pooled connection; a broken one is disconnected so the pool reconnects it on next checkout"""
+        if connection is None:
+            return
+        if broken:
+            try:
+                connection.disconnect()
+            except Exception:
+                pass
+        try:
+            connection.close()
         except Exception as e:
-            error_msg = f"❌ Unexpected Connection Error: {e}"
-            print(error_msg)
-            self.connection = None
+            # close() puts the connection back even when the session reset fails
+            print(f"⚠️ Returning pooled connection: {e}")
+
+    def check_health(self, timeout=5):
+        """Cheap liveness probe with a short timeout; returns latency in ms, raises on failure"""
+        started = time.time()
+        if self.pool is not None:
+            try:
+                connection = self.pool.get_connection()
+            except Error:
+                connection = None
+            if connection is not None:
+                try:
+                    connection.ping(reconnect=False)
+                    return (time.time() - started) * 1000
+                except Error:
+                    pass
+                finally:
+                    self.release_connection(connection)
+        # No pool yet, or none idle: probe with a short-lived connection of our own
+        probe_config = dict(self.config, connection_timeout=timeout, connect_timeout=timeout)
+        mysql.connector.connect(**probe_config).close()
+        return (time.time() - started) * 1000
+
+    def _apply_time_limit(self, query):
+        return apply_time_limit(query)
+
+    def _serve_fallback(self, cache_key):
+        """Return the last good result for this query, if any, and flag it as stale"""
+        cached = self.fallback_cache.get(cache_key)
+        if cached is None:
             return None
+        result, stored_at = cached
+        print(f"♻️ Serving cached result from {stored_at.strftime('%H:%M:%S')} (database unavailable)")
+        self._local.stale_since = stored_at
+        return result
 
-    def close_connection(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("🔒 Database connection closed")
-        self.connection = None
+    def last_result_stale_since(self):
+        """When the last query on this thread was answered from the fallback cache (or None)"""
+        return getattr(self._local, 'stale_since', None)
 
-    def execute_query(self, query, params=None, company_id=None):
-        """Execute query with company context - READ ONLY"""
+    def execute_query(self, query, params=None, company_id=None, workload=None):
+        """Execute query with company context - READ ONLY
+
+        workload='primary' or 'replica' overrides the automatic heavy/light routing.
+        """
+        return self._execute(query, params, company_id, workload=workload)
+
+    def _execute(self, query, params=None, company_id=None, columnar=False, batch_size=5000, workload=None):
+        """Shared read-only execution path; columnar=True returns a DataFrame instead of dict rows"""
         print(f"🔍 DatabaseConnection.execute_query called")
         print(f"🔍 Query preview: {query[:100]}...")
         print(f"🔍 Params received: {params}")
         print(f"🔍 Company context: {company_id or self.current_company_id}")
 
         # SQL Injection Prevention - Check for write operations
-        import re
-        
-        # Remove string literals and comments before checking
-        string_pattern = r'(\"[^\"]*\"|\'[^\']*\')'
-        query_without_strings = re.sub(string_pattern, "''", query)
-        comment_pattern = r'(--[^\n]*|/\*.*?\*/)'
-        query_clean = re.sub(comment_pattern, '', query_without_strings, flags=re.DOTALL | re.MULTILINE)
-        
-        query_upper = query_clean.upper().strip()
-        statements = [s.strip() for s in query_upper.split(';') if s.strip()]
-        write_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'REPLACE']
-        
-        for statement in statements:
-            first_word = statement.split()[0] if statement.split() else ''
-            if first_word in write_keywords:
-                raise Exception(f"Security violation: Write operation '{first_word}' detected. Read-only mode.")
+        check_read_only(query)
+
+        cache_key = (query, repr(params), columnar)
+        self._local.stale_since = None
+
+        # Only queries scoped to an explicit company are cached (so they can be invalidated)
+        if company_id is not None:
+            cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                print(f"⚡ Query cache hit for company {company_id}")
+                return cached
 
-        # Get connection with retry
+        # Concurrent callers with the same (query, params) share the first caller's execution
+        deadline = current_deadline()
+        try:
+            result, stale_since = self.single_flight.do(
+                cache_key, self._run_query, query, params, company_id, columnar, batch_size, cache_key, workload,
+                timeout=deadline.remaining() if deadline is not None else None)
+        except TimeoutError:
+            print("⏱️ Request deadline exceeded waiting for an identical in-flight query")
+            return self._serve_fallback(cache_key)
+        self._local.stale_since = stale_since
+        return result
+
+    def _run_query(self, query, params, company_id, columnar, batch_size, cache_key, workload=None):
+        """Execute on this thread's connection; returns (result, stale_since) so waiters see the same staleness"""
+        self._local.stale_since = None
+        # Read before running: a change event while the query runs means its rows may predate the change
+        generation = self.query_cache.generation(company_id)
+        # Explicitly routed queries (replica sync, change tracking) always go to MySQL
+        if workload is None:
+            result = self.local_replica.run(query, params, company_id, columnar)
+            if result is not None:
+                self.fallback_cache.put(cache_key, result)
+                self.query_cache.put(cache_key, result, company_id, query, generation)
+                return result, None
+        try:
+            with self.tenant_limiter.slot(company_id, timeout=time_budget(30)):
+                return self._run_routed(query, params, company_id, columnar, batch_size, cache_key, workload,
+                                        generation)
+        except TimeoutError as e:
+            print(f"🚦 {e} - serving cached result")
+            return self._serve_fallback(cache_key), self.last_result_stale_since()
+
+    def _primary_connection(self):
+        """A pooled primary connection, with one retry"""
         connection = None
         for attempt in range(2):
             connection = self.get_connection()
-            if connection:
+            if connection or self.circuit_breaker.state == CircuitBreaker.OPEN:
+                break
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
                 break
             print(f"⚠️ Connection attempt {attempt + 1} failed, retrying...")
+        return connection
+
+    def _run_routed(self, query, params, company_id, columnar, batch_size, cache_key, workload=None,
+                    generation=None):
+        """Run on a caught-up replica for heavy reads (primary if none is available), else on the primary"""
+        # MySQL doesn't store derived tables such as sales_facts: inline their definitions
+        query = expand_derived(query)
+        replica = self.replica_router.pick(query, columnar, workload)
+        connection = replica.get_connection() if replica else None
+        if connection is None:
+            replica = None
+            connection = self._primary_connection()
 
         if not connection:
             print("❌ No database connection available after retries")
-            return None
+            return self._serve_fallback(cache_key), self.last_result_stale_since()
 
         try:
-            cursor = connection.cursor(dictionary=True)
-            print(f"🔍 Executing query with cursor...")
+            if columnar:
+                # Unbuffered tuple cursor: rows stream in batches into column buffers
+                cursor = connection.cursor(buffered=False)
+            else:
+                cursor = connection.cursor(dictionary=True)
+            print(f"🔍 Executing query with cursor on {replica.name if replica else 'primary'}...")
             
             # Execute with provided params (agents provide complete params)
-            cursor.execute(query, params or ())
-            result = cursor.fetchall()
+            cursor.execute(self._apply_time_limit(query), params or ())
+            if columnar:
+                result = fetch_columnar(cursor, batch_size)
+            else:
+                result = cursor.fetchall()
             print(f"🔍 Query executed successfully, fetched {len(result)} rows")
             cursor.close()
-            return result
+            self.fallback_cache.put(cache_key, result)
+            if company_id is not None:
+                self.query_cache.put(cache_key, result, company_id, query, generation)
+            return result, None
             
         except Error as e:
             print(f"❌ Query Error: {e}")
             print(f"❌ Query was: {query}")
             print(f"❌ Params were: {params}")
-            self.close_connection()
-            return None
+            self._close_routed(replica, connection)
+            connection = None
+            return self._serve_fallback(cache_key), self.last_result_stale_since()
         except Exception as e:
             print(f"❌ Unexpected query error: {e}")
-            self.close_connection()
-            return None
+            self._close_routed(replica, connection)
+            connection = None
+            return self._serve_fallback(cache_key), self.last_result_stale_since()
+        finally:
+            # Primary connections go back to the pool after every query
+            if replica is None and connection is not None:
+                self.release_connection(connection)
+
+    def _close_routed(self, replica, connection):
+        if replica is not None:
+            replica.circuit_breaker.record_failure()
+            replica.close_connection()
+        else:
+            self.release_connection(connection, broken=True)
+
+    def execute_query_dataframe(self, query, params=None, company_id=None, columnar=False, batch_size=5000,
+                                workload=None):
+        """Execute query and return as pandas DataFrame
+
+        columnar=True skips the dict-per-row cursor: tuples are read in batches
+        into typed column arrays (Decimal -> float64, dates -> datetime64).
+        """
+        if columnar:
+            df = self._execute(query, params, company_id, columnar=True, batch_size=batch_size, workload=workload)
+            if df is not None and not df.empty:
+                print(f"🔍 Created columnar DataFrame with {len(df)} rows")
+                return df
+            print("🔍 No result, returning empty DataFrame")
+            return pd.DataFrame()
 
-    def execute_query_dataframe(self, query, params=None, company_id=None):
-        """Execute query and return as pandas DataFrame"""
-        result = self.execute_query(query, params, company_id)
+        result = self.execute_query(query, params, company_id, workload=workload)
         if result:
             df = pd.DataFrame(result)
             print(f"🔍 Created DataFrame with {len(df)} rows")
@@ -0,0 +1,68 @@
+import re
+
+
+# Denormalized sales fact: one row per invoice line with the delivery date, region, currency and
+# salesman already resolved. The local replica stores it per company and syncs it incrementally;
+# on MySQL it is expanded into a derived table, which the optimizer merges into the outer query.
+SALES_FACTS_SQL = """
+    SELECT sales_items.company_id,
+           sales_items.invoice_id,
+           sales_invoice.invoice_date  AS issue_date,
+           CASE
+               WHEN sales_invoice.note_id IS NULL OR sales_invoice.note_id = 0
+                   THEN sales_invoice.invoice_date
+               ELSE store_issue_note.note_date
+               END                     AS delivery_date,
+           sales_items.total,
+           sales_items.subtotal        AS sub_total,
+           sales_items.discount_amount AS discount,
+           contacts.region             AS region_id,
+           origins.title               AS region,
+           sales_invoice.customer_id,
+           sales_invoice.warehouse_id,
+           sales_items.product_id,
+           sales_items.quantity,
+           sales_items.price,
+           sales_items.tax,
+           sales_invoice.status,
+           sales_invoice.currency      AS currency_id,
+           foreign_currency.title      AS currency,
+           sales_invoice.project_id,
+           sales_invoice.salesman      AS salesman_id
+    FROM sales_items
+             LEFT JOIN sales_invoice ON sales_invoice.invoice_id = sales_items.invoice_id
+             LEFT JOIN store_issue_note ON store_issue_note.note_id = sales_invoice.note_id
+             LEFT JOIN contacts ON contacts.contact_id = sales_invoice.customer_id
+             LEFT JOIN origins ON origins.id = contacts.region
+             LEFT JOIN foreign_currency ON foreign_currency.fc_id = sales_invoice.currency
+"""
+
+# Derived table name -> (defining query, source tables it reads)
+DERIVED_TABLES = {
+    'sales_facts': (SALES_FACTS_SQL, ('sales_items', 'sales_invoice', 'store_issue_note', 'contacts',
+                                      'origins', 'foreign_currency')),
+}
+
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+DERIVED_REFERENCE = re.compile(r'\b(FROM|JOIN)\s+`?(' + '|'.join(DERIVED_TABLES) + r')`?(?!\w)', re.IGNORECASE)
+
+
+def expand_derived(query):
+    """Replace derived table references with their defining subquery, for engines that don't store them.
+
+    References must use the bare table name (no alias); the subquery is aliased to it.
+    """
+    return DERIVED_REFERENCE.sub(
+        lambda match: f"{match.group(1)} ({DERIVED_TABLES[match.group(2).lower()][0]}) AS {match.group(2)}", query)
+
+
+def referenced_tables(query):
+    return {name.lower() for name in TABLE_REFERENCE.findall(query)}
+
+
+def source_tables(query):
+    """Stored tables a query reads, with derived tables replaced by their inputs"""
+    tables = set()
+    for name in referenced_tables(query):
+        tables.update(DERIVED_TABLES[name][1] if name in DERIVED_TABLES else (name,))
+    return tables
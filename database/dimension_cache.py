@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from database.db_connection import db
+
+
+# Small lookup tables resolved in memory: key column, candidate label columns (first present wins)
+# and numeric attributes kept per row. Company-scoped tables are cached per company.
+DIMENSIONS = {
+    'products': {'key': 'product_id', 'labels': ('title', 'name', 'product_name'),
+                 'attributes': ('min_qty_alert', 'reorder_qty_alert', 'max_qty_alert'), 'scoped': True},
+    'contacts': {'key': 'contact_id', 'labels': ('name', 'title', 'contact_name'),
+                 'attributes': ('region',), 'scoped': True},
+    'origins': {'key': 'id', 'labels': ('title',), 'attributes': (), 'scoped': False},
+    'foreign_currency': {'key': 'fc_id', 'labels': ('title',), 'attributes': (), 'scoped': False},
+}
+
+
+class Dimension:
+    """One table's rows as parallel NumPy arrays sorted by id.
+
+    Lookups binary-search the id array, so a cached table costs a few
+    arrays instead of a dict and an object per row.
+    """
+
+    def __init__(self, frame, spec):
+        frame = frame[frame[spec['key']].notna()] if not frame.empty else frame
+        ids = frame[spec['key']].to_numpy(dtype=np.int64) if not frame.empty else np.empty(0, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        self.ids = ids[order]
+        label_column = next((c for c in spec['labels'] if c in frame.columns), None)
+        self.labels = frame[label_column].to_numpy(dtype=object)[order] if label_column else None
+        self.attributes = {name: frame[name].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+                           for name in spec['attributes'] if name in frame.columns}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, ids):
+        """Row positions for an array of ids (-1 where the id is unknown)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        positions[positions >= len(self.ids)] = 0
+        found = (self.ids[positions] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return np.where(found, positions, -1)
+
+    def label(self, id_value):
+        if self.labels is None or id_value is None:
+            return None
+        try:
+            position = self.positions([int(id_value)])[0]
+        except (TypeError, ValueError):
+            return None
+        if position < 0:
+            return None
+        label = self.labels[position]
+        return str(label) if label is not None and label == label and str(label).strip() else None
+
+    def attribute(self, name, ids):
+        """Attribute values for an array of ids (NaN where unknown)"""
+        values = self.attributes.get(name)
+        positions = self.positions(ids)
+        if values is None:
+            return np.full(len(positions), np.nan)
+        return np.where(positions >= 0, values[positions], np.nan)
+
+
+class DimensionCache:
+    """Per-company products/contacts and shared regions/currencies, loaded once and held in memory.
+
+    Agents resolve ids to names and product thresholds here instead of
+    joining the lookup tables in every query. A company's dimensions are
+    dropped when the change tracker reports new data for it and reloaded
+    on next use; entries also expire after `ttl` seconds to pick up renames.
+    """
+
+    def __init__(self, ttl=3600, max_companies=200):
+        self.ttl = ttl
+        self.max_companies = max_companies
+        self._entries = OrderedDict()
+        self._columns = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def subscribe_to(self, change_tracker):
+        change_tracker.subscribe(self.invalidate_company)
+
+    def invalidate_company(self, company_id, tables=None):
+        """Drop a company's dimensions (ChangeTracker callback).
+
+        With tables, only the dimensions among them are dropped, shared ones
+        (regions, currencies) included; sales or stock changes keep them.
+        """
+        company_id = str(company_id)
+        with self._lock:
+            for key in list(self._entries):
+                table, owner = key
+                if tables is None:
+                    stale = owner == company_id
+                else:
+                    stale = table in tables and owner in (company_id, None)
+                if stale:
+                    del self._entries[key]
+
+    def get(self, table, company_id=None):
+        """The cached Dimension for a table (and company), loading it if needed; None if it can't be loaded"""
+        spec = DIMENSIONS[table]
+        key = (table, str(company_id) if spec['scoped'] else None)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        query, params = f"SELECT {self._select_list(table, spec)} FROM {table}", ()
+        if spec['scoped']:
+            query, params = query + " WHERE company_id = %s", (company_id,)
+        try:
+            frame = db.execute_query_dataframe(query, params, company_id=key[1], columnar=True)
+            dimension = Dimension(frame, spec)
+        except Exception as e:
+            print(f"⚠️ Could not load {table} dimension: {e}")
+            return None
+        if frame.empty or db.last_result_stale_since() is not None:
+            # A failed query looks like an empty table: use it once but don't keep it
+            return dimension
+
+        with self._lock:
+            self._entries[key] = (dimension, time.time())
+            self._entries.move_to_end(key)
+            self.loads += 1
+            while len(self._entries) > self.max_companies * len(DIMENSIONS):
+                self._entries.popitem(last=False)
+        print(f"📇 Loaded {table} dimension ({len(dimension)} rows){f' for company {company_id}' if key[1] else ''}")
+        return dimension
+
+    def _select_list(self, table, spec):
+        """The key, label and attribute columns the table has, looked up once in information_schema"""
+        with self._lock:
+            columns = self._columns.get(table)
+        if columns is not None:
+            return columns
+        rows = db.execute_query(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,), workload='primary')
+        if not rows:
+            # Unknown for now: read every column and try again on the next load
+            return "*"
+        present = {row['COLUMN_NAME'].lower() for row in rows}
+        columns = ', '.join((spec['key'],) + tuple(column for column in spec['labels'] + spec['attributes']
+                                                  if column in present))
+        with self._lock:
+            self._columns[table] = columns
+        return columns
+
+    def label(self, table, company_id, id_value):
+        """Display name for an id, or None when it isn't known"""
+        dimension = self.get(table, company_id)
+        return dimension.label(id_value) if dimension is not None else None
+
+    def product_name(self, company_id, product_id):
+        """Product title for display, falling back to 'Product <id>'"""
+        return product_label(self.get('products', company_id), product_id)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'loads': self.loads}
+
+
+def product_label(products, product_id):
+    """Product title from an already loaded products Dimension (or None), falling back to 'Product <id>'"""
+    return (products.label(product_id) if products is not None else None) or f"Product {product_id}"
+
+
+# Global dimension cache instance
+dimension_cache = DimensionCache()
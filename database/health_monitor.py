@@ -0,0 +1,69 @@
+import threading
+from datetime import datetime
+
+from database.db_connection import db
+
+
+class HealthMonitor:
+    """Probes the database on a timer so the UI can read status without blocking"""
+
+    def __init__(self, interval=15, probe_timeout=5):
+        self.db = db
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self._status = {
+            'connected': False,
+            'latency_ms': None,
+            'last_error': None,
+            'last_checked': None,
+            'last_success': None,
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background probe loop (safe to call on every rerun)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-health-monitor", daemon=True)
+            self._thread.start()
+            print(f"🩺 Database health monitor started (every {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Run one health check and feed the result into the database circuit breaker"""
+        now = datetime.now()
+        try:
+            latency_ms = self.db.check_health(timeout=self.probe_timeout)
+        except Exception as e:
+            print(f"🩺 Database health probe failed: {e}")
+            self.db.circuit_breaker.record_failure()
+            with self._lock:
+                self._status.update(connected=False, latency_ms=None, last_error=str(e), last_checked=now)
+            return False
+
+        self.db.circuit_breaker.record_success()
+        with self._lock:
+            self._status.update(connected=True, latency_ms=latency_ms, last_checked=now, last_success=now)
+        return True
+
+    def status(self):
+        """Non-blocking copy of the latest known status"""
+        with self._lock:
+            status = dict(self._status)
+        status['circuit'] = self.db.circuit_breaker.state
+        return status
+
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
@@ -0,0 +1,314 @@
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+from database.derived_tables import DERIVED_TABLES, referenced_tables
+from database.replica_router import REPLICA
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # The replica is optional; without these every query goes to MySQL
+    duckdb = None
+
+
+# LOCAL_REPLICA=1 mirrors the agent tables into local Parquet files and answers agent queries from them
+LOCAL_REPLICA = os.getenv('LOCAL_REPLICA', '0') == '1'
+DEFAULT_REPLICA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   '.cache', 'replica')
+LOCAL_REPLICA_DIR = os.getenv('LOCAL_REPLICA_DIR', DEFAULT_REPLICA_DIR)
+# New rows are pulled every SYNC_INTERVAL seconds; whole partitions are reloaded every REFRESH_INTERVAL
+# so edits to existing rows (invoice status, stock quantities) are picked up too
+LOCAL_REPLICA_SYNC_INTERVAL = int(os.getenv('LOCAL_REPLICA_SYNC_INTERVAL', 300))
+LOCAL_REPLICA_REFRESH_INTERVAL = int(os.getenv('LOCAL_REPLICA_REFRESH_INTERVAL', 3600))
+# Partitions not synced for this long are not used (queries go to MySQL until the next sync)
+LOCAL_REPLICA_MAX_AGE = int(os.getenv('LOCAL_REPLICA_MAX_AGE', 900))
+
+# Mirrored tables with a monotonically growing key used as the incremental sync watermark.
+# Company-scoped tables are partitioned by company_id; shared lookups are one file each.
+REPLICA_TABLES = {
+    'sales_items': {'key': 'invoice_id', 'scoped': True},
+    'sales_invoice': {'key': 'invoice_id', 'scoped': True},
+    'store_issue_note': {'key': 'note_id', 'scoped': True},
+    'contacts': {'key': 'contact_id', 'scoped': True},
+    'stock': {'key': 'stock_id', 'scoped': True},
+    'products': {'key': 'product_id', 'scoped': True},
+    'voucher_items': {'key': 'voucher_id', 'scoped': True},
+    # Pre-joined sales lines (see derived_tables); synced like a table, the join runs once per sync
+    'sales_facts': {'key': 'invoice_id', 'scoped': True},
+    'origins': {'key': 'id', 'scoped': False},
+    'foreign_currency': {'key': 'fc_id', 'scoped': False},
+}
+
+def to_duckdb(query, params):
+    """MySQL-style placeholders to DuckDB's: %s -> ?, %(name)s -> $name"""
+    if isinstance(params, dict):
+        query = re.sub(r'%\((\w+)\)s', r'$\1', query)
+    else:
+        query = query.replace('%s', '?')
+        params = list(params or ())
+    return query.replace('%%', '%'), params
+
+
+class LocalReplica:
+    """Local columnar copy of the agent tables, queried with embedded DuckDB.
+
+    Each company's rows live in one Parquet file per table
+    (<dir>/<table>/company_id=<id>/data.parquet). A background thread pulls
+    rows at or past each partition's key watermark and reloads whole
+    partitions every LOCAL_REPLICA_REFRESH_INTERVAL; a change-tracker event
+    reloads the changed partitions at once (edits and deletes below the
+    watermark included) and keeps them unserved until the reload lands.
+    A company is synced once it is first queried.
+
+    run() answers a company-scoped read locally when every table it reads
+    is mirrored and freshly synced for that company, and returns None
+    otherwise (or if DuckDB rejects the MySQL dialect), in which case the
+    caller queries MySQL as usual.
+    """
+
+    def __init__(self, source, directory=None, enabled=LOCAL_REPLICA):
+        self.source = source
+        self.directory = directory or LOCAL_REPLICA_DIR
+        self.enabled = enabled and duckdb is not None
+        self._partitions = {}
+        self._companies = set()
+        self._dirty = set()
+        self._reloading = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.served = 0
+        self.declined = 0
+        self.errors = 0
+
+    def subscribe_to(self, change_tracker):
+        """Sync a company's changed tables as soon as the tracker reports new data"""
+        change_tracker.subscribe(self.mark_changed)
+
+    def mark_changed(self, company_id, tables):
+        company_id = str(company_id)
+        changed = set(tables)
+        changed.update(name for name, (_, inputs) in DERIVED_TABLES.items() if changed.intersection(inputs))
+        with self._lock:
+            for table in changed:
+                if table in REPLICA_TABLES:
+                    self._dirty.add((table, company_id if REPLICA_TABLES[table]['scoped'] else None))
+        self._wake.set()
+
+    def start(self):
+        """Start the background sync thread (safe to call on every rerun; no-op unless enabled)"""
+        if not self.enabled:
+            if LOCAL_REPLICA and duckdb is None:
+                print("⚠️ LOCAL_REPLICA=1 but duckdb/pyarrow are not installed - using MySQL")
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="local-replica-sync", daemon=True)
+            self._thread.start()
+            print(f"🗄️ Local replica sync started ({self.directory})")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            self.sync_shared()
+            with self._lock:
+                companies = list(self._companies)
+            for company_id in companies:
+                if self._stop.is_set():
+                    break
+                self.sync_company(company_id)
+            self._wake.wait(LOCAL_REPLICA_SYNC_INTERVAL)
+
+    # --- Sync ---
+
+    def _path(self, table, company_id=None):
+        if company_id is None:
+            return os.path.join(self.directory, table, 'data.parquet')
+        return os.path.join(self.directory, table, f'company_id={company_id}', 'data.parquet')
+
+    def _state(self, table, company_id):
+        """Sync state of one partition, recovered from its file after a restart"""
+        key = (table, company_id)
+        with self._lock:
+            state = self._partitions.get(key)
+            if state is not None:
+                return state
+        state = {'watermark': None, 'synced_at': None, 'refreshed_at': None}
+        path = self._path(table, company_id)
+        if os.path.exists(path):
+            try:
+                column = pq.read_table(path, columns=[REPLICA_TABLES[table]['key']]).column(0)
+                state['watermark'] = pc.max(column).as_py()
+                state['synced_at'] = state['refreshed_at'] = os.path.getmtime(path)
+            except Exception as e:
+                print(f"⚠️ Unreadable replica partition {path}: {e}")
+        with self._lock:
+            return self._partitions.setdefault(key, state)
+
+    def sync_shared(self):
+        for table, spec in REPLICA_TABLES.items():
+            if not spec['scoped']:
+                self._sync_partition(table, None)
+
+    def sync_company(self, company_id):
+        """Bring every company-scoped table of one company up to date"""
+        company_id = str(company_id)
+        started = time.time()
+        rows = 0
+        for table, spec in REPLICA_TABLES.items():
+            if spec['scoped']:
+                rows += self._sync_partition(table, company_id)
+        if rows:
+            print(f"🗄️ Replica synced {rows} rows for company {company_id} in {time.time() - started:.1f}s")
+
+    def _sync_partition(self, table, company_id):
+        """Pull new rows (or reload the partition when due or changed); returns rows fetched"""
+        key = REPLICA_TABLES[table]['key']
+        partition = (table, company_id)
+        state = self._state(table, company_id)
+        path = self._path(table, company_id)
+        now = time.time()
+        with self._lock:
+            dirty = partition in self._dirty
+        # A change event may be an edit or delete below the watermark, which only a full reload picks up
+        full = dirty or state['watermark'] is None or not os.path.exists(path) or \
+            now - (state['refreshed_at'] or 0) >= LOCAL_REPLICA_REFRESH_INTERVAL
+        if company_id is None and not full:
+            return 0
+        if not full and now - (state['synced_at'] or 0) < LOCAL_REPLICA_SYNC_INTERVAL:
+            return 0
+
+        query, params = f"SELECT * FROM {table}", ()
+        if company_id is not None:
+            query, params = query + " WHERE company_id = %s", (company_id,)
+            if not full:
+                # >= rather than >: rows sharing the watermark key may have landed after the last sync
+                query, params = query + f" AND {key} >= %s", params + (state['watermark'],)
+
+        with self._lock:
+            # Not served until the reload lands; an event arriving meanwhile marks it dirty again
+            self._dirty.discard(partition)
+            if dirty:
+                self._reloading.add(partition)
+        try:
+            fresh = self.source.execute_query_dataframe(query, params, columnar=True, workload=REPLICA)
+            if self.source.last_result_stale_since() is not None:
+                raise RuntimeError("database unavailable")
+            if fresh.empty:
+                # An empty reload is more likely a failed query than an emptied table: keep the old copy,
+                # but a changed partition stays unserved until a reload returns rows
+                if dirty:
+                    with self._lock:
+                        self._dirty.add(partition)
+                elif os.path.exists(path):
+                    state['synced_at'] = now
+                return 0
+            fetched = len(fresh)
+            if not full:
+                existing = pq.read_table(path).to_pandas()
+                fresh = pd.concat([existing[existing[key] < state['watermark']], fresh], ignore_index=True)
+            self._write(path, fresh)
+        except Exception as e:
+            print(f"❌ Replica sync of {table} for company {company_id} failed: {e}")
+            with self._lock:
+                self._dirty.add(partition)
+            return 0
+        finally:
+            with self._lock:
+                self._reloading.discard(partition)
+
+        watermark = fresh[key].max()
+        state['watermark'] = watermark.item() if hasattr(watermark, 'item') else watermark
+        state['synced_at'] = now
+        if full:
+            state['refreshed_at'] = now
+        return fetched
+
+    @staticmethod
+    def _write(path, frame):
+        # Write then rename: readers see the old file or the new one, never a partial one
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), temp_path)
+        os.replace(temp_path, path)
+
+    # --- Queries ---
+
+    def _is_fresh(self, table, company_id):
+        company_id = company_id if REPLICA_TABLES[table]['scoped'] else None
+        with self._lock:
+            if (table, company_id) in self._dirty or (table, company_id) in self._reloading:
+                return False
+        state = self._state(table, company_id)
+        return state['synced_at'] is not None and time.time() - state['synced_at'] < LOCAL_REPLICA_MAX_AGE
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = duckdb.connect()
+            # Queries may be LLM-written: confine DuckDB to the replica files
+            connection.execute("SET allowed_directories = ?", [[self.directory + os.sep]])
+            connection.execute("SET enable_external_access = false")
+            self._local.connection = connection
+        return connection
+
+    def run(self, query, params, company_id, columnar=False):
+        """Answer a company-scoped read from the replica; None means "ask MySQL" """
+        if not self.enabled or company_id is None:
+            return None
+        company_id = str(company_id)
+        tables = referenced_tables(query)
+        if not tables or not tables.issubset(REPLICA_TABLES):
+            return None
+        with self._lock:
+            if company_id not in self._companies:
+                self._companies.add(company_id)
+                self._wake.set()
+        if not all(self._is_fresh(table, company_id) for table in tables):
+            with self._lock:
+                self.declined += 1
+            return None
+
+        try:
+            connection = self._connection()
+            for table in tables:
+                path = self._path(table, company_id if REPLICA_TABLES[table]['scoped'] else None)
+                escaped = path.replace("'", "''")
+                connection.execute(f"CREATE OR REPLACE TEMP VIEW {table} AS SELECT * FROM read_parquet('{escaped}')")
+            local_query, local_params = to_duckdb(query, params)
+            cursor = connection.execute(local_query, local_params)
+            if columnar:
+                result = cursor.df()
+            else:
+                columns = [description[0] for description in cursor.description]
+                result = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            # Usually MySQL-only syntax; MySQL answers instead
+            print(f"⚠️ Local replica could not run query, using MySQL: {type(e).__name__}: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+
+        with self._lock:
+            self.served += 1
+        print(f"🗄️ Served from local replica ({', '.join(sorted(tables))})")
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'companies': len(self._companies), 'served': self.served,
+                    'declined': self.declined, 'errors': self.errors, 'pending_changes': len(self._dirty)}
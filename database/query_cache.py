@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+from database.derived_tables import source_tables
+
+
+class QueryCache:
+    """Per-company result cache for agent queries.
+
+    Entries expire after `ttl` seconds. Once subscribed to a ChangeTracker the
+    cache is told when a company's data changes, so results that read only
+    tables the tracker checks for edits (ChangeTracker.covered_tables) are
+    kept for the much longer `long_ttl`; anything else keeps the short TTL.
+
+    Each invalidation bumps the company's generation. Callers read it with
+    generation() before running a query and pass it to put(), so a result
+    that was being computed when the data changed is not cached.
+    """
+
+    def __init__(self, ttl=120, long_ttl=3600, max_entries=1024):
+        self.ttl = ttl
+        self.long_ttl = long_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._company_keys = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.change_tracker = None
+        self.hits = 0
+        self.misses = 0
+
+    def subscribe_to(self, change_tracker):
+        """Invalidate on change events; results over fully tracked tables get the long TTL"""
+        change_tracker.subscribe(self.invalidate_company)
+        self.change_tracker = change_tracker
+
+    def ttl_for(self, query):
+        """Lifetime of a cached result: long only when the tracker sees every edit to the tables it read"""
+        if self.change_tracker is None or query is None:
+            return self.ttl
+        tables = source_tables(query)
+        if tables and tables <= self.change_tracker.covered_tables():
+            return self.long_ttl
+        return self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > entry[3]:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, company_id):
+        with self._lock:
+            return self._generations.get(str(company_id), 0)
+
+    def put(self, key, value, company_id, query=None, generation=None):
+        """Cache a result; skipped if the company was invalidated since `generation` was read"""
+        company_id = str(company_id)
+        ttl = self.ttl_for(query)
+        with self._lock:
+            if generation is not None and self._generations.get(company_id, 0) != generation:
+                return
+            self._entries[key] = (value, time.time(), company_id, ttl)
+            self._entries.move_to_end(key)
+            self._company_keys.setdefault(company_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, _, old_company, _) = self._entries.popitem(last=False)
+                self._company_keys.get(old_company, set()).discard(old_key)
+
+    def invalidate_company(self, company_id, tables=None):
+        """Drop every cached result for a company (ChangeTracker callback)"""
+        with self._lock:
+            self._generations[str(company_id)] = self._generations.get(str(company_id), 0) + 1
+            keys = self._company_keys.pop(str(company_id), set())
+            for key in keys:
+                self._entries.pop(key, None)
+        if keys:
+            print(f"🧹 Query cache: dropped {len(keys)} entries for company {company_id}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._company_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl,
+                    'long_ttl': self.long_ttl}
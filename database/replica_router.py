@@ -0,0 +1,171 @@
+import itertools
+import os
+import re
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+from resilience import CircuitBreaker, get_breaker
+
+
+# Comma-separated read replica hosts (host or host:port); the primary's user/password/database are reused
+DB_REPLICA_HOSTS = os.getenv('DB_REPLICA_HOSTS', '')
+# Replicas further behind than this (seconds) are skipped until they catch up
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 10))
+
+# Joins, grouping and wide columnar fetches are analytical work worth sending to a replica
+HEAVY_QUERY = re.compile(r'\bJOIN\b|\bGROUP\s+BY\b', re.IGNORECASE)
+READ_QUERY = re.compile(r'^\s*(?:/\*.*?\*/\s*)?(?:SELECT|WITH)\b', re.IGNORECASE | re.DOTALL)
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+def replica_configs(primary_config, hosts=None):
+    """Connection configs for each replica host, otherwise identical to the primary's"""
+    configs = []
+    for entry in (hosts if hosts is not None else DB_REPLICA_HOSTS).split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        configs.append(dict(primary_config, host=host, port=int(port or primary_config['port'])))
+    return configs
+
+
+class ReplicaPool:
+    """One read replica: per-thread connections, its own circuit breaker and last measured lag"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.circuit_breaker = get_breaker(name)
+        self._local = threading.local()
+        self.lag = None
+        self.lag_checked = None
+
+    def get_connection(self):
+        if not self.circuit_breaker.allow_request():
+            return None
+        connection = getattr(self._local, 'connection', None)
+        try:
+            if connection is not None:
+                connection.ping(reconnect=True, attempts=1, delay=0)
+            else:
+                connection = mysql.connector.connect(**self.config)
+                self._local.connection = connection
+                print(f"✅ Connected to read replica {self.name} ({self.config['host']})")
+            self.circuit_breaker.record_success()
+            return connection
+        except Error as e:
+            print(f"❌ Replica {self.name} connection error: {e}")
+            self._local.connection = None
+            self.circuit_breaker.record_failure()
+            return None
+
+    def close_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and connection.is_connected():
+            connection.close()
+        self._local.connection = None
+
+    def measure_lag(self):
+        """Seconds behind the primary; 0 when the server reports no binlog replication (e.g. Aurora)"""
+        connection = self.get_connection()
+        if connection is None:
+            self.lag = None
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                cursor.execute("SHOW SLAVE STATUS")
+            row = cursor.fetchone()
+            cursor.close()
+            if row is None:
+                self.lag = 0.0
+            else:
+                seconds = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+                # NULL means replication is stopped: treat as unusable
+                self.lag = float(seconds) if seconds is not None else None
+        except Error as e:
+            print(f"⚠️ Could not read lag for replica {self.name}: {e}")
+            self.close_connection()
+            self.lag = None
+        self.lag_checked = time.time()
+        return self.lag
+
+    @property
+    def usable(self):
+        return self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG and \
+            self.circuit_breaker.state != CircuitBreaker.OPEN
+
+
+class ReplicaRouter:
+    """Sends heavy analytical reads to read replicas and everything else to the primary.
+
+    A query goes to a replica when it is a read with joins or grouping, or
+    a columnar fetch, and a replica is within DB_REPLICA_MAX_LAG seconds
+    of the primary. Replicas take turns. Lag is measured on a background
+    timer, so routing never waits on it. With no replicas configured every
+    query goes to the primary.
+    """
+
+    def __init__(self, primary_config, hosts=None, lag_interval=15):
+        self.replicas = [ReplicaPool(f"replica-{i}", config)
+                         for i, config in enumerate(replica_configs(primary_config, hosts))]
+        self.lag_interval = lag_interval
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.routed = {PRIMARY: 0, REPLICA: 0}
+
+    @staticmethod
+    def is_heavy(query, columnar=False):
+        return bool(READ_QUERY.match(query)) and (columnar or bool(HEAVY_QUERY.search(query)))
+
+    def pick(self, query, columnar=False, workload=None):
+        """The ReplicaPool to run a query on, or None for the primary"""
+        wants_replica = workload == REPLICA or (workload is None and self.is_heavy(query, columnar))
+        replica = None
+        if wants_replica and self.replicas:
+            usable = [r for r in self.replicas if r.usable]
+            if usable:
+                replica = usable[next(self._turn) % len(usable)]
+        with self._lock:
+            self.routed[REPLICA if replica else PRIMARY] += 1
+        return replica
+
+    def start(self):
+        """Start the background lag monitor (safe to call on every rerun; no-op without replicas)"""
+        if not self.replicas:
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-lag-monitor", daemon=True)
+            self._thread.start()
+            print(f"🪞 Replica lag monitor started ({len(self.replicas)} replicas, max lag {DB_REPLICA_MAX_LAG:.0f}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for replica in self.replicas:
+                replica.measure_lag()
+            self._stop.wait(self.lag_interval)
+
+    def status(self):
+        with self._lock:
+            routed = dict(self.routed)
+        return {
+            'replicas': [{'name': r.name, 'host': r.config['host'], 'lag': r.lag, 'usable': r.usable}
+                         for r in self.replicas],
+            'routed': routed,
+        }
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+
+DEFAULT_ROLLUP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   '.cache', 'rollups.sqlite3')
+
+
+class RollupStore:
+    """Local SQLite store of per-company, per-day rollups, keyed by (company_id, kind, day).
+
+    Each kind also records the half-open day range [start, end) it has been
+    built for, so readers know which days are complete (a day with no rows
+    inside that range simply had no activity), and the highest source key
+    (invoice or voucher id) seen when it was built, so rows added later with
+    an earlier date can be found.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('ROLLUP_DB_PATH', DEFAULT_ROLLUP_PATH)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        # A short-lived connection per call keeps the store safe across threads and processes
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    connection = sqlite3.connect(self.path, timeout=30)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS daily_rollups (
+                            company_id TEXT NOT NULL,
+                            kind       TEXT NOT NULL,
+                            day        TEXT NOT NULL,
+                            payload    TEXT NOT NULL,
+                            PRIMARY KEY (company_id, kind, day)
+                        )
+                    """)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS rollup_coverage (
+                            company_id TEXT NOT NULL,
+                            kind       TEXT NOT NULL,
+                            start_day  TEXT NOT NULL,
+                            end_day    TEXT NOT NULL,
+                            built_at   TEXT NOT NULL,
+                            max_key    INTEGER,
+                            PRIMARY KEY (company_id, kind)
+                        )
+                    """)
+                    try:
+                        # Stores created before the key watermark existed
+                        connection.execute("ALTER TABLE rollup_coverage ADD COLUMN max_key INTEGER")
+                    except sqlite3.OperationalError:
+                        pass
+                    connection.commit()
+                    connection.close()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put_days(self, company_id, kind, days, start, end):
+        """Replace a company's rollups for [start, end) with {day: payload} and extend its coverage"""
+        company_id = str(company_id)
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT start_day, end_day, max_key FROM rollup_coverage WHERE company_id = ? AND kind = ?",
+                (company_id, kind)).fetchone()
+            start_day = min(row[0], start.isoformat()) if row else start.isoformat()
+            # Re-rolling a single earlier day must not shrink the coverage
+            end_day = max(row[1], end.isoformat()) if row else end.isoformat()
+            max_key = row[2] if row else None
+            connection.execute("DELETE FROM daily_rollups WHERE company_id = ? AND kind = ? AND day >= ? AND day < ?",
+                               (company_id, kind, start.isoformat(), end.isoformat()))
+            connection.executemany(
+                "INSERT OR REPLACE INTO daily_rollups (company_id, kind, day, payload) VALUES (?, ?, ?, ?)",
+                [(company_id, kind, day.isoformat(), payload) for day, payload in days.items()])
+            connection.execute(
+                "INSERT OR REPLACE INTO rollup_coverage (company_id, kind, start_day, end_day, built_at, max_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (company_id, kind, start_day, end_day, datetime.now().isoformat(), max_key))
+            connection.commit()
+        finally:
+            connection.close()
+        return len(days)
+
+    def coverage(self, company_id, kind):
+        """(start, end) dates the company's rollups of this kind cover, or None if never built"""
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT start_day, end_day FROM rollup_coverage WHERE company_id = ? AND kind = ?",
+                    (str(company_id), kind)).fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Rollup store read failed: {e}")
+            return None
+        return (date.fromisoformat(row[0]), date.fromisoformat(row[1])) if row else None
+
+    def max_key(self, company_id, kind):
+        """Highest source key the company's rollups of this kind have seen, or None if unknown"""
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT max_key FROM rollup_coverage WHERE company_id = ? AND kind = ?",
+                                     (str(company_id), kind)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def advance_max_key(self, company_id, kind, max_key):
+        """Raise the key watermark (never lowers it)"""
+        connection = self._connect()
+        try:
+            connection.execute(
+                "UPDATE rollup_coverage SET max_key = MAX(COALESCE(max_key, ?), ?) WHERE company_id = ? AND kind = ?",
+                (max_key, max_key, str(company_id), kind))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def get_days(self, company_id, kind, start, end):
+        """Payloads of the stored days in [start, end)"""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT payload FROM daily_rollups WHERE company_id = ? AND kind = ? AND day >= ? AND day < ?",
+                (str(company_id), kind, start.isoformat(), end.isoformat())).fetchall()
+        finally:
+            connection.close()
+        return [row[0] for row in rows]
+
+
+# Global rollup store instance
+rollup_store = RollupStore()
@@ -26,6 +26,20 @@ class SchemaDiscovery:
                 """
         return self.db.execute_query(query, (table_name,))
 
+    def get_tables_with_column(self, table_names, column_name='company_id'):
+        """Subset of table_names that have the given column"""
+        if not table_names:
+            return set()
+        query = f"""
+                SELECT DISTINCT TABLE_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE COLUMN_NAME = %s
+                  AND TABLE_SCHEMA = 'app_database'
+                  AND TABLE_NAME IN ({', '.join(['%s'] * len(table_names))})
+                """
+        result = self.db.execute_query(query, (column_name,) + tuple(table_names))
+        return {row['TABLE_NAME'] for row in result or []}
+
     def discover_sales_tables(self):
         """Discover sales-related tables"""
         sales_tables = ['sales_invoice', 'sales_items', 'store_issue_note', 'contacts', 'origins']
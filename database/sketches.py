@@ -0,0 +1,143 @@
+import math
+import zlib
+
+import numpy as np
+
+
+def hash64(ids):
+    """splitmix64 of integer ids, vectorized: well-mixed 64-bit hashes for sketching"""
+    x = np.asarray(ids, dtype=np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _present(values, dtype):
+    """Non-NULL values as a NumPy array"""
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    return values[~np.isnan(values)].astype(dtype)
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch over integer ids (about 1.6% standard error at p=12).
+
+    Sketches of disjoint or overlapping sets merge by taking the register
+    maximum, so per-day sketches combine into any date range.
+    """
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add_many(self, ids):
+        ids = _present(ids, np.int64)
+        if not len(ids):
+            return
+        hashes = hash64(ids)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        # Rank = leading zeros of the remaining bits + 1; frexp's exponent is the bit length
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, 64 - self.p + 1, 64 - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes([self.p]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy())
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Values fall into logarithmic buckets of ratio gamma, so any quantile is
+    returned within `relative_accuracy` of the true value, and merging is
+    adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.positive.values()) + sum(self.negative.values())
+
+    def _add_to(self, buckets, magnitudes):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def add_many(self, values):
+        values = _present(values, np.float64)
+        tiny = np.abs(values) < 1e-9
+        self.zero_count += int(np.count_nonzero(tiny))
+        if np.any(values > 1e-9):
+            self._add_to(self.positive, values[values > 1e-9])
+        if np.any(values < -1e-9):
+            self._add_to(self.negative, -values[values < -1e-9])
+
+    def merge(self, other):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self.zero_count += other.zero_count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or None for an empty sketch"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self):
+        return {'a': self.relative_accuracy, 'z': self.zero_count,
+                'p': sorted(self.positive.items()), 'n': sorted(self.negative.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['a'])
+        sketch.zero_count = data['z']
+        sketch.positive = {int(k): c for k, c in data['p']}
+        sketch.negative = {int(k): c for k, c in data['n']}
+        return sketch
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     '.cache', 'snapshots.sqlite3')
+
+
+class SnapshotStore:
+    """Local SQLite store of precomputed agent results, keyed by (company_id, method).
+
+    Each snapshot records the change tracker's signature of the company's
+    data when it was computed; a reader whose tracker now sees a different
+    signature treats the snapshot as missing.
+    """
+
+    def __init__(self, path=None, max_age_hours=26):
+        self.path = path or os.getenv('SNAPSHOT_DB_PATH', DEFAULT_SNAPSHOT_PATH)
+        self.max_age = timedelta(hours=max_age_hours)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        # A short-lived connection per call keeps the store safe across threads and processes
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    connection = sqlite3.connect(self.path, timeout=30)
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS snapshots (
+                            company_id  TEXT NOT NULL,
+                            method      TEXT NOT NULL,
+                            payload     TEXT NOT NULL,
+                            computed_at TEXT NOT NULL,
+                            signature   TEXT,
+                            PRIMARY KEY (company_id, method)
+                        )
+                    """)
+                    columns = {row[1] for row in connection.execute("PRAGMA table_info(snapshots)")}
+                    if 'signature' not in columns:
+                        # Stores written before signatures existed: their rows never match and go live
+                        connection.execute("ALTER TABLE snapshots ADD COLUMN signature TEXT")
+                    connection.commit()
+                    connection.close()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put_many(self, snapshots, computed_at=None, signatures=None):
+        """Store {company_id: {method: payload}} in one transaction, with {company_id: data signature}"""
+        computed_at = (computed_at or datetime.now()).isoformat()
+        signatures = signatures or {}
+        rows = [(str(company_id), method, payload, computed_at, signatures.get(str(company_id)))
+                for company_id, methods in snapshots.items()
+                for method, payload in methods.items()]
+        connection = self._connect()
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO snapshots (company_id, method, payload, computed_at, signature) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows)
+            connection.commit()
+        finally:
+            connection.close()
+        return len(rows)
+
+    def get(self, company_id, method, signature):
+        """(payload, computed_at) if the snapshot is fresh and was computed from data with this signature, else None"""
+        if signature is None:
+            # The caller can't vouch for the data yet
+            return None
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT payload, computed_at, signature FROM snapshots WHERE company_id = ? AND method = ?",
+                    (str(company_id), method)).fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Snapshot store read failed: {e}")
+            return None
+
+        if row is None:
+            return None
+        payload, computed_at, stored_signature = row
+        computed_at = datetime.fromisoformat(computed_at)
+        if datetime.now() - computed_at > self.max_age or stored_signature != signature:
+            return None
+        return payload, computed_at
+
+    def invalidate_company(self, company_id, tables=None):
+        """Drop a company's snapshots (ChangeTracker callback) so the app goes live for it"""
+        try:
+            connection = self._connect()
+            try:
+                connection.execute("DELETE FROM snapshots WHERE company_id = ?", (str(company_id),))
+                connection.commit()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Snapshot store invalidation failed: {e}")
+
+
+# Global snapshot store instance
+snapshot_store = SnapshotStore()
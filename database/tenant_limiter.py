@@ -0,0 +1,56 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+# Queries one company may have running at once (per process)
+DB_MAX_QUERIES_PER_COMPANY = int(os.getenv('DB_MAX_QUERIES_PER_COMPANY', 4))
+
+
+class TenantLimiter:
+    """Caps concurrent database executions per company.
+
+    A large tenant firing many heavy queries queues behind its own limit
+    instead of taking every connection, so other companies keep being
+    served. Queries without a company id are not limited.
+    """
+
+    def __init__(self, max_per_company=DB_MAX_QUERIES_PER_COMPANY):
+        self.max_per_company = max_per_company
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.rejections = 0
+
+    def _semaphore(self, company_id):
+        with self._lock:
+            semaphore = self._slots.get(company_id)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_company)
+                self._slots[company_id] = semaphore
+            return semaphore
+
+    @contextmanager
+    def slot(self, company_id, timeout=None):
+        """Hold one of the company's slots for the block; raises TimeoutError if none frees up in time"""
+        if company_id is None:
+            yield
+            return
+
+        semaphore = self._semaphore(str(company_id))
+        if not semaphore.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not semaphore.acquire(timeout=timeout):
+                with self._lock:
+                    self.rejections += 1
+                raise TimeoutError(f"Company {company_id} already has {self.max_per_company} queries running")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {'max_per_company': self.max_per_company, 'companies': len(self._slots),
+                    'waits': self.waits, 'rejections': self.rejections}
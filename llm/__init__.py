@@ -1,3 +1,4 @@
 from .openrouter_client import OpenRouterClient, llm_client
+from .conversation import Conversation
 
-__all__ = ['OpenRouterClient', 'llm_client']
\ No newline at end of file
+__all__ = ['OpenRouterClient', 'llm_client', 'Conversation']
@@ -0,0 +1,137 @@
+import os
+import re
+from decimal import Decimal
+
+import pandas as pd
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to a ~4 characters per token estimate
+    tiktoken = None
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('LLM_CONTEXT_TOKENS', 1500))
+
+# Decoration in agent responses that costs tokens and tells the LLM nothing
+EMOJI = re.compile('[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]')
+BOILERPLATE = re.compile(r'^\*?(?:Live data from|Forecast based on|Note:).*$', re.IGNORECASE)
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Token count with the local tiktoken encoder, or an estimate without it"""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def compact_text(text):
+    """Strip markdown emphasis, emoji, rules and boilerplate from an agent response"""
+    lines = []
+    for line in str(text).splitlines():
+        line = EMOJI.sub('', line).replace('**', '').replace('`', '')
+        line = re.sub(r'^\s*(?:#+|[-•*]|\d+\.)\s+', '', line).strip()
+        if not line or BOILERPLATE.match(line) or re.fullmatch(r'[-|=: ]+', line):
+            continue
+        lines.append(line)
+    return lines
+
+
+def _compact_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (float, Decimal)):
+        return f"{float(value):.2f}".rstrip('0').rstrip('.')
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return str(value).replace('|', '/').replace('\n', ' ')
+
+
+def compact_rows(rows):
+    """Header line plus one pipe-separated line per row (dict rows or a DataFrame)"""
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.to_dict('records')
+    if not rows:
+        return []
+    columns = list(rows[0].keys())
+    return ['|'.join(columns)] + ['|'.join(_compact_value(row.get(c)) for c in columns) for row in rows]
+
+
+def _totals(rows):
+    """Sum of each numeric column, used to summarize rows cut from the context"""
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.to_dict('records')
+    totals = {}
+    for row in rows:
+        for column, value in row.items():
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) \
+                    and not column.endswith('_id'):
+                totals[column] = totals.get(column, 0) + float(value)
+    return ', '.join(f"{column}={_compact_value(total)}" for column, total in totals.items())
+
+
+class ContextBuilder:
+    """Builds the data part of an LLM prompt in compact form within a token budget.
+
+    Sections are agent responses (markdown strings) or query rows. When the
+    total is over budget each section gets a fair share; a cut table keeps
+    its header and gets a line with the numeric totals over all its rows.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or CONTEXT_TOKEN_BUDGET
+        self.sections = []
+
+    def add(self, label, data):
+        if isinstance(data, (list, pd.DataFrame)):
+            self.sections.append((label, compact_rows(data), data))
+        else:
+            self.sections.append((label, compact_text(data), None))
+        return self
+
+    def build(self):
+        """Return (context, token_count)"""
+        fitted = {}
+        remaining = self.budget
+        # Smallest sections first, so short ones are kept whole and long ones share the rest
+        order = sorted(range(len(self.sections)), key=lambda i: count_tokens('\n'.join(self.sections[i][1])))
+        for position, index in enumerate(order):
+            label, lines, rows = self.sections[index]
+            share = remaining // (len(order) - position)
+            fitted[index] = self._fit(lines, rows, share)
+            remaining -= count_tokens('\n'.join(fitted[index]))
+
+        parts = []
+        for index, (label, _, _) in enumerate(self.sections):
+            parts.append(f"[{label}]\n" + '\n'.join(fitted[index]))
+        context = '\n\n'.join(parts)
+        return context, count_tokens(context)
+
+    def _fit(self, lines, rows, budget):
+        if count_tokens('\n'.join(lines)) <= budget:
+            return lines
+
+        is_table = rows is not None
+        head = lines[:1] if is_table else []
+        body = lines[1:] if is_table else lines
+        totals = _totals(rows) if is_table else ''
+        summary = f"... {len(body)} more rows; totals over all {len(body)}: {totals}" if is_table else "... (truncated)"
+        used = count_tokens('\n'.join(head + [summary]))
+
+        kept = []
+        for line in body:
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+
+        if is_table:
+            return head + kept + [f"... {len(body) - len(kept)} more rows; totals over all {len(body)}: {totals}"]
+        return kept + [summary]
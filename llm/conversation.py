@@ -0,0 +1,102 @@
+import re
+import threading
+from collections import deque
+
+from agents.time_window import parse_date_range
+from llm.context_builder import compact_text, count_tokens
+
+
+# "what about last month?", "and for Q2", "same for this year"
+FOLLOW_UP = re.compile(r'^\s*(?:and|also|what about|how about|same for|and for|now|then|ok(?:ay)?)\b',
+                       re.IGNORECASE)
+DOMAIN_WORDS = ['sales', 'revenue', 'invoice', 'order', 'customer', 'cash', 'flow', 'payment', 'voucher',
+                'inventory', 'stock', 'warehouse', 'product']
+
+
+class Conversation:
+    """Bounded chat history for one session.
+
+    Keeps the last max_messages messages for display. Older messages are
+    folded into one-line digests kept within summary_tokens. The LLM sees
+    the digests plus the last context_messages messages. The intent of the
+    last data answer (route, method, date range, question) is remembered
+    so follow-ups like "what about last month?" can re-run it with new
+    parameters.
+    """
+
+    def __init__(self, max_messages=100, context_messages=6, summary_tokens=300):
+        self.messages = deque(maxlen=max_messages)
+        self.context_messages = context_messages
+        self.summary_tokens = summary_tokens
+        self.summary = deque()
+        self.summarized = 0
+        self.last_intent = None
+        self._lock = threading.Lock()
+
+    def add(self, role, content):
+        with self._lock:
+            if len(self.messages) == self.messages.maxlen:
+                self._summarize(self.messages[0])
+            self.messages.append({"role": role, "content": content})
+
+    def remember(self, intent):
+        """Record the intent of the latest data answer: {route, method, question, date_range}"""
+        with self._lock:
+            self.last_intent = intent
+
+    def _summarize(self, message):
+        """Fold a message leaving the window into a one-line digest, dropping the oldest digests past the budget"""
+        lines = compact_text(message["content"])
+        gist = lines[0][:120] if lines else ''
+        self.summary.append(f"{'User asked' if message['role'] == 'user' else 'Assistant answered'}: {gist}")
+        self.summarized += 1
+        while len(self.summary) > 1 and count_tokens('\n'.join(self.summary)) > self.summary_tokens:
+            self.summary.popleft()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def page(self, page=1, page_size=20):
+        """Messages for page N counting back from the newest (page 1 = latest)"""
+        with self._lock:
+            messages = list(self.messages)
+        end = max(0, len(messages) - (page - 1) * page_size)
+        return messages[max(0, end - page_size):end]
+
+    def history_for_llm(self, budget=600):
+        """Digest of older turns plus the most recent messages, compacted to a token budget"""
+        with self._lock:
+            summary = list(self.summary)
+            recent = list(self.messages)[-self.context_messages:]
+
+        lines = []
+        if summary:
+            lines.append("Earlier: " + " / ".join(summary))
+        for message in recent:
+            content = ' '.join(compact_text(message["content"]))
+            lines.append(f"{message['role']}: {content[:400]}")
+
+        # Newest lines matter most; drop from the oldest end until within budget
+        while len(lines) > 1 and count_tokens('\n'.join(lines)) > budget:
+            lines.pop(0)
+        return '\n'.join(lines)
+
+    def is_follow_up(self, message):
+        """True for messages that only make sense against the last question"""
+        message_lower = message.lower()
+        # Naming a domain ("now show inventory") starts a new question
+        if self.last_intent is None or any(word in message_lower for word in DOMAIN_WORDS):
+            return False
+        if FOLLOW_UP.search(message):
+            return True
+        # A short message naming only a period ("last quarter?") continues the last question
+        return len(message.split()) <= 4 and parse_date_range(message) is not None
+
+    def resolve_follow_up(self, message):
+        """The last intent re-targeted at the period named in a follow-up, or None"""
+        if not self.is_follow_up(message):
+            return None
+        date_range = parse_date_range(message)
+        if date_range is None:
+            return None
+        return dict(self.last_intent, date_range=date_range)
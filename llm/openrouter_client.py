@@ -3,21 +3,14 @@ import requests
 import json
 import streamlit as st
 from dotenv import load_dotenv
+from resilience import get_breaker, time_budget
+from llm.context_builder import ContextBuilder, count_tokens
 
 load_dotenv()
 
-
-class OpenRouterClient:
-    def __init__(self):
-        self.api_key = os.getenv('OPENROUTER_API_KEY')
-        self.base_url = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
-        self.model = os.getenv('OPENROUTER_MODEL', 'meta-llama/llama-3.1-8b-instruct:free')
-
-    def classify_intent(self, user_message, company_id):
-        """Use LLM to classify user intent and generate appropriate response"""
-
-        system_prompt = f"""You are an intelligent ERP assistant for a multi-company system. 
-Current company context: {company_id}
+# System prompts are constant so every request shares the same prefix (provider-side
+# prompt caching); per-turn details such as the company id go in the user message.
+INTENT_SYSTEM_PROMPT = """You are an intelligent ERP assistant for a multi-company system.
 
 Analyze the user's query and determine:
 1. Intent category: sales, inventory, cashflow, or general
@@ -30,14 +23,79 @@ Available data domains:
 - CASHFLOW: payments, vouchers, liquidity, financial forecasting, cash positions
 
 Respond in JSON format with:
-{{
+{
     "intent": "sales|inventory|cashflow|general",
     "confidence": 0.0-1.0,
     "reasoning": "brief explanation",
     "suggested_agent_method": "specific method to call",
     "response_template": "template for final response with placeholders"
+}"""
+
+RESPONSE_SYSTEM_PROMPT = """You are a helpful ERP assistant. The user message gives the company,
+the question and the data retrieved for it. Tables in the data are pipe-separated with a
+header line; a "... more rows" line gives totals over rows that were left out.
+
+Please provide a helpful, natural response that:
+1. Directly answers the user's question
+2. Presents the data in an easy-to-understand format
+3. Highlights key insights from the data
+4. Is professional but conversational
+5. Mentions the company context when relevant
+
+Keep the response concise but informative."""
+
+SQL_SYSTEM_PROMPT = """You write MySQL queries for an ERP database.
+
+Available tables and columns:
+{schema}
+
+Rules:
+1. Write exactly one SELECT statement (no INSERT/UPDATE/DELETE, no comments, no semicolons)
+2. Use only the tables and columns listed above, joined with explicit JOIN ... ON
+3. Do not filter on company_id - company scoping is added automatically
+4. Prefer aggregates (SUM, COUNT, AVG with GROUP BY) over returning raw rows
+5. Compare dates with >= and < on the bare column, never wrap a column in a function in WHERE
+
+Respond in JSON format with:
+{{
+    "sql": "the SELECT statement",
+    "explanation": "one sentence describing what the query returns"
 }}"""
 
+
+class OpenRouterClient:
+    def __init__(self):
+        self.api_key = os.getenv('OPENROUTER_API_KEY')
+        self.base_url = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
+        self.model = os.getenv('OPENROUTER_MODEL', 'meta-llama/llama-3.1-8b-instruct:free')
+        self.timeout = 30
+        self.circuit_breaker = get_breaker('llm', failure_threshold=3, reset_timeout=60)
+
+    def _request_timeout(self):
+        """Timeout for the next call, or None if the LLM should be skipped (circuit open / no time left)"""
+        timeout = time_budget(self.timeout)
+        if timeout < 1:
+            print("⏱️ Not enough time left for an LLM call - using fallback")
+            return None
+        if not self.circuit_breaker.allow_request():
+            print("⛔ LLM circuit open - using fallback")
+            return None
+        return timeout
+
+    def _record_response(self, status_code):
+        # Only server-side trouble counts against the breaker, not bad requests
+        if status_code >= 500 or status_code == 429:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def classify_intent(self, user_message, company_id):
+        """Use LLM to classify user intent and generate appropriate response"""
+
+        timeout = self._request_timeout()
+        if timeout is None:
+            return self._fallback_intent_classification(user_message)
+
         try:
             response = requests.post(
                 url=f"{self.base_url}/chat/completions",
@@ -48,15 +106,16 @@ Respond in JSON format with:
                 data=json.dumps({
                     "model": self.model,
                     "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
+                        {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+                        {"role": "user", "content": f"Company: {company_id}\n{user_message}"}
                     ],
                     "response_format": {"type": "json_object"},
                     "temperature": 0.1,
                     "max_tokens": 500
                 }),
-                timeout=30
+                timeout=timeout
             )
+            self._record_response(response.status_code)
 
             if response.status_code == 200:
                 result = response.json()
@@ -67,15 +126,17 @@ Respond in JSON format with:
                 return self._fallback_intent_classification(user_message)
 
         except Exception as e:
+            self.circuit_breaker.record_failure()
             st.error(f"Error calling OpenRouter: {str(e)}")
             return self._fallback_intent_classification(user_message)
 
     def _fallback_intent_classification(self, message):
-        """Fallback rule-based classification if LLM fails"""
+        """Fallback rule-based classification if LLM fails (marked with source=fallback)"""
         message_lower = message.lower()
 
         if any(word in message_lower for word in ['sales', 'revenue', 'order', 'invoice', 'sell']):
             return {
+                "source": "fallback",
                 "intent": "sales",
                 "confidence": 0.8,
                 "reasoning": "Detected sales-related keywords",
@@ -84,6 +145,7 @@ Respond in JSON format with:
             }
         elif any(word in message_lower for word in ['inventory', 'stock', 'warehouse', 'quantity']):
             return {
+                "source": "fallback",
                 "intent": "inventory",
                 "confidence": 0.8,
                 "reasoning": "Detected inventory-related keywords",
@@ -92,6 +154,7 @@ Respond in JSON format with:
             }
         elif any(word in message_lower for word in ['cash', 'flow', 'payment', 'voucher', 'financial']):
             return {
+                "source": "fallback",
                 "intent": "cashflow",
                 "confidence": 0.8,
                 "reasoning": "Detected cash flow related keywords",
@@ -100,6 +163,7 @@ Respond in JSON format with:
             }
         else:
             return {
+                "source": "fallback",
                 "intent": "general",
                 "confidence": 0.5,
                 "reasoning": "Could not determine specific intent",
@@ -110,22 +174,24 @@ Respond in JSON format with:
     def generate_natural_response(self, user_message, data_context, intent_info, company_id):
         """Generate natural language response using LLM"""
 
-        system_prompt = f"""You are a helpful ERP assistant for company {company_id}. 
-The user asked: "{user_message}"
-
-You have retrieved the following data:
-{data_context}
-
-Intent analysis: {intent_info.get('reasoning', 'N/A')}
+        # Compact, budgeted data context instead of the raw agent output
+        builder = ContextBuilder()
+        if isinstance(data_context, dict):
+            for label, data in data_context.items():
+                builder.add(label, data)
+        else:
+            builder.add("data", data_context)
+        context, context_tokens = builder.build()
+        print(f"🧮 Response context: {count_tokens(str(data_context))} -> {context_tokens} tokens")
 
-Please provide a helpful, natural response that:
-1. Directly answers the user's question
-2. Presents the data in an easy-to-understand format
-3. Highlights key insights from the data
-4. Is professional but conversational
-5. Mentions the company context when relevant
+        user_content = (f"Company: {company_id}\n"
+                        f"Question: {user_message}\n"
+                        f"Intent analysis: {intent_info.get('reasoning', 'N/A')}\n\n"
+                        f"Data:\n{context}")
 
-Keep the response concise but informative."""
+        timeout = self._request_timeout()
+        if timeout is None:
+            return f"Data for company {company_id}:\n\n{data_context}"
 
         try:
             response = requests.post(
@@ -137,14 +203,15 @@ Keep the response concise but informative."""
                 data=json.dumps({
                     "model": self.model,
                     "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
+                        {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_content}
                     ],
                     "temperature": 0.7,
                     "max_tokens": 800
                 }),
-                timeout=30
+                timeout=timeout
             )
+            self._record_response(response.status_code)
 
             if response.status_code == 200:
                 result = response.json()
@@ -153,8 +220,66 @@ Keep the response concise but informative."""
                 return f"Data for company {company_id}:\n\n{data_context}"
 
         except Exception as e:
+            self.circuit_breaker.record_failure()
             return f"Data for company {company_id}:\n\n{data_context}"
 
+    def generate_sql(self, user_message, schema_text, company_id, placeholders=None, history=None):
+        """Use LLM to write a single MySQL SELECT answering the question; returns {"sql", "explanation"} or None
+
+        placeholders describes the {slots} in a templated question and the
+        named %(param)s each one must be written as. history is recent
+        conversation the question may refer back to.
+        """
+        user_content = f"Company: {company_id}\n"
+        if history:
+            user_content += f"Conversation so far:\n{history}\n\n"
+        user_content += f"Question: {user_message}"
+        if placeholders:
+            user_content += f"""
+
+The question is a template. Never write these values literally; use the named parameters:
+{placeholders}
+Keep the {{slot}} names in the explanation."""
+
+        timeout = self._request_timeout()
+        if timeout is None:
+            return None
+
+        try:
+            response = requests.post(
+                url=f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                data=json.dumps({
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": SQL_SYSTEM_PROMPT.format(schema=schema_text)},
+                        {"role": "user", "content": user_content}
+                    ],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0,
+                    "max_tokens": 500
+                }),
+                timeout=timeout
+            )
+            self._record_response(response.status_code)
+
+            if response.status_code == 200:
+                result = response.json()
+                content = result['choices'][0]['message']['content']
+                generated = json.loads(content)
+                return generated if generated.get('sql') else None
+            else:
+                print(f"❌ OpenRouter SQL generation error: {response.status_code}")
+                return None
+
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            print(f"❌ Error generating SQL: {str(e)}")
+            return None
+
 
 # Global LLM client instance
 llm_client = OpenRouterClient()
\ No newline at end of file
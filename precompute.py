@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Nightly precompute of agent summaries for every company.
+
+    python precompute.py [--workers 4] [--chunk-size 50] [--companies 922 1336] [--skip-rollups]
+
+Results go to the local snapshot store, which the app reads before falling
+back to live queries. Each worker also refreshes the daily sales and cash
+flow rollups that date-ranged summaries are merged from. Schedule it with
+cron, e.g. `0 2 * * * python precompute.py`.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from database.batch import chunked
+
+
+# Agent methods whose results are precomputed, as (agent registry name, method name)
+SNAPSHOT_METHODS = [
+    ('sales', 'get_sales_summary'),
+    ('cashflow', 'get_cashflow_summary'),
+    ('inventory', 'get_inventory_summary'),
+]
+
+
+def compute_chunk(company_ids, rollups=True):
+    """Worker: compute every snapshot method for a chunk of companies with batch queries"""
+    from agents.registry import agent_registry
+    from agents.rollups import daily_rollups
+
+    snapshots = {company_id: {} for company_id in company_ids}
+    for agent_name, method_name in SNAPSHOT_METHODS:
+        agent = agent_registry.get(agent_name)
+        results = getattr(agent, f"{method_name}_many")(company_ids)
+        for company_id, payload in results.items():
+            # Never snapshot an error; the app will query live for that company instead
+            if not payload.startswith("Error"):
+                snapshots[company_id][method_name] = payload
+    if rollups:
+        # Rollups go straight to their own store, one company at a time
+        daily_rollups.build_many(company_ids)
+    return snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute agent summaries for all companies")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=50, help="companies per worker task")
+    parser.add_argument("--companies", nargs="*", help="only these company ids (default: all)")
+    parser.add_argument("--skip-rollups", action="store_true", help="don't refresh the daily rollups")
+    args = parser.parse_args()
+
+    from database.change_tracker import change_tracker
+    from database.company_directory import company_directory
+    from database.snapshot_store import snapshot_store
+
+    print("🌙 ERP AI Chatbot - Nightly Precompute")
+    print("=" * 40)
+
+    if args.companies:
+        company_ids = [str(c) for c in args.companies]
+    else:
+        if not company_directory.refresh():
+            print("❌ Could not load the company list from the database")
+            sys.exit(1)
+        company_ids = company_directory.company_ids()
+    print(f"🏢 {len(company_ids)} companies, {args.workers} workers, chunks of {args.chunk_size}")
+
+    # Take the change tracker's marks before computing: anything written from here on shows up as a
+    # different signature in the app, which then treats these snapshots as stale
+    change_tracker.poll(company_ids)
+    signatures = {company_id: change_tracker.signature(company_id) for company_id in company_ids}
+
+    started = time.time()
+    computed_at = datetime.now()
+    stored = 0
+    failed_chunks = 0
+    # spawn: workers must not inherit this process's DB connection or background threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as executor:
+        futures = {executor.submit(compute_chunk, chunk, not args.skip_rollups): chunk for chunk in chunked(company_ids, args.chunk_size)}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                stored += snapshot_store.put_many(future.result(), computed_at=computed_at, signatures=signatures)
+                print(f"✅ Chunk of {len(chunk)} companies stored")
+            except Exception as e:
+                failed_chunks += 1
+                print(f"❌ Chunk starting at company {chunk[0]} failed: {e}")
+
+    print(f"\n🎉 Stored {stored} snapshots in {time.time() - started:.1f}s ({failed_chunks} failed chunks)")
+    print(f"📁 Snapshot store: {snapshot_store.path}")
+    if failed_chunks:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+from .circuit_breaker import CircuitBreaker, get_breaker, all_breakers
+from .deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline, time_budget
+from .fallback_cache import FallbackCache
+
+__all__ = ['CircuitBreaker', 'get_breaker', 'all_breakers', 'Deadline', 'DeadlineExceeded',
+           'deadline_scope', 'current_deadline', 'time_budget', 'FallbackCache']
\ No newline at end of file
@@ -0,0 +1,55 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request has used up its time budget"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what="request"):
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded before {what}")
+
+
+_current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Run a block under a deadline; nested scopes can only shorten it"""
+    deadline = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.remaining() < deadline.remaining():
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def time_budget(default):
+    """Timeout to use for the next backend call: the smaller of default and what's left"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return min(default, deadline.remaining())
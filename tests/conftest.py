@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+from mysql.connector import Error
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# DatabaseConnection refuses to start without configuration; nothing here connects for real
+for name in ('DB_HOST', 'DB_USER', 'DB_PASSWORD', 'DB_NAME'):
+    os.environ.setdefault(name, 'test')
+
+import database.db_connection as db_connection  # noqa: E402
+from resilience import CircuitBreaker  # noqa: E402
+
+
+class FakeServer:
+    """Stand-in for the MySQL server behind the pool: flip `down` to inject failures"""
+
+    def __init__(self):
+        self.down = False
+        self.rows = [{'total': 1}]
+        self.queries = []
+        self.pings = []
+        self.pools = 0
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+
+    def execute(self, query, params=()):
+        if self.server.down:
+            raise Error("Lost connection to MySQL server during query")
+        self.server.queries.append((query, params))
+
+    def fetchall(self):
+        return list(self.server.rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.server = pool.server
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self.server.pings.append((attempts, delay))
+        if self.server.down:
+            raise Error("Can't connect to MySQL server")
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.server)
+
+    def disconnect(self):
+        pass
+
+    def close(self):
+        self.pool.idle.append(self)
+
+
+class FakePool:
+    def __init__(self, server, pool_size=2, **config):
+        if server.down:
+            raise Error("Can't connect to MySQL server")
+        server.pools += 1
+        self.server = server
+        self.idle = [FakeConnection(self) for _ in range(pool_size)]
+
+    def get_connection(self):
+        if not self.idle:
+            raise db_connection.PoolError("Failed getting connection; pool exhausted")
+        return self.idle.pop()
+
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+
+@pytest.fixture
+def database(server, monkeypatch):
+    """A DatabaseConnection whose pool talks to the fake server, with its own circuit breaker"""
+    monkeypatch.setattr(db_connection, 'MySQLConnectionPool',
+                        lambda pool_size, **config: FakePool(server, pool_size=2, **config))
+    database = db_connection.DatabaseConnection()
+    database.circuit_breaker = CircuitBreaker('database-test', failure_threshold=2, reset_timeout=0.2)
+    return database
@@ -0,0 +1,18 @@
+import pytest
+from starlette.testclient import TestClient
+
+from api.server import app
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"hi"', '3', 'null'])
+def test_chat_rejects_json_that_is_not_an_object(body):
+    # No `with`: the lifespan's background refreshers are not started
+    response = TestClient(app).post('/chat', content=body, headers={'content-type': 'application/json'})
+    assert response.status_code == 400
+    assert response.json() == {"error": "Request body must be a JSON object"}
+
+
+def test_chat_rejects_a_message_that_is_not_text():
+    response = TestClient(app).post('/chat', json={'company_id': 1, 'message': 5})
+    assert response.status_code == 400
+    assert response.json() == {"error": "message is required"}
@@ -0,0 +1,104 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from database.async_db import AsyncDatabase
+
+
+QUERY = "SELECT product_id, SUM(qty) AS qty FROM sales_items WHERE company_id = %s GROUP BY product_id ORDER BY product_id"
+
+
+@pytest.fixture
+def async_database(tmp_path):
+    path = tmp_path / 'erp.sqlite3'
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE sales_items (company_id INTEGER, product_id INTEGER, qty INTEGER)")
+    connection.executemany("INSERT INTO sales_items VALUES (?, ?, ?)",
+                           [(1, 10, 2), (1, 10, 3), (1, 11, 1), (2, 10, 7)])
+    connection.commit()
+    connection.close()
+    return AsyncDatabase.sqlite(str(path))
+
+
+def count_backend_calls(database):
+    calls = []
+    fetch = database.backend.fetch
+
+    async def counted(query, params):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return await fetch(query, params)
+
+    database.backend.fetch = counted
+    return calls
+
+
+def test_fetch_and_fetch_df(async_database):
+    rows = asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))
+    assert rows == [{'product_id': 10, 'qty': 5}, {'product_id': 11, 'qty': 1}]
+
+    frame = asyncio.run(async_database.fetch_df(QUERY, (2,), company_id=2))
+    assert frame.to_dict('records') == [{'product_id': 10, 'qty': 7}]
+    assert asyncio.run(async_database.fetch_df(QUERY, (3,), company_id=3)).empty
+
+
+def test_write_statement_rejected(async_database):
+    with pytest.raises(Exception, match="Security violation"):
+        asyncio.run(async_database.fetch("DELETE FROM sales_items WHERE company_id = %s", (1,)))
+    assert len(asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))) == 2
+
+
+def test_non_numeric_company_id_rejected(async_database):
+    with pytest.raises(ValueError, match="Must be numeric"):
+        asyncio.run(async_database.fetch(QUERY, ('1 OR 1=1',), company_id='1 OR 1=1'))
+
+
+def test_identical_concurrent_fetches_share_one_backend_call(async_database):
+    calls = count_backend_calls(async_database)
+
+    async def both():
+        return await asyncio.gather(async_database.fetch(QUERY, (1,)), async_database.fetch(QUERY, (1,)))
+
+    first, second = asyncio.run(both())
+    assert first == second and first
+    assert len(calls) == 1
+
+
+def test_fallback_served_when_backend_raises(async_database):
+    async def scenario():
+        rows = await async_database.fetch(QUERY, (1,))
+        assert async_database.last_result_stale_since() is None
+
+        async def broken(query, params):
+            raise sqlite3.OperationalError("disk I/O error")
+
+        async_database.backend.fetch = broken
+        assert await async_database.fetch(QUERY, (1,)) == rows
+        assert async_database.last_result_stale_since() is not None
+        # Nothing to fall back on for a query that never succeeded
+        assert await async_database.fetch(QUERY, (2,)) is None
+
+    asyncio.run(scenario())
+
+
+def test_result_of_a_query_overtaken_by_a_change_is_not_cached(async_database):
+    calls = []
+    fetch = async_database.backend.fetch
+
+    async def changed_mid_query(query, params):
+        calls.append(query)
+        rows = await fetch(query, params)
+        # The change tracker reports new data while the rows are in flight
+        async_database.query_cache.invalidate_company(1)
+        return rows
+
+    async_database.backend.fetch = changed_mid_query
+    asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))
+    asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))
+    assert len(calls) == 2
+
+    async_database.backend.fetch = fetch
+    asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))
+    asyncio.run(async_database.fetch(QUERY, (1,), company_id=1))
+    assert async_database.query_cache.hits == 1
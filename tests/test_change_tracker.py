@@ -0,0 +1,157 @@
+import time
+
+from database.change_tracker import ChangeTracker
+from database.query_cache import QueryCache
+
+
+TABLES = {
+    'stock': {'key': 'stock_id', 'columns': ('product_id', 'quantity')},
+    'origins': {'key': 'id', 'columns': ('title',), 'small': True},
+}
+
+
+class FakeDatabase:
+    """Answers the tracker's information_schema and marks queries from dicts"""
+
+    def __init__(self):
+        self.columns = {'stock': ['company_id', 'stock_id', 'product_id', 'quantity'], 'origins': ['id', 'title']}
+        self.marks = {'stock': [{'company_id': 1, 'row_count': 3, 'max_key': 9, 'max_updated': None, 'checksum': 100},
+                                {'company_id': 2, 'row_count': 5, 'max_key': 7, 'max_updated': None, 'checksum': 200}],
+                      'origins': [{'row_count': 4, 'max_key': 4, 'checksum': 50}]}
+        self.queries = []
+
+    def execute_query(self, query, params=None, workload=None):
+        self.queries.append(query)
+        if 'information_schema' in query:
+            return [{'COLUMN_NAME': name} for name in self.columns[params[0]]]
+        table = next(name for name in self.marks if f"FROM {name}" in query)
+        rows = [dict(row) for row in self.marks[table] if not params or str(row['company_id']) in params]
+        for row in rows:
+            # Only what the query selected comes back
+            if 'CRC32' not in query:
+                row.pop('checksum', None)
+            if 'max_updated' not in query:
+                row.pop('max_updated', None)
+        return rows
+
+
+def make_tracker(**kwargs):
+    tracker = ChangeTracker(tables=TABLES, **kwargs)
+    tracker.db = FakeDatabase()
+    tracker.track(1)
+    tracker.track(2)
+    events = []
+    tracker.subscribe(lambda company_id, tables: events.append((company_id, tables)))
+    return tracker, events
+
+
+def marks_queries(tracker, table):
+    return [query for query in tracker.db.queries if f"FROM {table}" in query and 'information_schema' not in query]
+
+
+def test_large_tables_are_checksummed_only_every_checksum_interval():
+    tracker, _ = make_tracker()
+    tracker.poll()
+    tracker.poll()
+    first, second = marks_queries(tracker, 'stock')
+    assert 'CRC32' in first and 'CRC32' not in second
+    assert all('CRC32' in query for query in marks_queries(tracker, 'origins'))
+
+
+def test_in_place_update_detected_on_the_checksum_pass():
+    tracker, events = make_tracker(checksum_interval=3600)
+    assert tracker.poll() == {}
+
+    # Same row count and max key, different quantity: only the checksum moves
+    tracker.db.marks['stock'][0]['checksum'] = 101
+    assert tracker.poll() == {}
+    tracker._last_checksum -= 3600
+    assert tracker.poll() == {'1': {'stock'}}
+    assert events == [('1', {'stock'})]
+
+
+def test_updated_column_catches_edits_on_every_poll():
+    tracker, _ = make_tracker()
+    tracker.db.columns['stock'].append('updated_at')
+    tracker.poll()
+    assert 'MAX(updated_at)' in marks_queries(tracker, 'stock')[0]
+    tracker.db.marks['stock'][1]['max_updated'] = '2026-01-02 10:00:00'
+    assert tracker.poll() == {'2': {'stock'}}
+
+
+def test_shared_table_change_reaches_every_company():
+    tracker, events = make_tracker()
+    tracker.poll()
+    tracker.db.marks['origins'][0]['checksum'] = 51
+    assert tracker.poll() == {'1': {'origins'}, '2': {'origins'}}
+
+
+def test_without_tracked_companies_only_shared_tables_are_polled():
+    tracker = ChangeTracker(tables=TABLES)
+    tracker.db = FakeDatabase()
+    tracker.poll()
+    assert marks_queries(tracker, 'stock') == []
+    assert len(marks_queries(tracker, 'origins')) == 1
+
+
+def test_idle_companies_stop_being_polled():
+    tracker, _ = make_tracker(idle_after=60)
+    tracker.poll()
+    assert tracker.signature('1') is not None
+    tracker._companies['1'] = time.time() - 61
+    tracker.poll()
+    assert "IN (%s)" in marks_queries(tracker, 'stock')[-1]
+    # Its marks go with it: a snapshot can't be matched against marks nobody is refreshing
+    assert tracker.signature('1') is None and tracker.signature('2') is not None
+
+
+def test_long_ttl_only_for_tables_checked_on_every_poll():
+    tracker, _ = make_tracker()
+    cache = QueryCache(ttl=120, long_ttl=3600)
+    cache.subscribe_to(tracker)
+    query = "SELECT SUM(quantity) FROM stock WHERE company_id = %s"
+    # Before the first poll nothing is known to be covered
+    assert cache.ttl_for(query) == 120
+
+    tracker.poll()
+    # stock has no last-modified column and is only checksummed hourly
+    assert tracker.covered_tables() == {'origins'}
+    assert cache.ttl_for(query) == 120
+    assert cache.ttl_for("SELECT title FROM origins") == 3600
+
+    tracker._layouts.clear()
+    tracker.db.columns['stock'].append('updated_at')
+    tracker.poll()
+    assert cache.ttl_for(query) == 3600
+    assert cache.ttl_for("SELECT * FROM stock JOIN products ON products.product_id = stock.product_id") == 120
+    # Derived tables count as their inputs, which are not all tracked here
+    assert cache.ttl_for("SELECT SUM(total) FROM sales_facts") == 120
+
+
+def test_table_without_watched_columns_stays_short_lived():
+    tracker, _ = make_tracker()
+    tracker.db.columns['origins'] = ['id']
+    tracker.poll()
+    assert tracker.covered_tables() == set()
+
+
+def test_signature_follows_company_and_shared_marks():
+    tracker, _ = make_tracker()
+    assert tracker.signature('1') is None
+    tracker.poll()
+    first = tracker.signature('1')
+    assert first is not None and tracker.signature('3') is None
+
+    tracker.db.marks['stock'][1]['row_count'] = 6
+    tracker.poll()
+    assert tracker.signature('1') == first
+    tracker.db.marks['origins'][0]['row_count'] = 5
+    tracker.poll()
+    assert tracker.signature('1') != first
+
+    # A large table's checksum is reported as a change event, not folded into the signature
+    second = tracker.signature('1')
+    tracker.db.marks['stock'][0]['checksum'] = 101
+    tracker._last_checksum -= 3600
+    assert tracker.poll() == {'1': {'stock'}}
+    assert tracker.signature('1') == second
@@ -0,0 +1,91 @@
+import asyncio
+import importlib
+import threading
+
+import pandas as pd
+
+from agents import inventory_agent
+from agents.inventory_agent import InventoryAgent
+from database.dimension_cache import DimensionCache
+
+# database/__init__ re-exports the dimension_cache instance under the module's name
+dimension_cache_module = importlib.import_module('database.dimension_cache')
+
+
+class FakeDatabase:
+    """information_schema answers from `columns`; dimension loads return one row"""
+
+    def __init__(self):
+        self.columns = ['company_id', 'product_id', 'title', 'description', 'min_qty_alert', 'reorder_qty_alert']
+        self.queries = []
+
+    def execute_query(self, query, params=None, company_id=None, workload=None):
+        self.queries.append(query)
+        return [{'COLUMN_NAME': name} for name in self.columns]
+
+    def execute_query_dataframe(self, query, params=None, company_id=None, columnar=False, workload=None):
+        self.queries.append(query)
+        if 'FROM products' not in query:
+            return pd.DataFrame([{'contact_id': 5, 'id': 6, 'title': 'Other'}])
+        return pd.DataFrame([{'product_id': 4, 'title': 'Widget', 'min_qty_alert': 3, 'reorder_qty_alert': 9}])
+
+    @staticmethod
+    def last_result_stale_since():
+        return None
+
+
+def test_dimension_load_selects_only_the_columns_it_keeps(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(dimension_cache_module, 'db', database)
+    cache = DimensionCache()
+
+    assert cache.label('products', 1, 4) == 'Widget'
+    assert database.queries[-1].startswith("SELECT product_id, title, min_qty_alert, reorder_qty_alert FROM products")
+
+    # The column lookup is done once per table
+    cache.invalidate_company(1)
+    cache.get('products', 2)
+    assert sum('information_schema' in query for query in database.queries) == 1
+
+
+def test_low_stock_compares_each_product_and_keeps_the_limit():
+    query, params = InventoryAgent()._low_stock_query()
+    assert "stock.quantity <= products.min_qty_alert" in query
+    assert "ORDER BY shortage DESC LIMIT 15" in query
+    assert params == ()
+
+
+def test_invalidation_drops_only_the_changed_dimensions(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(dimension_cache_module, 'db', database)
+    cache = DimensionCache()
+    for table in ('products', 'contacts'):
+        cache.get(table, 1)
+    cache.get('origins')
+    loaded = set(cache._entries)
+
+    cache.invalidate_company(1, {'sales_items', 'stock'})
+    assert set(cache._entries) == loaded
+    cache.invalidate_company(1, {'origins', 'products'})
+    assert set(cache._entries) == {('contacts', '1')}
+    cache.invalidate_company(1)
+    assert not cache._entries
+
+
+def test_async_low_stock_loads_product_names_off_the_event_loop(monkeypatch):
+    agent = InventoryAgent()
+    loads = []
+
+    async def fetch(query, params, company_id=None):
+        return [{'product_id': 4, 'quantity': 1, 'min_qty_alert': 3, 'reorder_qty_alert': 9, 'shortage': 2,
+                 'warehouse_id': 1}]
+
+    def get(table, company_id=None):
+        loads.append(threading.current_thread())
+        return None
+
+    monkeypatch.setattr(inventory_agent.async_db, 'fetch', fetch)
+    monkeypatch.setattr(inventory_agent.dimension_cache, 'get', get)
+    response = asyncio.run(agent.get_low_stock_items_async(1))
+    assert "**Product 4**" in response
+    assert loads and threading.main_thread() not in loads
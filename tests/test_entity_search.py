@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from agents.entity_search import EntityIndex, EntitySearch, candidate_phrases
+
+
+CATALOGUE = {
+    'customer': {1: 'Acme Corporation Ltd', 2: 'Globex Trading'},
+    'product': {10: 'Monthly Subscription', 11: 'Yearly Maintenance Plan', 12: 'Detail Report Binder',
+                13: 'Blue Widget'},
+}
+
+
+@pytest.fixture
+def search(monkeypatch):
+    search = EntitySearch()
+    indexes = {}
+    for kind, names in CATALOGUE.items():
+        indexes[kind] = EntityIndex()
+        indexes[kind].update(names)
+    monkeypatch.setattr(search, 'index', lambda kind, company_id: indexes[kind])
+    return search
+
+
+@pytest.mark.parametrize('message', [
+    "sales summary for the month",
+    "Give me product sales for the year",
+    "top products for details",
+    "inventory breakdown for this quarter",
+    "sales for Monthly",
+])
+def test_generic_words_do_not_resolve_to_names(search, message):
+    assert search.resolve(message, 1) == {}
+
+
+def test_lowercase_phrase_after_a_cue_word_is_not_a_name():
+    assert candidate_phrases("stock of blue widget") == []
+
+
+@pytest.mark.parametrize('message, kind, name', [
+    ("sales for Globex Trading last month", 'customer', 'Globex Trading'),
+    ("stock of product Blue", 'product', 'Blue Widget'),
+    ("revenue from 'Acme'", 'customer', 'Acme Corporation Ltd'),
+])
+def test_quoted_capitalised_and_hinted_names_resolve(search, message, kind, name):
+    found = search.resolve(message, 1)
+    assert found[kind].name == name
+
+
+def test_search_during_concurrent_updates_stays_consistent():
+    index = EntityIndex()
+    first = {i: f"Widget {i}" for i in range(2000)}
+    second = {i: f"Gadget {i}" for i in range(1000, 3000)}
+    index.update(first)
+    errors = []
+    done = threading.Event()
+
+    def searching():
+        while not done.is_set():
+            try:
+                for entity_id, name, _ in index.search("Widget 1500"):
+                    # An id always comes back with its own name
+                    assert name in (first.get(entity_id), second.get(entity_id))
+            except Exception as e:
+                errors.append(e)
+                return
+
+    thread = threading.Thread(target=searching)
+    thread.start()
+    for _ in range(10):
+        index.update(second)
+        index.update(first)
+    done.set()
+    thread.join()
+    assert errors == []
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from database.local_replica import LocalReplica, duckdb
+
+pytestmark = pytest.mark.skipif(duckdb is None, reason="duckdb/pyarrow not installed")
+
+
+class FakeSource:
+    """The MySQL side of the sync: stock rows for company 1, in a DataFrame"""
+
+    def __init__(self):
+        self.stock = pd.DataFrame({'company_id': [1, 1, 1], 'stock_id': [1, 2, 3], 'quantity': [10, 20, 30]})
+        self.queries = []
+
+    def execute_query_dataframe(self, query, params=None, columnar=False, workload=None):
+        self.queries.append(query)
+        if not query.startswith("SELECT * FROM stock"):
+            return pd.DataFrame()
+        rows = self.stock
+        if '>=' in query:
+            rows = rows[rows['stock_id'] >= params[1]]
+        return rows.copy()
+
+    @staticmethod
+    def last_result_stale_since():
+        return None
+
+
+def test_change_event_reloads_the_whole_partition(tmp_path):
+    source = FakeSource()
+    replica = LocalReplica(source, directory=str(tmp_path), enabled=True)
+    replica.sync_company(1)
+    assert replica._is_fresh('stock', '1')
+
+    # An in-place edit below the watermark: an incremental pull would never see it
+    source.stock.loc[source.stock['stock_id'] == 1, 'quantity'] = 0
+    replica.mark_changed(1, {'stock'})
+    assert not replica._is_fresh('stock', '1')
+
+    replica.sync_company(1)
+    assert '>=' not in [query for query in source.queries if 'FROM stock' in query][-1]
+    assert replica._is_fresh('stock', '1')
+    rows = replica.run("SELECT SUM(quantity) AS total FROM stock WHERE company_id = %s", (1,), 1)
+    assert rows == [{'total': 50}]
+
+
+def test_changed_partition_stays_unserved_until_a_reload_returns_rows(tmp_path):
+    source = FakeSource()
+    replica = LocalReplica(source, directory=str(tmp_path), enabled=True)
+    replica.sync_company(1)
+    replica.mark_changed(1, {'stock'})
+
+    stock = source.stock
+    source.stock = stock.iloc[0:0]
+    replica.sync_company(1)
+    assert not replica._is_fresh('stock', '1')
+
+    source.stock = stock
+    replica.sync_company(1)
+    assert replica._is_fresh('stock', '1')
+
+
+def test_shared_table_event_marks_the_shared_partition(tmp_path):
+    replica = LocalReplica(FakeSource(), directory=str(tmp_path), enabled=True)
+    replica.mark_changed(1, {'origins'})
+    assert ('origins', None) in replica._dirty
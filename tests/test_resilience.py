@@ -0,0 +1,136 @@
+import time
+
+from resilience import CircuitBreaker, FallbackCache, deadline_scope
+
+
+QUERY = "SELECT SUM(total) AS total FROM sales_items WHERE company_id = %s"
+
+
+def test_breaker_closed_open_half_open_closed(database, server):
+    breaker = database.circuit_breaker
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    # Pool creation fails twice (first attempt + retry): the circuit opens
+    server.down = True
+    assert database.get_connection() is None
+    assert database.get_connection() is None
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # While open no connection is attempted at all
+    assert database.get_connection() is None
+    assert server.pools == 0
+
+    # After reset_timeout one trial is let through; its success closes the circuit
+    time.sleep(0.25)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    server.down = False
+    connection = database.get_connection()
+    assert connection is not None
+    database.release_connection(connection)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_failure_reopens(database, server):
+    breaker = database.circuit_breaker
+    server.down = True
+    database.get_connection()
+    database.get_connection()
+    time.sleep(0.25)
+    assert breaker.allow_request()
+    # Only one trial at a time while half-open
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_ping_retries_fit_the_request_deadline(database, server):
+    connection = database.get_connection()
+    database.release_connection(connection)
+    assert server.pings[-1] == (3, 5)
+
+    with deadline_scope(9):
+        database.release_connection(database.get_connection())
+    attempts, delay = server.pings[-1]
+    assert attempts == 3 and attempts * delay <= 9
+
+    # Too little time left for retries: a single attempt without delay
+    with deadline_scope(1.5):
+        database.release_connection(database.get_connection())
+    assert server.pings[-1] == (1, 0)
+
+
+def test_expired_deadline_skips_connecting(database, server):
+    with deadline_scope(0):
+        assert database.get_connection() is None
+    assert server.pools == 0
+    assert database.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_pool_wait_is_bounded_by_the_deadline(database, server):
+    held = [database.get_connection(), database.get_connection()]
+    started = time.time()
+    with deadline_scope(0.3):
+        assert database.get_connection() is None
+    assert time.time() - started < 1
+    # Waiting for a busy pool is not a backend failure
+    assert database.circuit_breaker.state == CircuitBreaker.CLOSED
+    for connection in held:
+        database.release_connection(connection)
+
+
+def test_busy_pool_during_half_open_trial_frees_the_trial(database, server):
+    breaker = database.circuit_breaker
+    held = [database.get_connection(), database.get_connection()]
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.25)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The trial finds the pool exhausted: that says nothing about the database, and the next caller may try
+    with deadline_scope(0.1):
+        assert database.get_connection() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    database.release_connection(held.pop())
+    connection = database.get_connection()
+    assert connection is not None
+    assert breaker.state == CircuitBreaker.CLOSED
+    for connection in held + [connection]:
+        database.release_connection(connection)
+
+
+def test_queries_carry_the_remaining_time_as_a_server_limit(database, server):
+    with deadline_scope(5):
+        database.execute_query(QUERY, (1,))
+    assert 'MAX_EXECUTION_TIME(' in server.queries[-1][0]
+
+
+def test_last_good_result_served_stale_while_breaker_open(database, server):
+    rows = database.execute_query(QUERY, (1,))
+    assert rows == [{'total': 1}]
+    assert database.last_result_stale_since() is None
+
+    # The database goes away: the query fails and the last good rows come back, flagged stale
+    server.down = True
+    assert database.execute_query(QUERY, (1,)) == rows
+    stale_since = database.last_result_stale_since()
+    assert stale_since is not None
+    assert database.circuit_breaker.state == CircuitBreaker.OPEN
+
+    # With the circuit open the backend isn't touched, and the fallback is still served
+    queries = len(server.queries)
+    assert database.execute_query(QUERY, (1,)) == rows
+    assert database.last_result_stale_since() == stale_since
+    assert len(server.queries) == queries
+
+    # A query that never succeeded has nothing to fall back on
+    assert database.execute_query(QUERY, (2,)) is None
+
+
+def test_fallback_cache_evicts_least_recently_used():
+    cache = FallbackCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a')[0] == 1
@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from agents import rollups
+from agents.rollups import DailyRollups
+from agents.time_window import DateRange
+from database.rollup_store import RollupStore
+
+
+TODAY = date.today()
+
+
+class FakeDatabase:
+    """Sales invoices as {invoice_id: (day, total)}; answers the rollup, watermark and new-key queries"""
+
+    def __init__(self):
+        self.invoices = {}
+        self.queries = []
+
+    def last_result_stale_since(self):
+        return None
+
+    def execute_query(self, query, params=None, company_id=None, workload=None):
+        self.queries.append(query)
+        if 'invoice_id > %s' in query:
+            days = {}
+            for invoice_id, (day, _) in self.invoices.items():
+                if invoice_id > params[1]:
+                    days[day] = max(days.get(day, 0), invoice_id)
+            return [{'day': day, 'max_key': max_key} for day, max_key in days.items()]
+        if 'MAX(invoice_id) AS max_key' in query:
+            return [{'max_key': max(self.invoices, default=None)}]
+        start, end = params[1:]
+        return [{'day': day, 'invoice_id': invoice_id, 'customer_id': invoice_id, 'invoice_total': total,
+                 'valued_lines': 1, 'units': 1, 'latest': datetime.combine(day, datetime.min.time())}
+                for invoice_id, (day, total) in self.invoices.items() if start <= day < end]
+
+
+@pytest.fixture
+def fake_db(tmp_path, monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(rollups, 'db', fake)
+    monkeypatch.setattr(rollups, 'rollup_store', RollupStore(str(tmp_path / 'rollups.sqlite3')))
+    fake.invoices = {1: (TODAY - timedelta(days=40), 100.0), 2: (TODAY - timedelta(days=2), 50.0)}
+    return fake
+
+
+def revenue(daily, days=60):
+    return daily.summary('sales', '1', DateRange(TODAY - timedelta(days=days), TODAY + timedelta(days=1)))['total_revenue']
+
+
+def test_recent_days_are_rolled_up_live(fake_db):
+    daily = DailyRollups(backfill_days=60, settle_days=7)
+    daily.build('1', 'sales')
+    assert revenue(daily) == 150.0
+
+    # An edit inside the settle window shows up without a rebuild
+    fake_db.invoices[2] = (TODAY - timedelta(days=2), 80.0)
+    assert revenue(daily) == 180.0
+
+
+def test_backdated_invoice_rerolls_its_day(fake_db):
+    daily = DailyRollups(backfill_days=60, settle_days=7)
+    daily.build('1', 'sales')
+    assert rollups.rollup_store.max_key('1', 'sales') == 2
+
+    fake_db.invoices[3] = (TODAY - timedelta(days=30), 25.0)
+    assert revenue(daily) == 150.0
+
+    # Changes to tables the rollups don't read are ignored
+    queries = len(fake_db.queries)
+    daily.invalidate_company('1', {'stock'})
+    assert len(fake_db.queries) == queries
+
+    daily.invalidate_company('1', {'sales_invoice'})
+    assert revenue(daily) == 175.0
+    assert rollups.rollup_store.max_key('1', 'sales') == 3
+    # Re-rolling one day leaves the rest of the coverage in place
+    assert rollups.rollup_store.coverage('1', 'sales') == (TODAY - timedelta(days=60), TODAY)
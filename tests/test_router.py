@@ -0,0 +1,33 @@
+import threading
+import time
+
+from agents import router
+from resilience import deadline_scope
+
+
+GUESS = {'route': 'sales', 'method': 'get_sales_summary', 'question': 'sales this month', 'date_range': None}
+HISTORY = [{'role': 'user', 'content': 'top customers'}]
+
+
+def test_kept_speculative_fetch_is_bounded_by_the_deadline(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(router, 'llm_route', lambda question, company_id: ('sales', 'get_sales_summary'))
+    monkeypatch.setattr(router, 'run_intent', lambda intent, company_id, history=None: release.wait(5) and "late")
+    speculative = router.SpeculativeRouter(max_workers=1)
+
+    started = time.time()
+    with deadline_scope(0.2):
+        intent, response = speculative.run(GUESS, 7, HISTORY)
+    release.set()
+    assert time.time() - started < 1
+    assert intent == GUESS and "took too long" in response
+
+
+def test_overruled_guess_reruns_with_the_conversation_history(monkeypatch):
+    calls = []
+    monkeypatch.setattr(router, 'llm_route', lambda question, company_id: ('inventory', 'get_inventory_summary'))
+    monkeypatch.setattr(router, 'run_intent',
+                        lambda intent, company_id, history=None: calls.append((intent['route'], history)) or "ok")
+    intent, response = router.SpeculativeRouter(max_workers=1).run(GUESS, 7, HISTORY)
+    assert intent['route'] == 'inventory' and response == "ok"
+    assert ('inventory', HISTORY) in calls
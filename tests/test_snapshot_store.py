@@ -0,0 +1,48 @@
+import sqlite3
+from datetime import datetime
+
+from agents import router
+from database.snapshot_store import SnapshotStore
+
+
+SUMMARY = "**Sales Performance Summary - Company 7**\n\n*Live data from AWS RDS database*\n"
+
+
+def test_snapshot_served_only_for_matching_signature(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.sqlite3'))
+    store.put_many({'7': {'get_sales_summary': SUMMARY}}, computed_at=datetime(2026, 1, 2, 2, 0),
+                   signatures={'7': 'abc'})
+    store.max_age = datetime.now() - datetime(2026, 1, 1)
+
+    assert store.get('7', 'get_sales_summary', 'abc') == (SUMMARY, datetime(2026, 1, 2, 2, 0))
+    # Data moved since the precompute, or the tracker hasn't polled the company yet
+    assert store.get('7', 'get_sales_summary', 'def') is None
+    assert store.get('7', 'get_sales_summary', None) is None
+
+
+def test_store_from_before_signatures_is_migrated(tmp_path):
+    path = str(tmp_path / 'snapshots.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE snapshots (company_id TEXT NOT NULL, method TEXT NOT NULL, "
+                       "payload TEXT NOT NULL, computed_at TEXT NOT NULL, PRIMARY KEY (company_id, method))")
+    connection.execute("INSERT INTO snapshots VALUES ('7', 'get_sales_summary', 'old', ?)",
+                       (datetime.now().isoformat(),))
+    connection.commit()
+    connection.close()
+
+    store = SnapshotStore(path)
+    assert store.get('7', 'get_sales_summary', 'abc') is None
+    store.put_many({'7': {'get_sales_summary': SUMMARY}}, signatures={'7': 'abc'})
+    assert store.get('7', 'get_sales_summary', 'abc')[0] == SUMMARY
+
+
+def test_served_snapshot_shows_when_it_was_computed(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path / 'snapshots.sqlite3'))
+    store.put_many({'7': {'get_sales_summary': SUMMARY}}, computed_at=datetime.now().replace(hour=2, minute=5),
+                   signatures={'7': 'abc'})
+    monkeypatch.setattr(router, 'snapshot_store', store)
+    monkeypatch.setattr(router.change_tracker, 'signature', lambda company_id: 'abc')
+
+    summary = router.get_summary('sales', '7')
+    assert 'Live data' not in summary
+    assert f"Precomputed snapshot from {datetime.now():%Y-%m-%d} 02:05" in summary
@@ -0,0 +1,88 @@
+import pytest
+
+from agents import sql_agent
+from agents.sql_agent import SqlAgent, UnsafeQueryError
+from agents.sql_templates import SqlTemplateCache
+
+
+SCOPED = "(SELECT * FROM sales_items WHERE company_id = %(company_id)s) AS s"
+
+
+@pytest.fixture
+def agent():
+    agent = SqlAgent()
+    agent._company_tables = {'sales_items', 'sales_invoice', 'products'}
+    return agent
+
+
+@pytest.mark.parametrize('sql', [
+    # A comma after a JOIN condition adds an unscoped table
+    "SELECT * FROM origins o JOIN foreign_currency f ON o.id = f.fc_id, sales_items s",
+    # A parenthesized table list after JOIN
+    "SELECT s.* FROM origins JOIN (sales_items s) ON 1=1",
+    "SELECT * FROM (SELECT * FROM origins, sales_items) AS x",
+    "SELECT * FROM sales_items s STRAIGHT_JOIN products p ON p.product_id = s.product_id",
+    "SELECT product_id FROM products UNION TABLE sales_items",
+])
+def test_table_references_scoping_could_miss_are_rejected(agent, sql):
+    with pytest.raises(UnsafeQueryError):
+        agent.plan(sql, {'company_id': 1})
+
+
+def test_join_tables_and_subqueries_are_scoped(agent):
+    sql = agent.plan("SELECT s.product_id, COALESCE(SUM(s.total), 0) FROM sales_items s "
+                     "JOIN products p USING (product_id, company_id) "
+                     "WHERE s.product_id IN (SELECT product_id FROM sales_items WHERE qty IN (1, 2)) "
+                     "GROUP BY s.product_id", {'company_id': 1})
+    assert SCOPED in sql
+    assert "(SELECT * FROM products WHERE company_id = %(company_id)s) AS p" in sql
+    assert "IN (SELECT product_id FROM (SELECT * FROM sales_items WHERE company_id = %(company_id)s)" in sql
+
+
+def test_derived_table_in_from_is_allowed(agent):
+    sql = agent.plan("SELECT x.total FROM (SELECT SUM(total) AS total FROM sales_items s) AS x",
+                     {'company_id': 1})
+    assert SCOPED in sql
+
+
+@pytest.fixture
+def answering(agent, tmp_path, monkeypatch):
+    """The agent with a scratch template cache, an LLM that returns `generated` and a database that returns one row"""
+    cache = SqlTemplateCache(str(tmp_path / 'templates.sqlite3'))
+    generated = {}
+    monkeypatch.setattr(sql_agent, 'sql_template_cache', cache)
+    monkeypatch.setattr(agent, '_load_schema', lambda: "- sales_items(product_id int, qty int)")
+    monkeypatch.setattr(agent, 'check_cost', lambda sql, params: None)
+    monkeypatch.setattr(sql_agent.llm_client, 'generate_sql', lambda *args, **kwargs: dict(generated))
+    monkeypatch.setattr(sql_agent.db, 'execute_query', lambda *args, **kwargs: [{'product_id': 1}])
+    return agent, cache, generated
+
+
+def test_sql_with_a_literal_slot_value_is_not_cached(answering):
+    agent, cache, generated = answering
+    generated['sql'] = "SELECT product_id FROM sales_items ORDER BY qty DESC LIMIT 10"
+    assert 'Query Results' in agent.process_query("top 10 products by quantity", 1)
+    schema_hash = cache.fingerprint("- sales_items(product_id int, qty int)")
+    assert cache.get("top {n1} products by quantity", schema_hash) is None
+
+    generated['sql'] = "SELECT product_id FROM sales_items ORDER BY qty DESC LIMIT %(n1)s"
+    agent.process_query("top 10 products by quantity", 1)
+    assert cache.get("top {n1} products by quantity", schema_hash) is not None
+
+
+@pytest.mark.parametrize('expression', [
+    "EXTRACT(YEAR FROM invoice_date)",
+    "TRIM(LEADING '0' FROM CAST(invoice_id AS CHAR))",
+    "SUBSTRING(status FROM 1 FOR 3)",
+])
+def test_from_inside_a_function_is_not_a_table(agent, expression):
+    sql = agent.plan(f"SELECT {expression} AS y, SUM(total) FROM sales_invoice GROUP BY y", {'company_id': 1})
+    assert expression in sql
+    assert "FROM (SELECT * FROM sales_invoice WHERE company_id = %(company_id)s) AS sales_invoice" in sql
+
+
+def test_function_from_does_not_hide_a_table(agent):
+    with pytest.raises(UnsafeQueryError):
+        agent.plan("SELECT EXTRACT(YEAR FROM invoice_date) FROM origins, sales_items", {'company_id': 1})
+    with pytest.raises(UnsafeQueryError, match="reads no tables"):
+        agent.plan("SELECT EXTRACT(YEAR FROM invoice_date)", {'company_id': 1})
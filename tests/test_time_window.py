@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from agents.sql_templates import normalize_question
+from agents.time_window import DateRange, parse_date_range
+from llm.conversation import Conversation
+
+
+TODAY = date(2026, 10, 19)
+
+
+def test_explicit_range_is_inclusive():
+    assert parse_date_range("sales from 2024-01-01 to 2024-03-31", TODAY) == \
+        DateRange(date(2024, 1, 1), date(2024, 4, 1))
+
+
+def test_reversed_range_is_swapped():
+    assert parse_date_range("sales from 2024-05-01 to 2024-01-01", TODAY) == \
+        DateRange(date(2024, 1, 1), date(2024, 5, 2))
+
+
+def test_last_n_months_are_whole_months_like_last_month():
+    last_month = parse_date_range("sales last month", TODAY)
+    assert (last_month.start, last_month.end) == (date(2026, 9, 1), date(2026, 10, 1))
+    last_three = parse_date_range("sales over the last 3 months", TODAY)
+    assert (last_three.start, last_three.end) == (date(2026, 7, 1), date(2026, 10, 1))
+    # Days and weeks stay rolling, through today
+    last_week = parse_date_range("sales in the last 7 days", TODAY)
+    assert (last_week.start, last_week.end) == (date(2026, 10, 13), date(2026, 10, 20))
+
+
+@pytest.mark.parametrize("text", [
+    "sales from 2024-02-30 to 2024-03-31",
+    "sales from 2024-01-01 to 2024-13-01",
+    "sales in 0000",
+    "revenue for 9999 q4",
+    "stock over the last 99999999 days",
+])
+def test_impossible_dates_give_no_range(text):
+    assert parse_date_range(text, TODAY) is None
+
+
+def test_templates_keep_impossible_dates_literal():
+    template, values = normalize_question("top 5 customers on 2024-02-30")
+    assert values == {}
+    assert "2024-02-30" in template
+    assert normalize_question("revenue in 0000") == ("revenue in 0000", {})
+
+
+def test_follow_up_with_impossible_date_is_not_resolved():
+    conversation = Conversation()
+    conversation.remember({"route": "sales", "method": "get_sales_summary", "question": "sales summary",
+                           "date_range": None})
+    assert conversation.resolve_follow_up("what about 2024-02-30 to 2024-03-10?") is None
+    follow_up = conversation.resolve_follow_up("what about 2024-05-01 to 2024-01-01?")
+    assert follow_up["date_range"] == DateRange(date(2024, 1, 1), date(2024, 5, 2))